@@ -0,0 +1,31 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+def mark_totals_stale(apps, schema_editor):
+    # EXISTING CARTS RECALCULATE THEIR TOTALS ON NEXT READ
+    Cart = apps.get_model("cart", "Cart")
+    Cart.objects.update(subtotal=None)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="subtotal",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, default=0, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total_items",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_totals_stale, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:19
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # COLLAPSE DUPLICATE (CART, ITEM) LINES INTO ONE BEFORE ADDING THE CONSTRAINT
+    CartItem = apps.get_model("cart", "CartItem")
+    duplicates = (
+        CartItem.objects.values("cart", "item")
+        .annotate(lines=Count("id"), total=Sum("quantity"))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = CartItem.objects.filter(
+            cart=duplicate["cart"], item=duplicate["item"]
+        ).order_by("id")
+        keep = lines.first()
+        lines.exclude(id=keep.id).delete()
+        CartItem.objects.filter(id=keep.id).update(quantity=duplicate["total"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0003_cart_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "item"), name="unique_cart_item"
+            ),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from decimal import Decimal
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Sum, When
+from products.inventory import InsufficientStock, available_to_sell, with_available
+from products.models import ProductVariant
 
 
 class CartItem(models.Model):
@@ -15,9 +19,41 @@ class CartItem(models.Model):
     cart = models.ForeignKey("cart.Cart", on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "item"], name="unique_cart_item")
+        ]
+
     def __str__(self):
         return f"{self.quantity}no. {self.item.product.name}"
 
+    @classmethod
+    def upsert(cls, cart, item, quantity):
+        """
+        Adds quantity to a cart line in a single INSERT ... ON CONFLICT statement,
+        creating the line if it does not exist yet. Relies on unique_cart_item.
+
+        Args:
+            cart (Cart): The cart the line belongs to.
+            item (ProductVariant): The product variant of the line.
+            quantity (int): The quantity to add.
+
+        Returns:
+            CartItem: The cart item with its new quantity.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (cart_id, item_id, quantity) "
+                "VALUES (%s, %s, %s) "
+                "ON CONFLICT (cart_id, item_id) "
+                f"DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity "
+                "RETURNING id, quantity",
+                [cart.pk, item.pk, quantity],
+            )
+            cart_item_id, new_quantity = cursor.fetchone()
+        return cls(id=cart_item_id, cart=cart, item=item, quantity=new_quantity)
+
 
 class Cart(models.Model):
     """
@@ -26,16 +62,27 @@ class Cart(models.Model):
     Attributes:
         user (users.User): The user associated with the cart.
         session (str): The session ID associated with the cart.
+        total_items (int): Stored total quantity of items in the cart.
+        subtotal (Decimal): Stored total price of the cart,
+        None when it must be recalculated (e.g. after a price change).
     """
 
     user = models.OneToOneField(
         "users.User", on_delete=models.CASCADE, default=None, null=True, blank=True
     )
     session = models.CharField(max_length=32, default=None, null=True, blank=True)
+    total_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, null=True, blank=True
+    )
 
     def add_item(self, product, quantity):
         """
-        Adds an item to the cart.
+        Adds an item to the cart, as long as the cart does not then hold more
+        of it than is available to sell. On PostgreSQL this is a single
+        statement: the cart row is locked, the line is upserted and the stored
+        totals are incremented in one query, so a concurrent request for the
+        same cart cannot slip past the stock check. Relies on unique_cart_item.
 
         Args:
             product: The product to be added.
@@ -43,14 +90,77 @@ class Cart(models.Model):
 
         Returns:
             CartItem: The created or updated cart item.
+
+        Raises:
+            InsufficientStock: If the cart would hold more than is available.
         """
-        cart_item = CartItem.objects.filter(item=product, cart=self)
-        if cart_item.exists():
-            cart_item = cart_item.first()
-            cart_item.quantity = cart_item.quantity + quantity
-            cart_item.save()
-            return
-        return CartItem.objects.create(item=product, cart=self, quantity=quantity)
+        if connection.vendor != "postgresql":
+            return self._add_item_orm(product, quantity)
+        table = connection.ops.quote_name(Cart._meta.db_table)
+        items = connection.ops.quote_name(CartItem._meta.db_table)
+        available, available_params = (
+            with_available(ProductVariant.objects.filter(pk=product.pk))
+            .values("available")
+            .query.sql_with_params()
+        )
+        price = product.product.get_price() * quantity
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH locked AS ("
+                f"SELECT id FROM {table} WHERE id = %s FOR UPDATE"
+                "), line AS ("
+                f"INSERT INTO {items} (cart_id, item_id, quantity) "
+                f"SELECT id, %s, %s FROM locked WHERE %s <= ({available}) "
+                "ON CONFLICT (cart_id, item_id) "
+                f"DO UPDATE SET quantity = {items}.quantity + EXCLUDED.quantity "
+                f"WHERE {items}.quantity + EXCLUDED.quantity <= ({available}) "
+                "RETURNING id, quantity"
+                ") "
+                # A STALE (NULL) SUBTOTAL STAYS NULL
+                f"UPDATE {table} SET total_items = {table}.total_items + %s, "
+                f"subtotal = {table}.subtotal + %s "
+                f"FROM line WHERE {table}.id = %s "
+                f"RETURNING line.id, line.quantity, {table}.total_items, "
+                f"{table}.subtotal",
+                [
+                    self.pk,
+                    product.pk,
+                    quantity,
+                    quantity,
+                    *available_params,
+                    *available_params,
+                    quantity,
+                    price,
+                    self.pk,
+                ],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise InsufficientStock([product.pk])
+        cart_item_id, new_quantity, self.total_items, self.subtotal = row
+        return CartItem(id=cart_item_id, cart=self, item=product, quantity=new_quantity)
+
+    def _add_item_orm(self, product, quantity):
+        # DATABASES WITHOUT DATA-MODIFYING CTES (E.G. SQLITE) TAKE FIVE QUERIES,
+        # THE STOCK IS CHECKED UNDER THE CART LOCK SO THE CHECK CANNOT RACE
+        with transaction.atomic():
+            self._lock()
+            in_cart = (
+                self.cartitem_set.filter(item=product)
+                .values_list("quantity", flat=True)
+                .first()
+                or 0
+            )
+            if in_cart + quantity > available_to_sell(product.pk):
+                raise InsufficientStock([product.pk])
+            cart_item = CartItem.upsert(self, product, quantity)
+            # INCREMENT STORED TOTALS IN THE DATABASE, A STALE (NULL) SUBTOTAL STAYS NULL
+            Cart.objects.filter(pk=self.pk).update(
+                total_items=F("total_items") + quantity,
+                subtotal=F("subtotal") + product.product.get_price() * quantity,
+            )
+            self.refresh_from_db(fields=["total_items", "subtotal"])
+        return cart_item
 
     def remove_item(self, product):
         """
@@ -62,33 +172,101 @@ class Cart(models.Model):
         Returns:
             None
         """
-        return CartItem.objects.get(item=product, cart=self).delete()
+        with transaction.atomic():
+            self._lock()
+            self.cartitem_set.filter(item=product).delete()
+            self.refresh_totals()
+
+    def update_item_quantity(self, product, quantity):
+        """
+        Sets the quantity of an item already in the cart.
+
+        Args:
+            product: The product to be updated.
+            quantity (int): The new quantity of the product.
+
+        Returns:
+            None
+        """
+        with transaction.atomic():
+            self._lock()
+            self.cartitem_set.filter(item=product).update(quantity=quantity)
+            self.refresh_totals()
+
+    def merge(self, other):
+        """
+        Moves all items from another cart into this cart and deletes it.
+
+        Args:
+            other (Cart): The cart to merge, e.g. an AnonymousUser session cart.
+
+        Returns:
+            None
+        """
+        with transaction.atomic():
+            self._lock()
+            for cart_item in other.cartitem_set.select_related("item__product"):
+                CartItem.upsert(self, cart_item.item, cart_item.quantity)
+            other.delete()
+            self.refresh_totals()
+
+    def _lock(self):
+        """
+        Locks the cart row until the end of the current transaction so
+        concurrent updates to the same cart cannot interleave.
+        """
+        Cart.objects.select_for_update().only("id").get(pk=self.pk)
+
+    def refresh_totals(self):
+        """
+        Recalculates the stored totals from the cart items with one
+        aggregate query and saves them on the cart.
+
+        Returns:
+            None
+        """
+        price = Case(
+            When(item__product__sale_price__gt=0, then=F("item__product__sale_price")),
+            default=F("item__product__price"),
+        )
+        totals = self.cartitem_set.aggregate(
+            total_items=Sum("quantity"),
+            subtotal=Sum(
+                F("quantity") * price,
+                output_field=models.DecimalField(decimal_places=2, max_digits=10),
+            ),
+        )
+        self.total_items = totals["total_items"] or 0
+        self.subtotal = (totals["subtotal"] or Decimal(0)).quantize(Decimal("0.01"))
+        Cart.objects.filter(pk=self.pk).update(
+            total_items=self.total_items, subtotal=self.subtotal
+        )
+
+    def _ensure_totals(self):
+        if self.subtotal is None:
+            with transaction.atomic():
+                self._lock()
+                self.refresh_totals()
 
     def get_total_items(self):
         """
-        Calculates the total quantity of items in the cart.
+        Returns the total quantity of items in the cart.
 
         Returns:
             int: The total quantity of items in the cart.
         """
-        items = self.cartitem_set.all()
-        total_quantity = 0
-        for item in items:
-            total_quantity += item.quantity
-        return total_quantity
+        self._ensure_totals()
+        return self.total_items
 
     def get_total_price(self):
         """
-        Calculates the total price of all items in the cart.
+        Returns the total price of all items in the cart.
 
         Returns:
-            float: The total price of all items in the cart.
+            Decimal: The total price of all items in the cart.
         """
-        items = self.cartitem_set.all()
-        total_price = 0
-        for item in items:
-            total_price += item.quantity * item.item.product.get_price()
-        return total_price
+        self._ensure_totals()
+        return self.subtotal
 
     def as_dict(self):
         """
@@ -97,8 +275,6 @@ class Cart(models.Model):
         Returns:
             dict: A dictionary representation of the cart.
         """
-        items = {"items": []}
-        for item in self.cartitem_set.all():
-            item = dict({"item": item.item.id, "quantity": item.quantity})
-            items["items"].append(item)
-        return items
+        return {
+            "items": list(self.cartitem_set.order_by("id").values("item", "quantity"))
+        }
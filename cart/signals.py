@@ -0,0 +1,92 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from cart.models import Cart
+from products.models import deleted_with_product
+
+
+@receiver(user_logged_in)
+def merge_session_cart(sender, request, user, **kwargs):
+    """
+    Signal receiver function that moves the AnonymousUser cart into the User cart.
+
+    Runs once at login rather than on every render. Relies on the custom
+    session backend keeping the same session_key on login.
+
+    Args:
+        sender: The sender of the signal.
+        request: The HTTP request object of the login.
+        user: The user who has just logged in.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if request is None or request.session.session_key is None:
+        return
+    session_cart = Cart.objects.filter(session=request.session.session_key).first()
+    if session_cart is None:
+        return
+    cart = Cart.objects.get_or_create(user=user)[0]
+    cart.merge(session_cart)
+
+
+@receiver(post_save, sender="products.Product")
+def invalidate_cart_subtotals(sender, instance, created, **kwargs):
+    """
+    Signal receiver function that marks stored cart subtotals as stale when a
+    product's price or sale_price changes. Totals are recalculated on next read.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The Product instance that was saved.
+        created: Whether the product was just created.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if created or not instance.price_changed():
+        return
+    Cart.objects.filter(cartitem__item__product=instance).update(subtotal=None)
+    instance._loaded_prices = instance._current_prices()
+
+
+@receiver(pre_delete, sender="products.ProductVariant")
+def invalidate_carts_for_deleted_variant(sender, instance, origin=None, **kwargs):
+    """
+    Signal receiver function that marks stored cart totals as stale before a
+    product variant, and the cart items that reference it, are deleted.
+    Variants deleted with their product are handled once for the product,
+    see invalidate_carts_for_deleted_product.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The ProductVariant instance being deleted.
+        origin: The instance or queryset whose delete() was called.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if deleted_with_product(origin):
+        return
+    Cart.objects.filter(cartitem__item=instance).update(subtotal=None)
+
+
+@receiver(pre_delete, sender="products.Product")
+def invalidate_carts_for_deleted_product(sender, instance, **kwargs):
+    """
+    Signal receiver function that marks stored cart totals as stale before a
+    product, its variants and the cart items that reference them, are
+    deleted. One query, however many variants the product has.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The Product instance being deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    Cart.objects.filter(cartitem__item__product=instance).update(subtotal=None)
@@ -0,0 +1,103 @@
+from django.utils.functional import cached_property
+from cart.models import Cart
+
+
+class CartSnapshot:
+    """
+    Request-scoped view of the visitor's cart.
+
+    Nothing is queried until a value is first read, and each value is
+    computed at most once per request.
+
+    Attributes:
+        request (HttpRequest): The request the snapshot belongs to.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def has_session(self):
+        """
+        Whether the visitor can own a cart yet.
+
+        Returns:
+            bool: False for anonymous visitors without a session key.
+        """
+        return (
+            self.request.user.is_authenticated
+            or self.request.session.session_key is not None
+        )
+
+    def _owner(self):
+        if self.request.user.is_authenticated:
+            return {"user": self.request.user}
+        return {"session": self.request.session.session_key}
+
+    @cached_property
+    def cart(self):
+        """
+        The visitor's cart, created on first access.
+
+        Anonymous visitors are given a session key here so their cart
+        can be found again on the next request.
+
+        Returns:
+            Cart: The cart for the user or session.
+        """
+        if not self.has_session:
+            self.request.session.save()
+        cart = Cart.objects.get_or_create(**self._owner())[0]
+        self.__dict__["existing_cart"] = cart
+        return cart
+
+    @cached_property
+    def existing_cart(self):
+        """
+        The visitor's cart if they already have one. Unlike cart, this never
+        creates a cart or a session, so browsing does not create session rows.
+
+        Returns:
+            Cart: The cart for the user or session, or None.
+        """
+        if "cart" in self.__dict__:
+            return self.cart
+        if not self.has_session:
+            return None
+        cart = Cart.objects.filter(**self._owner()).first()
+        if cart is not None:
+            self.__dict__["cart"] = cart
+        return cart
+
+    @cached_property
+    def total_quantity(self):
+        """
+        Total number of items in the cart, used by the navbar badge.
+
+        Read from the totals stored on the cart with a single query,
+        without creating a cart for visitors who do not have one.
+
+        Returns:
+            int: The total quantity of items in the cart.
+        """
+        cart = self.existing_cart
+        if cart is None:
+            return 0
+        return cart.get_total_items()
+
+
+def get_cart_snapshot(request):
+    """
+    Returns the cart snapshot for a request, creating it on first use.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        CartSnapshot: The snapshot shared by views and context processors.
+    """
+    snapshot = getattr(request, "_cart_snapshot", None)
+    if snapshot is None:
+        snapshot = CartSnapshot(request)
+        request._cart_snapshot = snapshot
+    return snapshot
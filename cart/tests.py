@@ -0,0 +1,166 @@
+from decimal import Decimal
+from unittest import skipUnless
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from cart.models import Cart, CartItem
+from core.testing import TestCase, create_product
+from products.inventory import InsufficientStock, reserve_stock
+from products.models import ProductVariant
+from users.models import User
+
+
+class CartInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        sizes = [size for size, _ in ProductVariant.SIZES[:6]]
+        cls.deleted = create_product("100001", Decimal("50.00"), sizes)
+        cls.kept = create_product("100002", Decimal("20.00"), sizes[:1])
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session="session")
+        for variant in self.deleted.variants.all()[:2]:
+            self.cart.add_item(variant, 1)
+        self.cart.add_item(self.kept.variants.get(), 3)
+
+    def cart_updates(self, queries):
+        table = Cart._meta.db_table
+        return [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith(f'UPDATE "{table}"')
+        ]
+
+    def test_deleting_a_product_invalidates_carts_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.deleted.delete()
+        self.assertEqual(len(self.cart_updates(queries)), 1)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertIsNone(cart.subtotal)
+        self.assertEqual(cart.get_total_price(), Decimal("60.00"))
+        self.assertEqual(cart.get_total_items(), 3)
+
+    def test_deleting_a_variant_invalidates_carts(self):
+        self.deleted.variants.first().delete()
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertEqual(cart.get_total_price(), Decimal("110.00"))
+        self.assertEqual(cart.get_total_items(), 4)
+
+
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = create_product("100003", Decimal("50.00"), ["8"]).variants.get()
+        cls.second = create_product("100004", Decimal("20.00"), ["9"]).variants.get()
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session="session")
+        self.cart.add_item(self.first, 1)
+        self.cart.add_item(self.first, 2)
+        self.cart.add_item(self.second, 1)
+
+    def assertTotals(self, total_items, subtotal):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertEqual((cart.total_items, cart.subtotal), (total_items, subtotal))
+        # THE STORED TOTALS MATCH A FULL RECALCULATION FROM THE ITEMS
+        cart.refresh_totals()
+        self.assertEqual((cart.total_items, cart.subtotal), (total_items, subtotal))
+
+    def test_add_item(self):
+        self.assertTotals(4, Decimal("170.00"))
+        self.cart.add_item(self.second, 2)
+        self.assertTotals(6, Decimal("210.00"))
+
+    def test_update_item_quantity(self):
+        self.cart.update_item_quantity(self.first, 1)
+        self.assertTotals(2, Decimal("70.00"))
+
+    def test_remove_item(self):
+        self.cart.remove_item(self.second)
+        self.assertTotals(3, Decimal("150.00"))
+
+    def test_merge_adds_the_other_cart(self):
+        other = Cart.objects.create(session="other")
+        other.add_item(self.first, 1)
+        other.add_item(self.second, 2)
+        self.cart.merge(other)
+        self.assertTotals(7, Decimal("260.00"))
+        self.assertFalse(Cart.objects.filter(pk=other.pk).exists())
+
+
+class UpdateCartQuantityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant = create_product("100005", Decimal("50.00"), ["8"]).variants.get()
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session="session")
+        self.cart.add_item(self.variant, 2)
+        self.item = CartItem.objects.get(cart=self.cart)
+
+    def update(self, quantity):
+        return self.client.post(
+            f"/cart/update_cart_quantity/{self.item.id}/{quantity}/"
+        )
+
+    def stored_quantity(self):
+        return CartItem.objects.get(pk=self.item.pk).quantity
+
+    def test_raising_past_the_stock_is_refused(self):
+        self.assertEqual(self.update(11).status_code, 409)
+        self.assertEqual(self.stored_quantity(), 2)
+
+    def test_units_held_by_checkouts_are_not_available(self):
+        reserve_stock("other-checkout", [(self.variant.id, 3)])
+        self.assertEqual(self.update(8).status_code, 409)
+        self.assertEqual(self.update(7).status_code, 200)
+        self.assertEqual(self.stored_quantity(), 7)
+
+    def test_lowering_is_always_allowed(self):
+        ProductVariant.objects.filter(pk=self.variant.pk).update(quantity=0)
+        self.assertEqual(self.update(1).status_code, 200)
+        self.assertEqual(self.stored_quantity(), 1)
+
+
+class AddToCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant = create_product("100006", Decimal("50.00"), ["8"]).variants.get()
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session="session")
+        self.cart.add_item(self.variant, 8)
+
+    def test_adding_past_the_stock_is_refused(self):
+        with self.assertRaises(InsufficientStock):
+            self.cart.add_item(self.variant, 3)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertEqual((cart.total_items, cart.subtotal), (8, Decimal("400.00")))
+        self.assertEqual(CartItem.objects.get(cart=cart).quantity, 8)
+
+    def test_units_held_by_checkouts_are_not_available(self):
+        reserve_stock("other-checkout", [(self.variant.id, 2)])
+        with self.assertRaises(InsufficientStock):
+            self.cart.add_item(self.variant, 1)
+
+    def test_the_view_answers_409_when_the_stock_runs_out(self):
+        user = User.objects.create_user("buyer@example.com", "Buy", "Er")
+        Cart.objects.filter(pk=self.cart.pk).update(session=None, user=user)
+        self.client.force_login(user)
+        response = self.client.post(
+            "/products/add_to_cart/",
+            {"product_variant": self.variant.id, "quantity": 3},
+        )
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(
+            "/products/add_to_cart/",
+            {"product_variant": self.variant.id, "quantity": 2},
+        )
+        self.assertContains(response, ">10</div>")
+
+    @skipUnless(connection.vendor == "postgresql", "Single statement on PostgreSQL")
+    def test_adding_is_a_single_statement(self):
+        with self.assertNumQueries(1):
+            self.cart.add_item(self.variant, 1)
+        self.assertEqual(
+            (self.cart.total_items, self.cart.subtotal), (9, Decimal("450.00"))
+        )
@@ -1,7 +1,10 @@
 from django.shortcuts import render
+from products.inventory import InsufficientStock, available_to_sell
 from products.models import ProductVariant
+from products.queries import with_primary_image
 from django.http import HttpResponse
-from .models import Cart, CartItem
+from .models import CartItem
+from .snapshot import get_cart_snapshot
 
 
 def add_to_cart(request):
@@ -14,17 +17,24 @@ def add_to_cart(request):
     Returns:
         HttpResponse: The HTTP response containing the cart counter badge.
     """
-    product = ProductVariant.objects.filter(
-        id=request.POST.get("product_variant")
-    ).first()
-    if request.user.is_authenticated:
-        cart = Cart.objects.get_or_create(user=request.user)[0]
-    else:
-        cart = Cart.objects.get_or_create(session=request.session.session_key)[0]
+    product = (
+        ProductVariant.objects.select_related("product")
+        .filter(id=request.POST.get("product_variant"))
+        .first()
+    )
+    cart = get_cart_snapshot(request).cart
     quantity = int(request.POST.get("quantity"))
-    cart.add_item(product, quantity)
-    cart_total_quantity = cart.get_total_items()
-    badge_quantity = cart_total_quantity
+    # DO NOT LET THE BAG HOLD MORE THAN IS AVAILABLE TO SELL, add_item CHECKS
+    # THE STOCK UNDER THE CART LOCK SO CONCURRENT ADDS CANNOT BOTH PASS
+    try:
+        if product is None:
+            raise InsufficientStock([request.POST.get("product_variant")])
+        cart.add_item(product, quantity)
+    except InsufficientStock:
+        return HttpResponse(
+            "Sorry, there is not enough stock in this size.", status=409
+        )
+    badge_quantity = cart.get_total_items()
     if badge_quantity > 99:
         badge_quantity = "99+"
     return HttpResponse(
@@ -50,11 +60,10 @@ def remove_from_cart(request, cart_item_id):
     Returns:
         HttpResponse: The HTTP response containing the updated cart information.
     """
-    cart_item = CartItem.objects.get(id=cart_item_id)
+    cart_item = CartItem.objects.select_related("cart").get(id=cart_item_id)
     cart = cart_item.cart
-    cart_item.delete()
-    cart_total_quantity = cart.get_total_items()
-    badge_quantity = cart_total_quantity
+    cart.remove_item(cart_item.item_id)
+    badge_quantity = cart.get_total_items()
     if badge_quantity > 99:
         badge_quantity = "99+"
 
@@ -84,13 +93,17 @@ def update_cart_quantity(request, cart_item_id, quantity):
     Returns:
         HttpResponse: The HTTP response containing the updated cart information.
     """
-    cart_item = CartItem.objects.get(id=cart_item_id)
+    cart_item = CartItem.objects.select_related("cart").get(id=cart_item_id)
+    # AS IN add_to_cart, DO NOT LET THE BAG HOLD MORE THAN IS AVAILABLE TO SELL
+    if quantity > cart_item.quantity and quantity > available_to_sell(
+        cart_item.item_id
+    ):
+        return HttpResponse(
+            "Sorry, there is not enough stock in this size.", status=409
+        )
     cart = cart_item.cart
-    cart_item.quantity = quantity
-    cart_item.save()
-    cart.save()
-    cart_total_quantity = cart.get_total_items()
-    badge_quantity = cart_total_quantity
+    cart.update_item_quantity(cart_item.item_id, quantity)
+    badge_quantity = cart.get_total_items()
     if badge_quantity > 99:
         badge_quantity = "99+"
 
@@ -114,15 +127,18 @@ def cart_view(request):
 
     If the user is authenticated, the function retrieves the cart associated with the user.
     Otherwise, it retrieves the cart associated with the session.
+    Visitors without a cart see an empty cart without one being created.
+    Lines are loaded with their products and first images in two queries.
 
     Returns:
         A rendered HTML template displaying the cart items and cart details.
     """
-    if request.user.is_authenticated:
-        cart = Cart.objects.get_or_create(user=request.user)[0]
-    else:
-        cart = Cart.objects.get_or_create(session=request.session.session_key)[0]
-    cart_items = cart.cartitem_set.all()
+    cart = get_cart_snapshot(request).existing_cart
+    cart_items = (
+        with_primary_image(cart.cartitem_set.order_by("id"), "item__product")
+        if cart
+        else []
+    )
 
     context = {
         "cart_items": cart_items,
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from checkout.models import Order, OrderItem, OrderAddress
+from checkout.models import (
+    CheckoutSession,
+    Order,
+    OrderAddress,
+    OrderItem,
+    WebhookEvent,
+)
 
 
 class OrderAdmin(admin.ModelAdmin):
@@ -11,3 +17,20 @@ class OrderAdmin(admin.ModelAdmin):
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
 admin.site.register(OrderAddress)
+
+
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ["event_id", "type", "status", "attempts", "received_at"]
+    search_fields = ["event_id"]
+    list_filter = ["status", "type"]
+
+
+admin.site.register(WebhookEvent, WebhookEventAdmin)
+
+
+class CheckoutSessionAdmin(admin.ModelAdmin):
+    list_display = ["order_id", "user", "amount", "date_created"]
+    search_fields = ["order_id", "email"]
+
+
+admin.site.register(CheckoutSession, CheckoutSessionAdmin)
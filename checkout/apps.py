@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CheckoutConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "checkout"
+
+    def ready(self):
+        from django.core import checks
+        from checkout import gateway
+        from checkout.checks import check_stripe_webhook_secret
+
+        gateway.configure()
+        checks.register(check_stripe_webhook_secret)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Error
+
+
+def check_stripe_webhook_secret(app_configs, **kwargs):
+    """
+    Fails startup when Stripe events cannot be verified.
+
+    Without STRIPE_WEBHOOK_SECRET every webhook request is rejected, so no
+    event is queued and no order is ever created. Only DEBUG runs may leave
+    it unset.
+
+    Returns:
+        list: The errors found.
+    """
+    if settings.STRIPE_WEBHOOK_SECRET or settings.DEBUG:
+        return []
+    return [
+        Error(
+            "STRIPE_WEBHOOK_SECRET is not set, every Stripe webhook would be "
+            "rejected.",
+            hint="Set it to the signing secret (whsec_...) of the webhook "
+            "endpoint in the Stripe dashboard.",
+            id="checkout.E001",
+        )
+    ]
@@ -0,0 +1,162 @@
+import json
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def parse_form(body):
+    """
+    Parses a Stripe form-encoded body, e.g. metadata[email]=x, into a dict.
+
+    Args:
+        body (str): The request body.
+
+    Returns:
+        dict: The parameters, with bracketed keys as nested dicts.
+    """
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+class FakeStripe:
+    """
+    In-memory stand-in for the PaymentIntent endpoints of the Stripe API.
+
+    Attributes:
+        latency (float): Seconds added to every response, to mimic the
+            round trip to Stripe when benchmarking.
+        intents (dict): PaymentIntents by ID.
+        idempotent (dict): Responses by idempotency key.
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.intents = {}
+        self.idempotent = {}
+        self.lock = threading.Lock()
+
+    def create_payment_intent(self, params):
+        intent_id = f"pi_{secrets.token_hex(12)}"
+        intent = {
+            "id": intent_id,
+            "object": "payment_intent",
+            "amount": int(params.get("amount", 0)),
+            "currency": params.get("currency", "eur"),
+            "client_secret": f"{intent_id}_secret_{secrets.token_hex(12)}",
+            "created": int(time.time()),
+            "livemode": False,
+            "metadata": params.get("metadata", {}),
+            "status": "requires_payment_method",
+        }
+        self.intents[intent_id] = intent
+        return 200, intent
+
+    def update_payment_intent(self, intent_id, params):
+        intent = self.intents.get(intent_id)
+        if intent is None:
+            return self.not_found(intent_id)
+        # LIKE STRIPE, SENT KEYS ARE MERGED AND EMPTY VALUES REMOVE A KEY
+        for key, value in params.get("metadata", {}).items():
+            if value == "":
+                intent["metadata"].pop(key, None)
+            else:
+                intent["metadata"][key] = value
+        return 200, intent
+
+    def retrieve_payment_intent(self, intent_id):
+        intent = self.intents.get(intent_id)
+        if intent is None:
+            return self.not_found(intent_id)
+        return 200, intent
+
+    @staticmethod
+    def not_found(intent_id):
+        return 404, {
+            "error": {
+                "type": "invalid_request_error",
+                "message": f"No such payment_intent: '{intent_id}'",
+            }
+        }
+
+    def handle(self, method, path, headers, body):
+        """
+        Routes a request to the matching endpoint.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path.
+            headers (dict): The request headers.
+            body (str): The request body.
+
+        Returns:
+            tuple: The status code and the JSON response.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        params = parse_form(body)
+        match = re.fullmatch(r"/v1/payment_intents(?:/([\w]+))?", path)
+        if match is None:
+            return 404, {"error": {"type": "invalid_request_error"}}
+        intent_id = match.group(1)
+        with self.lock:
+            if method == "GET" and intent_id:
+                return self.retrieve_payment_intent(intent_id)
+            if method != "POST":
+                return 405, {"error": {"type": "invalid_request_error"}}
+            key = headers.get("Idempotency-Key")
+            if key in self.idempotent:
+                return self.idempotent[key]
+            if intent_id:
+                response = self.update_payment_intent(intent_id, params)
+            else:
+                response = self.create_payment_intent(params)
+            if key:
+                self.idempotent[key] = response
+            return response
+
+
+def make_server(port, latency=0):
+    """
+    Builds an HTTP server serving a FakeStripe on localhost.
+
+    Args:
+        port (int): The port to listen on.
+        latency (float): Seconds added to every response.
+
+    Returns:
+        ThreadingHTTPServer: The server, not yet started.
+    """
+    fake = FakeStripe(latency=latency)
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8")
+            url = urlsplit(self.path)
+            if url.query:
+                body = f"{body}&{url.query}" if body else url.query
+            status, data = fake.handle(self.command, url.path, self.headers, body)
+            content = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = respond
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.fake = fake
+    return server
@@ -0,0 +1,112 @@
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from core.instrumentation import TimedSession
+
+
+def build_http_client():
+    """
+    Builds the HTTP client shared by every Stripe call in the process.
+
+    One requests session keeps connections to Stripe alive between calls,
+    so only the first request of a worker pays for the TLS handshake.
+
+    Returns:
+        stripe.http_client.RequestsClient: The client to use for Stripe calls.
+    """
+    session = TimedSession("stripe")
+    adapter = HTTPAdapter(pool_maxsize=settings.STRIPE_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return stripe.http_client.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+
+
+def configure():
+    """
+    Points the stripe library at the configured API and the shared client.
+
+    Network errors are retried by the library, which also adds an
+    idempotency key to retried POSTs so they cannot run twice.
+
+    Returns:
+        None
+    """
+    stripe.api_key = settings.STRIPE_PRIVATE_KEY
+    stripe.api_base = settings.STRIPE_API_BASE
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = build_http_client()
+
+
+def create_payment_intent(amount, metadata, idempotency_key):
+    """
+    Creates a PaymentIntent in euro.
+
+    Args:
+        amount (int): The amount to charge, in cents.
+        metadata (dict): Metadata to attach to the PaymentIntent.
+        idempotency_key (str): Key that makes a repeated call return the
+            PaymentIntent created by the first one.
+
+    Returns:
+        stripe.PaymentIntent: The created PaymentIntent.
+    """
+    return stripe.PaymentIntent.create(
+        amount=amount,
+        currency="eur",
+        automatic_payment_methods={"enabled": True},
+        metadata=metadata,
+        idempotency_key=idempotency_key,
+    )
+
+
+def retrieve_payment_intent(intent_id):
+    """
+    Retrieves a PaymentIntent.
+
+    Args:
+        intent_id (str): The ID of the PaymentIntent.
+
+    Returns:
+        stripe.PaymentIntent: The PaymentIntent.
+    """
+    return stripe.PaymentIntent.retrieve(intent_id)
+
+
+def update_payment_intent_metadata(intent_id, **metadata):
+    """
+    Sets metadata keys on a PaymentIntent in a single call.
+
+    Stripe merges the keys sent into the existing metadata, so the
+    PaymentIntent does not need to be retrieved first.
+
+    Args:
+        intent_id (str): The ID of the PaymentIntent.
+        **metadata: The keys to set.
+
+    Returns:
+        stripe.PaymentIntent: The updated PaymentIntent.
+    """
+    return stripe.PaymentIntent.modify(intent_id, metadata=metadata)
+
+
+def construct_event(payload, signature):
+    """
+    Verifies the signature of a webhook request and parses its event.
+
+    Args:
+        payload (bytes): The raw request body.
+        signature (str): The Stripe-Signature header.
+
+    Returns:
+        stripe.Event: The verified event.
+
+    Raises:
+        ValueError: If the payload is not valid JSON.
+        stripe.error.SignatureVerificationError: If the signature is invalid.
+    """
+    return stripe.Webhook.construct_event(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET
+    )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from checkout.fake_stripe import make_server
+
+
+class Command(BaseCommand):
+    """
+    Runs a local fake of the Stripe PaymentIntent API.
+
+    Point the app at it with STRIPE_API_BASE=http://localhost:<port> to
+    exercise and benchmark checkout without network access to Stripe.
+    """
+
+    help = "Run a local fake Stripe API server."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--port",
+            type=int,
+            default=12111,
+            help="Port to listen on (default 12111).",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            help="Seconds added to every response (default 0).",
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(options["port"], options["latency"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Fake Stripe listening on 127.0.0.1:{options['port']}")
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from checkout.webhooks import process_next_event
+
+
+class Command(BaseCommand):
+    """
+    Processes the Stripe webhook events stored by the webhook view.
+
+    Runs as a long-lived worker by default, polling for due events. Failed
+    events are retried with exponential backoff until they succeed or run
+    out of attempts. Several workers can run side by side.
+    """
+
+    help = "Process queued Stripe webhook events."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the events that are due, then exit.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when no event is due (default 1).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                close_old_connections()
+                event = process_next_event()
+                if event is None:
+                    break
+                processed += 1
+                self.stdout.write(f"{event.status}: {event}")
+            if options["once"]:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Processed {processed} webhook events.")
+                )
+                return
+            time.sleep(options["poll_interval"])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from checkout.models import CheckoutSession
+
+
+class Command(BaseCommand):
+    """
+    Deletes checkout sessions older than CHECKOUT_SESSION_RETENTION.
+
+    Replaced and abandoned checkouts are kept for a while so a payment
+    made from an old tab can still be turned into an order. This can run
+    as an infrequent cron job, next to purge_reservations.
+    """
+
+    help = "Delete old checkout sessions."
+
+    def handle(self, *args, **options):
+        deleted = CheckoutSession.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} checkout sessions."))
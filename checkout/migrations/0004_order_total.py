@@ -0,0 +1,50 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:31
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    # LINES STILL HOLD THEIR LINE TOTAL HERE, 0006_orderitem_unit_price
+    # CONVERTS THEM TO UNIT PRICES LATER, SO THE PRICES ARE SUMMED AS THEY ARE.
+    # ONE UPDATE STATEMENT
+    Order = apps.get_model("checkout", "Order")
+    OrderItem = apps.get_model("checkout", "OrderItem")
+    totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum("price"))
+        .values("total")
+    )
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(totals, output_field=models.DecimalField()),
+            Value(Decimal(0)),
+            output_field=models.DecimalField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checkout", "0003_webhook_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=10
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-date_created", "-id"], name="order_user_date_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
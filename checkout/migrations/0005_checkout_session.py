@@ -0,0 +1,32 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("checkout", "0004_order_total"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CheckoutSession",
+            fields=[
+                ("order_id", models.UUIDField(primary_key=True, serialize=False)),
+                ("email", models.EmailField(max_length=254)),
+                ("items", models.JSONField()),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.4 on 2026-10-18 14:05
+
+from django.db import migrations
+from django.db.models import F
+
+
+def line_totals_to_unit_prices(apps, schema_editor):
+    # LINES WRITTEN BEFORE Order.create_from_payment STORED QUANTITY * PRICE.
+    # EVERY LINE IN THE TABLE WHEN THIS RUNS IS ONE OF THEM, ONE UPDATE
+    OrderItem = apps.get_model("checkout", "OrderItem")
+    OrderItem.objects.filter(quantity__gt=1).update(price=F("price") / F("quantity"))
+
+
+def unit_prices_to_line_totals(apps, schema_editor):
+    OrderItem = apps.get_model("checkout", "OrderItem")
+    OrderItem.objects.filter(quantity__gt=1).update(price=F("price") * F("quantity"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("checkout", "0005_checkout_session"),
+    ]
+
+    operations = [
+        migrations.RunPython(line_totals_to_unit_prices, unit_prices_to_line_totals),
+    ]
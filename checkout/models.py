@@ -1,5 +1,12 @@
-from django.db import models
-from users.models import Address
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from products.inventory import commit_stock
+from products.models import ProductVariant
+from users.models import Address, User, UserAddress
 
 
 class OrderItem(models.Model):
@@ -10,7 +17,7 @@ class OrderItem(models.Model):
         order (Order): The order to which this item belongs.
         item (ProductVariant): The product variant associated with this item.
         quantity (int): The quantity of this item in the order.
-        price (Decimal): The price of this item.
+        price (Decimal): The unit price of this item when it was ordered.
     """
 
     order = models.ForeignKey("checkout.Order", on_delete=models.CASCADE)
@@ -29,6 +36,7 @@ class Order(models.Model):
         address (OrderAddress): The address associated with the order.
         email (str): The email address of the user who placed the order.
         date_created (datetime): The date and time when the order was created.
+        total (Decimal): The total price of the order, stored when it is created.
     """
 
     order_id = models.CharField()
@@ -40,19 +48,86 @@ class Order(models.Model):
     )
     email = models.EmailField()
     date_created = models.DateTimeField(auto_now_add=True)
+    total = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "-date_created", "-id"],
+                name="order_user_date_idx",
+            ),
+        ]
 
     def get_total(self):
         """
-        Calculates and returns the total price of the order.
+        Returns the total price of the order.
 
         Returns:
-            float: The total price of the order.
+            Decimal: The total price of the order.
+        """
+        return self.total
+
+    @classmethod
+    def create_from_payment(cls, order_id, email, address_id, items):
         """
-        order_items = self.orderitem_set.all()
-        total = 0
-        for item in order_items:
-            total += item.price * item.quantity
-        return total
+        Creates an order, its address and its lines in a single transaction.
+
+        All variants are fetched with their products in one query and the
+        lines are inserted with one bulk insert, so the number of queries
+        does not grow with the size of the basket. The order total is
+        stored with the order and the sold units are taken out of stock
+        in the same transaction.
+
+        Args:
+            order_id (str): The ID of the order.
+            email (str): The email address of the customer.
+            address_id (int): The ID of the user address to ship to.
+            items (list): Dicts with the "item" (variant id) and "quantity".
+
+        Returns:
+            Order: The created order.
+        """
+        with transaction.atomic():
+            user_address = UserAddress.objects.select_related("user").get(id=address_id)
+            user = user_address.user
+            if user.email != email:
+                user = User.objects.get(email=email)
+            order_address = OrderAddress.create_from_user_address(
+                order=None, user_address=user_address
+            )
+            order_address.save()
+            variants = ProductVariant.objects.select_related("product").in_bulk(
+                [item.get("item") for item in items]
+            )
+            order_items = [
+                OrderItem(
+                    item=variants[int(item.get("item"))],
+                    quantity=item.get("quantity"),
+                    price=variants[int(item.get("item"))].product.get_price(),
+                )
+                for item in items
+            ]
+            order = cls.objects.create(
+                order_id=order_id,
+                user=user,
+                email=email,
+                address=order_address,
+                total=sum(
+                    (item.price * item.quantity for item in order_items), Decimal(0)
+                ),
+            )
+            # LINK THE ADDRESS BACK WITHOUT RE-SAVING EVERY COLUMN
+            OrderAddress.objects.filter(pk=order_address.pk).update(order=order)
+            order_address.order = order
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            commit_stock(
+                order_id, [(item.get("item"), item.get("quantity")) for item in items]
+            )
+        return order
 
 
 class OrderAddress(Address):
@@ -89,3 +164,141 @@ class OrderAddress(Address):
             county=user_address.county,
             eircode=user_address.eircode,
         )
+
+
+class WebhookEvent(models.Model):
+    """
+    A Stripe webhook event waiting to be processed by the webhook worker.
+
+    Events are stored by the webhook view and processed later by the
+    process_webhooks command, so Stripe gets its response immediately.
+    The unique event_id makes Stripe's retries of the same event no-ops.
+
+    Attributes:
+        event_id (str): The Stripe event ID.
+        type (str): The Stripe event type, e.g. "payment_intent.succeeded".
+        payload (dict): The raw event as sent by Stripe.
+        status (str): Where the event is in the queue.
+        attempts (int): The number of failed processing attempts.
+        next_attempt_at (datetime): When the worker may next pick the event up.
+        last_error (str): The error raised by the last failed attempt.
+        received_at (datetime): When the event was received.
+        processed_at (datetime): When the event was processed successfully.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=models.Q(status="pending"),
+                name="webhook_event_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+
+class CheckoutSession(models.Model):
+    """
+    Server-side snapshot of a cart taken when its PaymentIntent is created.
+
+    Only the order ID goes into the PaymentIntent metadata, which keeps the
+    Stripe payload the same size for any basket, and the webhook reads the
+    lines back from here.
+
+    Attributes:
+        order_id (UUID): The ID of the order the payment is for.
+        user (User): The user checking out.
+        email (str): The email address of the user.
+        items (list): Dicts with the "item" (variant id) and "quantity".
+        amount (Decimal): The amount charged.
+        date_created (datetime): When the checkout was last started, a
+            reload of the same cart moves it forward with its stock hold.
+    """
+
+    order_id = models.UUIDField(primary_key=True)
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE)
+    email = models.EmailField()
+    items = models.JSONField()
+    amount = models.DecimalField(decimal_places=2, max_digits=10)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    # NAMESPACE OF THE ORDER IDS DERIVED FROM CARTS, NEVER CHANGE IT
+    ORDER_ID_NAMESPACE = uuid.UUID("174cb91d-f573-44e8-b978-ff576764e65a")
+
+    def __str__(self):
+        return str(self.order_id)
+
+    @classmethod
+    def holding_stock(cls, user):
+        """
+        Returns the user's checkouts recent enough to still hold stock.
+
+        Older checkouts were replaced or abandoned and their holds have
+        expired, so they are never looked at again and the number of rows
+        read per checkout stays small.
+
+        Args:
+            user (User): The user checking out.
+
+        Returns:
+            QuerySet: The checkout sessions.
+        """
+        started_after = timezone.now() - timedelta(
+            seconds=settings.STOCK_RESERVATION_TTL
+        )
+        return cls.objects.filter(user=user, date_created__gt=started_after)
+
+    @classmethod
+    def purge_expired(cls):
+        """
+        Deletes checkout sessions older than CHECKOUT_SESSION_RETENTION.
+
+        Returns:
+            int: The number of deleted sessions.
+        """
+        started_before = timezone.now() - timedelta(
+            seconds=settings.CHECKOUT_SESSION_RETENTION
+        )
+        return cls.objects.filter(date_created__lt=started_before).delete()[0]
+
+    @classmethod
+    def order_id_for(cls, cart, items, amount):
+        """
+        Derives the order ID of a checkout from the cart, its lines and its
+        total.
+
+        The same cart contents always get the same ID, so a reload or a
+        retried request reuses the stock hold and, through the idempotency
+        key, the PaymentIntent. Any change to the cart gives a new ID.
+
+        Args:
+            cart (Cart): The cart being checked out.
+            items (list): Dicts with the "item" (variant id) and "quantity".
+            amount (Decimal): The total of the cart.
+
+        Returns:
+            str: The order ID.
+        """
+        lines = ",".join(f"{item['item']}x{item['quantity']}" for item in items)
+        return str(uuid.uuid5(cls.ORDER_ID_NAMESPACE, f"{cart.pk}:{amount}:{lines}"))
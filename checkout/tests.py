@@ -0,0 +1,360 @@
+import threading
+import stripe
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.utils import timezone
+from cart.models import Cart
+from checkout.checks import check_stripe_webhook_secret
+from checkout.models import CheckoutSession, Order, WebhookEvent
+from checkout.webhooks import (
+    HANDLERS,
+    MAX_ATTEMPTS,
+    backoff,
+    enqueue_event,
+    process_next_event,
+)
+from core.testing import TestCase, create_product
+from products.inventory import reserve_stock
+from products.models import ProductVariant, StockReservation
+from users.models import User, UserAddress
+
+
+def fake_payment_intent(amount, metadata, idempotency_key):
+    return {
+        "id": f"pi_{idempotency_key}",
+        "client_secret": "secret",
+        "amount": amount,
+        "metadata": metadata,
+    }
+
+
+@mock.patch("checkout.gateway.create_payment_intent", side_effect=fake_payment_intent)
+class CreatePaymentIntentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.variant = create_product("500001", quantity=1).variants.get()
+        cls.user = User.objects.create_user("buyer@example.com", "Buy", "Er")
+        cls.other = User.objects.create_user("other@example.com", "Oth", "Er")
+
+    def setUp(self):
+        Cart.objects.create(user=self.user).add_item(self.variant, 1)
+        self.client.force_login(self.user)
+
+    def checkout(self):
+        return self.client.post("/create_payment_intent/")
+
+    def test_reloading_the_checkout_keeps_the_last_unit(self, create_payment_intent):
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(self.checkout().status_code, 200)
+        # ONLY THE LATEST CHECKOUT HOLDS THE UNIT
+        self.assertEqual(
+            StockReservation.objects.filter(variant=self.variant).count(), 1
+        )
+
+    def test_another_customers_hold_still_counts(self, create_payment_intent):
+        # THE OTHER CUSTOMER BAGGED THE UNIT BEFORE IT WAS HELD
+        Cart.objects.create(user=self.other).add_item(self.variant, 1)
+        self.assertEqual(self.checkout().status_code, 200)
+        self.client.force_login(self.other)
+        self.assertEqual(self.checkout().status_code, 409)
+
+    def idempotency_keys(self, create_payment_intent):
+        return [
+            call.kwargs["idempotency_key"]
+            for call in create_payment_intent.call_args_list
+        ]
+
+    def test_retries_reuse_the_idempotency_key(self, create_payment_intent):
+        self.checkout()
+        self.checkout()
+        first, retry = self.idempotency_keys(create_payment_intent)
+        self.assertEqual(first, retry)
+        self.assertEqual(CheckoutSession.objects.filter(user=self.user).count(), 1)
+
+    def test_a_changed_cart_gets_a_new_idempotency_key(self, create_payment_intent):
+        self.checkout()
+        Cart.objects.get(user=self.user).update_item_quantity(self.variant, 2)
+        ProductVariant.objects.filter(pk=self.variant.pk).update(quantity=2)
+        self.checkout()
+        first, changed = self.idempotency_keys(create_payment_intent)
+        self.assertNotEqual(first, changed)
+
+    def test_a_paid_cart_is_not_charged_again(self, create_payment_intent):
+        self.checkout()
+        session = CheckoutSession.objects.get(user=self.user)
+        # AS THE WEBHOOK DOES FOR A SUCCEEDED PAYMENT
+        Order.create_from_payment(
+            order_id=str(session.order_id),
+            email=session.email,
+            address_id=UserAddress.objects.create(user=self.user).id,
+            items=session.items,
+        )
+        response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(create_payment_intent.call_count, 1)
+
+    def test_the_receipt_email_is_sent_back_in_the_metadata(
+        self, create_payment_intent
+    ):
+        intent = self.checkout().json()["intent"]
+        self.assertEqual(intent["metadata"]["email"], "buyer@example.com")
+
+    def test_a_failed_payment_intent_leaves_no_session_or_hold(
+        self, create_payment_intent
+    ):
+        create_payment_intent.side_effect = stripe.error.APIConnectionError("down")
+        self.assertEqual(self.checkout().status_code, 403)
+        self.assertFalse(CheckoutSession.objects.filter(user=self.user).exists())
+        self.assertFalse(StockReservation.objects.filter(variant=self.variant).exists())
+
+    def create_old_sessions(self, seconds_ago):
+        CheckoutSession.objects.bulk_create(
+            [
+                CheckoutSession(
+                    order_id=f"9f1c7a7e-0000-4000-8000-00000000010{n}",
+                    user=self.user,
+                    email=self.user.email,
+                    items=[],
+                    amount=100,
+                )
+                for n in range(3)
+            ]
+        )
+        CheckoutSession.objects.update(
+            date_created=timezone.now() - timedelta(seconds=seconds_ago)
+        )
+
+    def test_checkouts_past_their_hold_are_not_replaced_again(
+        self, create_payment_intent
+    ):
+        self.create_old_sessions(seconds_ago=3600)
+        with mock.patch(
+            "checkout.views.reserve_stock", wraps=reserve_stock
+        ) as wrapped_reserve_stock:
+            self.checkout()
+        self.assertEqual(wrapped_reserve_stock.call_args.kwargs["replaces"], [])
+
+    def test_a_reload_moves_the_checkout_forward(self, create_payment_intent):
+        self.checkout()
+        CheckoutSession.objects.update(date_created=timezone.now() - timedelta(hours=1))
+        self.checkout()
+        session = CheckoutSession.objects.get(user=self.user)
+        self.assertGreater(session.date_created, timezone.now() - timedelta(minutes=1))
+
+    def test_old_sessions_are_purged(self, create_payment_intent):
+        self.create_old_sessions(seconds_ago=8 * 86400)
+        self.checkout()
+        stdout = StringIO()
+        call_command("purge_checkout_sessions", stdout=stdout)
+        self.assertIn("Purged 3 checkout sessions.", stdout.getvalue())
+        self.assertEqual(CheckoutSession.objects.filter(user=self.user).count(), 1)
+
+
+class StripeWebhookSecretCheckTests(SimpleTestCase):
+    @override_settings(STRIPE_WEBHOOK_SECRET="", DEBUG=False)
+    def test_a_missing_secret_fails_startup(self):
+        errors = check_stripe_webhook_secret(None)
+        self.assertEqual([error.id for error in errors], ["checkout.E001"])
+
+    @override_settings(STRIPE_WEBHOOK_SECRET="", DEBUG=True)
+    def test_debug_runs_may_leave_it_unset(self):
+        self.assertEqual(check_stripe_webhook_secret(None), [])
+
+
+class OrderMigrationTests(TransactionTestCase):
+    """
+    Runs the checkout data migrations on order lines written before
+    Order.create_from_payment, when OrderItem.price held the line total.
+    Plain TransactionTestCase, migrations are not held to the query detector.
+    """
+
+    def migrate(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("checkout", name)])
+        return executor.loader.project_state(("checkout", name)).apps
+
+    def setUp(self):
+        apps = self.migrate("0003_webhook_event")
+        user = User.objects.create_user("old@example.com", "Ol", "D")
+        variant = create_product("700001", quantity=5).variants.get()
+        address = apps.get_model("checkout", "OrderAddress").objects.create(
+            user_id=user.pk
+        )
+        order = apps.get_model("checkout", "Order").objects.create(
+            order_id="old", user_id=user.pk, address=address, email=user.email
+        )
+        apps.get_model("checkout", "OrderItem").objects.bulk_create(
+            [
+                # THREE UNITS AT 100.00 AND ONE AT 50.00, STORED AS LINE TOTALS
+                apps.get_model("checkout", "OrderItem")(
+                    order=order, item_id=variant.pk, quantity=3, price="300.00"
+                ),
+                apps.get_model("checkout", "OrderItem")(
+                    order=order, item_id=variant.pk, quantity=1, price="50.00"
+                ),
+            ]
+        )
+        self.addCleanup(self.migrate, "0006_orderitem_unit_price")
+
+    def test_order_totals_are_backfilled_from_line_totals(self):
+        apps = self.migrate("0004_order_total")
+        order = apps.get_model("checkout", "Order").objects.get(order_id="old")
+        self.assertEqual(order.total, Decimal("350.00"))
+
+    def test_line_totals_become_unit_prices(self):
+        apps = self.migrate("0006_orderitem_unit_price")
+        prices = apps.get_model("checkout", "OrderItem").objects.order_by("id")
+        self.assertEqual(
+            list(prices.values_list("price", flat=True)),
+            [Decimal("100.00"), Decimal("50.00")],
+        )
+
+
+def payment_intent_event(event_id, event_type, order_id="order-1"):
+    return {
+        "id": event_id,
+        "type": event_type,
+        "data": {"object": {"metadata": {"order_id": order_id}}},
+    }
+
+
+class PaymentIntentEndedTests(TestCase):
+    def setUp(self):
+        variant = create_product("800001", quantity=1).variants.get()
+        reserve_stock("order-1", [(variant.id, 1)])
+
+    def test_a_failed_payment_keeps_its_hold_for_a_retry(self):
+        enqueue_event(payment_intent_event("evt_1", "payment_intent.payment_failed"))
+        process_next_event()
+        self.assertTrue(StockReservation.objects.filter(reference="order-1").exists())
+
+    def test_a_canceled_payment_releases_its_hold(self):
+        enqueue_event(payment_intent_event("evt_1", "payment_intent.canceled"))
+        process_next_event()
+        self.assertFalse(StockReservation.objects.filter(reference="order-1").exists())
+
+
+class WebhookQueueTests(TestCase):
+    def setUp(self):
+        variant = create_product("800002", quantity=2).variants.get()
+        user = User.objects.create_user("payer@example.com", "Pay", "Er")
+        self.address = UserAddress.objects.create(user=user)
+        CheckoutSession.objects.create(
+            order_id="9f1c7a7e-0000-4000-8000-000000000001",
+            user=user,
+            email=user.email,
+            items=[{"item": variant.id, "quantity": 1}],
+            amount=100,
+        )
+
+    def succeeded(self, event_id):
+        event = payment_intent_event(
+            event_id,
+            "payment_intent.succeeded",
+            "9f1c7a7e-0000-4000-8000-000000000001",
+        )
+        event["data"]["object"]["metadata"]["address"] = self.address.id
+        return event
+
+    def unfulfillable(self, event_id):
+        return payment_intent_event(
+            event_id,
+            "payment_intent.succeeded",
+            "9f1c7a7e-0000-4000-8000-000000000002",
+        )
+
+    def process_webhooks(self):
+        stdout = StringIO()
+        call_command("process_webhooks", once=True, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_a_redelivered_event_is_stored_and_processed_once(self):
+        enqueue_event(self.succeeded("evt_1"))
+        enqueue_event(self.succeeded("evt_1"))
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertIn("Processed 1 webhook events.", self.process_webhooks())
+        self.assertIn("Processed 0 webhook events.", self.process_webhooks())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.DONE)
+        self.assertFalse(CheckoutSession.objects.exists())
+
+    def test_the_same_payment_under_another_event_id_makes_one_order(self):
+        enqueue_event(self.succeeded("evt_1"))
+        enqueue_event(self.succeeded("evt_2"))
+        self.assertIn("Processed 2 webhook events.", self.process_webhooks())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_a_failing_event_is_retried_with_backoff(self):
+        # NO CHECKOUT SESSION AND NO BASKET IN THE METADATA, THE HANDLER RAISES
+        enqueue_event(self.unfulfillable("evt_1"))
+        with self.assertLogs("checkout.webhooks", "WARNING"):
+            event = process_next_event()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.PENDING, 1))
+        self.assertTrue(event.last_error)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertFalse(Order.objects.exists())
+        # NOT DUE UNTIL THE BACKOFF HAS PASSED
+        self.assertIsNone(process_next_event())
+
+    def test_an_event_out_of_attempts_is_dead_lettered(self):
+        enqueue_event(self.unfulfillable("evt_1"))
+        WebhookEvent.objects.update(attempts=MAX_ATTEMPTS - 1)
+        with self.assertLogs("checkout.webhooks", "ERROR"):
+            event = process_next_event()
+        self.assertEqual(event.status, WebhookEvent.FAILED)
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertIsNone(process_next_event())
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        self.assertEqual(backoff(1), timedelta(seconds=30))
+        self.assertEqual(backoff(2), timedelta(seconds=60))
+        self.assertEqual(backoff(20), timedelta(hours=1))
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class WebhookClaimTests(TransactionTestCase):
+    """
+    Two workers racing for the same event, on a database with SKIP LOCKED.
+    Plain TransactionTestCase, the workers run in their own threads.
+    """
+
+    def test_a_claimed_event_is_skipped_by_other_workers(self):
+        claimed = threading.Event()
+        finish = threading.Event()
+        calls = []
+
+        def slow_handler(payload):
+            calls.append(payload["id"])
+            claimed.set()
+            finish.wait(10)
+
+        def worker():
+            try:
+                process_next_event()
+            finally:
+                connection.close()
+
+        enqueue_event({"id": "evt_1", "type": "test.slow"})
+        with mock.patch.dict(HANDLERS, {"test.slow": slow_handler}):
+            first = threading.Thread(target=worker)
+            first.start()
+            self.assertTrue(claimed.wait(10))
+            # THE FIRST WORKER HOLDS THE ROW LOCK, THE SECOND FINDS NOTHING DUE
+            self.assertIsNone(process_next_event())
+            finish.set()
+            first.join(10)
+        self.assertEqual(calls, ["evt_1"])
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.DONE)
@@ -2,16 +2,16 @@ from django.shortcuts import render
 from django.http import HttpResponse, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from products.models import ProductVariant
 from cart.models import Cart
-from users.models import UserAddress, User
-from .models import Order, OrderItem, OrderAddress
+from cart.snapshot import get_cart_snapshot
+from products.inventory import InsufficientStock, release_stock, reserve_stock
+from products.queries import with_primary_image
+from users.models import UserAddress
+from . import gateway
+from .models import CheckoutSession, Order
+from .webhooks import enqueue_event
 import stripe
 import json
-import uuid
-import os
-
-stripe.api_key = os.getenv("STRIPE_PRIVATE_KEY")
 
 
 @login_required
@@ -25,11 +25,8 @@ def checkout_view(request):
     Returns:
         HttpResponse: The HTTP response object containing the rendered checkout page.
     """
-    if request.user.is_authenticated:
-        cart = Cart.objects.get_or_create(user=request.user)[0]
-    else:
-        cart = Cart.objects.get_or_create(session=request.session.session_key)[0]
-    cart_items = cart.cartitem_set.all()
+    cart = get_cart_snapshot(request).cart
+    cart_items = with_primary_image(cart.cartitem_set.order_by("id"), "item__product")
 
     context = {
         "cart_items": cart_items,
@@ -92,26 +89,60 @@ def create_payment_intent(request):
     """
     cart = Cart.objects.get(user=request.user)
     amount = cart.get_total_price()
-    items_dict = json.dumps(cart.as_dict())
+    items = cart.as_dict()["items"]
+    # A RELOAD OR RETRY OF THE SAME CART REUSES ITS HOLD AND PAYMENTINTENT
+    order_id = CheckoutSession.order_id_for(cart, items, amount)
+    if Order.objects.filter(order_id=order_id).exists():
+        # ALREADY PAID, THE CUSTOMER LEFT BEFORE THE CONFIRMATION PAGE EMPTIED IT
+        cart.delete()
+        return JsonResponse({"error": "Your bag has already been paid for."}, status=409)
+    # CHECKOUTS OF EARLIER CART CONTENTS OR OTHER TABS GIVE UP THEIR HOLDS
+    earlier = (
+        CheckoutSession.holding_stock(request.user)
+        .exclude(order_id=order_id)
+        .values_list("order_id", flat=True)
+    )
+    # HOLD THE STOCK WHILE THE CUSTOMER PAYS
+    try:
+        reserve_stock(
+            order_id,
+            [(item["item"], item["quantity"]) for item in items],
+            replaces=[str(earlier_id) for earlier_id in earlier],
+        )
+    except InsufficientStock:
+        return JsonResponse(
+            {"error": "Some items in your bag are no longer in stock."}, status=409
+        )
     try:
         # Create a PaymentIntent with the order amount and currency
-        intent = stripe.PaymentIntent.create(
+        intent = gateway.create_payment_intent(
             amount=round(amount * 100),
-            currency="eur",
-            # In the latest version of the API, specifying the `automatic_payment_methods` parameter is optional because Stripe enables its functionality by default.
-            automatic_payment_methods={
-                "enabled": True,
-            },
-            metadata={
-                "email": request.user.email,
-                "order_id": uuid.uuid4(),
-                "items": items_dict,
-                "address": "",
-            },
+            # THE BASKET STAYS ON THE SERVER, STRIPE ONLY GETS ITS KEY
+            # THE EMAIL IS READ BACK BY CHECKOUT.JS FOR THE RECEIPT
+            metadata={"order_id": order_id, "email": request.user.email},
+            # A RETRIED REQUEST RETURNS THE SAME PAYMENTINTENT
+            idempotency_key=f"payment-intent-{order_id}",
         )
-        return JsonResponse({"intent": intent})
     except Exception as e:
+        release_stock(order_id)
         return JsonResponse({"error": str(e)}, status=403)
+    # ONLY A CREATED PAYMENTINTENT GETS A SESSION FOR THE WEBHOOK TO FULFIL
+    # ONE INSERT ... ON CONFLICT, A RELOAD UPDATES THE SESSION OF THE SAME ORDER ID
+    CheckoutSession.objects.bulk_create(
+        [
+            CheckoutSession(
+                order_id=order_id,
+                user=request.user,
+                email=request.user.email,
+                items=items,
+                amount=amount,
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=["order_id"],
+        update_fields=["user", "email", "items", "amount", "date_created"],
+    )
+    return JsonResponse({"intent": intent})
 
 
 def add_payment_intent_address(request):
@@ -129,9 +160,7 @@ def add_payment_intent_address(request):
     client_secret = data.get("client_secret")
     address_id = data.get("address")
     intent_id = data.get("intent_id")
-    payment_intent = stripe.PaymentIntent.retrieve(intent_id)
-    payment_intent.metadata.address = address_id
-    stripe.PaymentIntent.modify(intent_id, metadata=payment_intent.metadata)
+    gateway.update_payment_intent_metadata(intent_id, address=address_id)
     return HttpResponse("")
 
 @login_required
@@ -147,7 +176,7 @@ def checkout_confirmation_view(request):
     """
     payment_intent_client_secret = request.GET.get("payment_intent_client_secret")
     payment_intent = request.GET.get("payment_intent")
-    payment_intent = stripe.PaymentIntent.retrieve(payment_intent)
+    payment_intent = gateway.retrieve_payment_intent(payment_intent)
     order_id = payment_intent.get("metadata").get("order_id")
     cart = Cart.objects.get(user=request.user)
     cart.delete()
@@ -162,7 +191,10 @@ def checkout_confirmation_view(request):
 @csrf_exempt
 def stripe_webhook(request):
     """
-    Handle Stripe webhook events.
+    Receive Stripe webhook events.
+
+    The signature is checked and the event stored for the process_webhooks
+    worker, so Stripe gets its response without waiting on order creation.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -172,46 +204,16 @@ def stripe_webhook(request):
 
     """
     payload = request.body
-    event = None
     try:
-        event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
-    except ValueError as e:
+        gateway.construct_event(
+            payload, request.META.get("HTTP_STRIPE_SIGNATURE", "")
+        )
+    except ValueError:
         # Invalid payload
         return HttpResponse(status=400)
+    except stripe.error.SignatureVerificationError:
+        # Invalid signature
+        return HttpResponse(status=400)
 
-    # Handle the event
-    if event.type == "payment_intent.succeeded":
-        payment_intent = event.data.object
-        order_items = json.loads(payment_intent.get("metadata").get("items"))
-        customer_email = payment_intent.get("metadata").get("email")
-        order_id = payment_intent.get("metadata").get("order_id")
-        address_id = payment_intent.get("metadata").get("address")
-        order_address = OrderAddress.create_from_user_address(
-            order=None, user_address=UserAddress.objects.get(id=address_id)
-        )
-        order_address.save()
-        order = Order.objects.create(
-            order_id=order_id,
-            user=User.objects.get(email=customer_email),
-            email=customer_email,
-            address=order_address,
-        )
-        order.save()
-        order_address.order = order
-        order_address.save()
-        for item in order_items.get("items", []):
-            order_item = OrderItem.objects.create(
-                order=order,
-                item=ProductVariant.objects.get(id=item.get("item")),
-                quantity=item.get("quantity"),
-                price=item.get("quantity")
-                * ProductVariant.objects.get(id=item.get("item")).product.get_price(),
-            )
-            order_item.save()
-
-    elif event.type == "payment_method.attached":
-        payment_method = event.data.object
-    else:
-        print("Unhandled event type {}".format(event.type))
-
+    enqueue_event(json.loads(payload))
     return HttpResponse(status=200)
@@ -0,0 +1,151 @@
+import json
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from checkout.models import CheckoutSession, Order, WebhookEvent
+from products.inventory import release_stock
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = 30
+MAX_BACKOFF = 60 * 60
+
+
+def enqueue_event(payload):
+    """
+    Stores a verified Stripe event for the webhook worker.
+
+    A single INSERT that ignores events already stored, so Stripe's
+    retries of the same event are not processed twice.
+
+    Args:
+        payload (dict): The raw Stripe event, after its signature was checked.
+
+    Returns:
+        None
+    """
+    WebhookEvent.objects.bulk_create(
+        [
+            WebhookEvent(
+                event_id=payload["id"],
+                type=payload["type"],
+                payload=payload,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def handle_payment_intent_succeeded(payload):
+    """
+    Creates the order for a successful payment from its checkout session.
+
+    Args:
+        payload (dict): The raw Stripe event.
+
+    Returns:
+        None
+    """
+    metadata = payload["data"]["object"]["metadata"]
+    order_id = metadata.get("order_id")
+    # GUARDS AGAINST STRIPE SENDING THE SAME PAYMENT UNDER TWO EVENT IDS
+    if Order.objects.filter(order_id=order_id).exists():
+        return
+    session = CheckoutSession.objects.filter(order_id=order_id).first()
+    if session is None:
+        # PAYMENTINTENTS CREATED BEFORE CHECKOUT SESSIONS CARRY THE BASKET
+        email = metadata.get("email")
+        items = json.loads(metadata.get("items")).get("items", [])
+    else:
+        email = session.email
+        items = session.items
+    Order.create_from_payment(
+        order_id=order_id,
+        email=email,
+        address_id=metadata.get("address"),
+        items=items,
+    )
+    if session is not None:
+        session.delete()
+
+
+def handle_payment_intent_canceled(payload):
+    """
+    Releases the stock reserved for a canceled payment.
+
+    A failed payment is not released: Stripe lets the customer retry the
+    same PaymentIntent, and a retry that succeeds must still find its hold.
+    Holds of payments that are never retried expire on their own.
+
+    Args:
+        payload (dict): The raw Stripe event.
+
+    Returns:
+        None
+    """
+    release_stock(payload["data"]["object"]["metadata"].get("order_id"))
+
+
+HANDLERS = {
+    "payment_intent.succeeded": handle_payment_intent_succeeded,
+    "payment_intent.canceled": handle_payment_intent_canceled,
+}
+
+
+def backoff(attempts):
+    """
+    Returns how long to wait before retrying an event.
+
+    Args:
+        attempts (int): The number of failed attempts so far.
+
+    Returns:
+        timedelta: The delay, doubling with every attempt up to MAX_BACKOFF.
+    """
+    return timedelta(seconds=min(BASE_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF))
+
+
+def process_next_event():
+    """
+    Claims and processes the oldest due event.
+
+    The event row stays locked until the handler's work and the status
+    change commit together, so an event is processed exactly once even
+    with several workers running. A failing handler is rolled back and
+    the event is retried with exponential backoff.
+
+    Returns:
+        WebhookEvent: The processed event, or None if no event is due.
+    """
+    with transaction.atomic():
+        event = (
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=WebhookEvent.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at", "id")
+            .first()
+        )
+        if event is None:
+            return None
+        handler = HANDLERS.get(event.type)
+        try:
+            with transaction.atomic():
+                if handler is None:
+                    logger.info("Unhandled event type %s", event.type)
+                else:
+                    handler(event.payload)
+        except Exception as e:
+            event.attempts += 1
+            event.last_error = repr(e)
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = WebhookEvent.FAILED
+                logger.error("Giving up on webhook event %s: %r", event.event_id, e)
+            else:
+                event.next_attempt_at = timezone.now() + backoff(event.attempts)
+                logger.warning("Webhook event %s failed: %r", event.event_id, e)
+        else:
+            event.status = WebhookEvent.DONE
+            event.processed_at = timezone.now()
+        event.save()
+    return event
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from core.db_metrics import record_connection, record_request
+
+        connection_created.connect(record_connection)
+        request_started.connect(record_request)
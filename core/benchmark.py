@@ -0,0 +1,608 @@
+import copy
+import hashlib
+import hmac
+import json
+import math
+import statistics
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from django.core.management import call_command
+from django.db import connection, reset_queries, transaction
+from django.db.models import F
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from cart.models import Cart
+from checkout import gateway
+from checkout.fake_stripe import make_server
+from checkout.models import Order
+from core.query_detector import QueryDetector
+from products.models import Product, ProductImage, ProductVariant
+from products.sampling import invalidate_pools
+from products.search import invalidate_search_index, update_search_vectors
+from users.models import User, UserAddress, UserFavourite
+
+FIXTURES = ["data.json", "variants.json"]
+
+# CLONED PRODUCTS GET 7 DIGIT SKUS SO THEY NEVER CLASH WITH THE CATALOGUE
+CLONE_SKU_START = 1000000
+
+CUSTOMER_EMAIL = "benchmark-customer@example.com"
+STAFF_EMAIL = "benchmark-staff@example.com"
+WEBHOOK_SECRET = "whsec_benchmark"
+
+# THE BENCHMARK USES ITS OWN CACHES SO IT NEVER READS OR EVICTS SHARED REDIS KEYS
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    },
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-sessions",
+    },
+}
+
+
+class Scenario:
+    """
+    A request made against one route of laced/urls.py.
+
+    Callables receive the BenchmarkData, so IDs of the generated rows can
+    be used in URLs and request bodies.
+
+    Attributes:
+        route (str): The name of the URL pattern.
+        method (str): The HTTP method.
+        kwargs (callable): Returns the URL kwargs.
+        query (str): The query string.
+        data (callable): Returns the request body or POST data.
+        content_type (str): The content type of a JSON body.
+        headers (callable): Returns extra request headers.
+        users (tuple): The users the request is made as.
+    """
+
+    def __init__(
+        self,
+        route,
+        method="get",
+        kwargs=None,
+        query="",
+        data=None,
+        content_type=None,
+        headers=None,
+        users=("anonymous", "customer"),
+    ):
+        self.route = route
+        self.method = method
+        self.kwargs = kwargs or (lambda data: {})
+        self.query = query
+        self.data = data or (lambda data: {})
+        self.content_type = content_type
+        self.headers = headers or (lambda data: {})
+        self.users = users
+
+    @property
+    def label(self):
+        label = f"{self.method.upper()} {self.route}"
+        return f"{label}?{self.query}" if self.query else label
+
+    def url(self, data):
+        url = reverse(self.route, kwargs=self.kwargs(data))
+        return f"{url}?{self.query}" if self.query else url
+
+    def send(self, client, data):
+        """
+        Makes the request with the test client.
+
+        Args:
+            client (Client): The client, logged in as the user of the run.
+            data (BenchmarkData): The generated rows.
+
+        Returns:
+            HttpResponse: The response.
+        """
+        extra = {"headers": self.headers(data)}
+        if self.content_type:
+            extra["content_type"] = self.content_type
+        return getattr(client, self.method)(self.url(data), self.data(data), **extra)
+
+
+SCENARIOS = [
+    Scenario("home"),
+    Scenario("login"),
+    Scenario("logout"),
+    Scenario("signup"),
+    Scenario("account"),
+    Scenario("account_addresses"),
+    Scenario("account_orders"),
+    Scenario("account_favourites"),
+    Scenario("products"),
+    Scenario("products", query="sort=price_asc&size=9"),
+    Scenario("add_product", users=("staff",)),
+    Scenario("search", query="air"),
+    Scenario("search_typeahead", query="jor"),
+    Scenario(
+        "edit_product",
+        kwargs=lambda data: {"product_id": data.product.id},
+        users=("staff",),
+    ),
+    Scenario(
+        "delete_product",
+        kwargs=lambda data: {"product_id": data.product.id},
+        users=("staff",),
+    ),
+    Scenario("product_detail", kwargs=lambda data: {"product_id": data.product.id}),
+    Scenario(
+        "add_to_cart",
+        method="post",
+        data=lambda data: {"product_variant": data.variant.id, "quantity": 1},
+    ),
+    Scenario("cart"),
+    Scenario(
+        "update_cart_quantity",
+        kwargs=lambda data: {"cart_item_id": data.cart_item.id, "quantity": 2},
+        users=("customer",),
+    ),
+    Scenario(
+        "delete_cart_item",
+        kwargs=lambda data: {"cart_item_id": data.cart_item.id},
+        users=("customer",),
+    ),
+    Scenario(
+        "favourite",
+        kwargs=lambda data: {"product_id": data.product.id},
+        users=("customer",),
+    ),
+    Scenario("checkout", users=("customer",)),
+    Scenario(
+        "confirmation",
+        data=lambda data: {"payment_intent": data.intent_id},
+        users=("customer",),
+    ),
+    Scenario("checkout_change_address", users=("customer",)),
+    Scenario("create_payment_intent", method="post", users=("customer",)),
+    Scenario(
+        "add_payment_intent_address",
+        method="post",
+        data=lambda data: {"intent_id": data.intent_id, "address": data.address.id},
+        content_type="application/json",
+        users=("customer",),
+    ),
+    Scenario(
+        "stripe_webhook",
+        method="post",
+        data=lambda data: data.webhook_payload,
+        content_type="application/json",
+        headers=lambda data: {"Stripe-Signature": data.webhook_signature},
+        users=("anonymous",),
+    ),
+    Scenario(
+        "subscribe",
+        method="post",
+        data=lambda data: {"email": "benchmark-subscriber@example.com"},
+    ),
+]
+
+
+class BenchmarkData:
+    """
+    The users, cart, orders and Stripe objects the scenarios request.
+
+    Attributes:
+        customer (User): A customer with an address, a cart, orders and favourites.
+        staff (User): A staff user, for the product management views.
+        address (UserAddress): The default address of the customer.
+        product (Product): The product used by product and favourite routes.
+        variant (ProductVariant): A variant of product that is in stock.
+        cart_item (CartItem): A line of the customer's cart.
+        intent_id (str): A PaymentIntent created on the fake Stripe server.
+        webhook_payload (str): A payment_intent.succeeded event.
+        webhook_signature (str): The Stripe-Signature header of the event.
+    """
+
+    def __init__(self, customer, staff):
+        self.customer = customer
+        self.staff = staff
+        self.address = UserAddress.objects.get(user=customer, is_default=True)
+        cart = Cart.objects.get(user=customer)
+        self.cart_item = cart.cartitem_set.select_related("item__product").first()
+        self.variant = self.cart_item.item
+        self.product = self.variant.product
+        self.intent_id = None
+        self.webhook_payload = None
+        self.webhook_signature = None
+
+
+def percentile(values, percent):
+    """
+    Returns a percentile of values, using the nearest-rank method.
+
+    Args:
+        values (list): The measurements.
+        percent (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The measurement at that percentile.
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def routes():
+    """
+    Returns the names of the routes declared in laced/urls.py.
+
+    Included URLconfs (the admin and the debug toolbar) are not benchmarked.
+
+    Returns:
+        list: The route names.
+    """
+    return [
+        pattern.name
+        for pattern in get_resolver().url_patterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    ]
+
+
+def unbenchmarked_routes():
+    covered = {scenario.route for scenario in SCENARIOS}
+    return [route for route in routes() if route not in covered]
+
+
+def scale_catalogue(target, batch_size=2000):
+    """
+    Clones the loaded products, with their images and variants, until the
+    catalogue holds target products.
+
+    Clones reuse the image files and renditions of the product they copy,
+    so no image is generated. Rows are inserted with bulk_create, which
+    skips save signals, so stored prices and search vectors are set here.
+
+    Args:
+        target (int): The number of products wanted.
+        batch_size (int): The number of products inserted per batch.
+
+    Returns:
+        int: The number of products created.
+    """
+    templates = list(
+        Product.objects.order_by("id")
+        .filter(sku__regex=r"^[0-9]{6}$")
+        .prefetch_related("productimage_set", "variants")
+    )
+    existing = Product.objects.count()
+    missing = target - existing
+    if missing <= 0 or not templates:
+        return 0
+    for start in range(existing, target, batch_size):
+        numbers = range(start, min(start + batch_size, target))
+        sources = [templates[number % len(templates)] for number in numbers]
+        clones = Product.objects.bulk_create(
+            Product(
+                name=f"{source.name[:42]} {number}",
+                sku=str(CLONE_SKU_START + number),
+                description=source.description,
+                category_id=source.category_id,
+                price=source.price,
+                sale_price=source.sale_price,
+                is_featured=source.is_featured,
+                current_price=source.get_price(),
+            )
+            for number, source in zip(numbers, sources)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(
+                product=clone,
+                image=image.image.name,
+                renditions=image.renditions,
+                content_hash=image.content_hash,
+            )
+            for clone, source in zip(clones, sources)
+            for image in source.productimage_set.all()
+        )
+        ProductVariant.objects.bulk_create(
+            ProductVariant(product=clone, size=variant.size, quantity=variant.quantity)
+            for clone, source in zip(clones, sources)
+            for variant in source.variants.all()
+        )
+        update_search_vectors(
+            Product.objects.filter(id__in=[clone.id for clone in clones])
+        )
+    invalidate_search_index()
+    invalidate_pools()
+    return missing
+
+
+def load_catalogue(products):
+    """
+    Loads the product fixtures and scales them up to a number of products.
+
+    Args:
+        products (int): The number of products wanted.
+
+    Returns:
+        int: The number of products in the catalogue.
+    """
+    # PERMISSIONS AND CONTENT TYPES ARE CREATED BY MIGRATE, WITH OTHER IDS
+    call_command(
+        "loaddata",
+        *FIXTURES,
+        exclude=["auth.permission", "contenttypes"],
+        verbosity=0,
+    )
+    scale_catalogue(products)
+    return Product.objects.count()
+
+
+def create_users(orders=25, favourites=12):
+    """
+    Creates the benchmark customer and staff user, unless they exist.
+
+    The customer gets a default address, a cart of three lines, orders
+    and favourites, so the account and checkout pages have data to show.
+
+    Args:
+        orders (int): The number of orders of the customer.
+        favourites (int): The number of favourite products of the customer.
+
+    Returns:
+        BenchmarkData: The users and their rows.
+    """
+    customer = User.objects.filter(email=CUSTOMER_EMAIL).first()
+    staff = User.objects.filter(email=STAFF_EMAIL).first()
+    if customer and staff:
+        return BenchmarkData(customer, staff)
+    customer = User.objects.create_user(CUSTOMER_EMAIL, "Benchmark", "Customer")
+    staff = User.objects.create_superuser(STAFF_EMAIL, "Benchmark", "Staff")
+    address = UserAddress.objects.create(
+        user=customer,
+        name="Benchmark Customer",
+        address_line_1="1 Main Street",
+        city="Dublin",
+        county="dublin",
+        eircode="D01X2Y3",
+        is_default=True,
+    )
+    variants = list(
+        ProductVariant.objects.filter(quantity__gt=0)
+        .select_related("product")
+        .order_by("id")[:3]
+    )
+    # ENOUGH STOCK FOR THE ORDERS, SO THE CART LINES STAY IN STOCK
+    ProductVariant.objects.filter(id__in=[variant.id for variant in variants]).update(
+        quantity=F("quantity") + orders
+    )
+    cart = Cart.objects.create(user=customer)
+    for variant in variants:
+        cart.add_item(variant, 1)
+    for _ in range(orders):
+        Order.create_from_payment(
+            str(uuid.uuid4()),
+            customer.email,
+            address.id,
+            [{"item": variant.id, "quantity": 1} for variant in variants],
+        )
+    UserFavourite.objects.bulk_create(
+        UserFavourite(user=customer, product=product)
+        for product in Product.objects.order_by("id")[:favourites]
+    )
+    return BenchmarkData(customer, staff)
+
+
+def sign_webhook(payload, secret):
+    """
+    Builds the Stripe-Signature header Stripe would send with a payload.
+
+    Args:
+        payload (str): The request body.
+        secret (str): The webhook signing secret.
+
+    Returns:
+        str: The header value.
+    """
+    timestamp = int(time.time())
+    signature = hmac.new(
+        secret.encode("utf-8"),
+        f"{timestamp}.{payload}".encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@contextmanager
+def fake_stripe(data, latency=0):
+    """
+    Runs a fake Stripe API on a free local port and points checkout at it.
+
+    A PaymentIntent and a signed webhook event are added to data for the
+    checkout scenarios.
+
+    Args:
+        data (BenchmarkData): The generated rows.
+        latency (float): Seconds added to every fake Stripe response.
+
+    Yields:
+        None
+    """
+    server = make_server(0, latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_address[1]
+    try:
+        with override_settings(
+            STRIPE_API_BASE=f"http://127.0.0.1:{port}",
+            STRIPE_PRIVATE_KEY="sk_test_benchmark",
+            STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+            STRIPE_MAX_NETWORK_RETRIES=0,
+        ):
+            gateway.configure()
+            intent = server.fake.create_payment_intent(
+                {"amount": "10000", "metadata": {"order_id": str(uuid.uuid4())}}
+            )[1]
+            data.intent_id = intent["id"]
+            data.webhook_payload = json.dumps(
+                {
+                    "id": "evt_benchmark",
+                    "object": "event",
+                    "type": "payment_intent.succeeded",
+                    "data": {"object": intent},
+                }
+            )
+            data.webhook_signature = sign_webhook(data.webhook_payload, WEBHOOK_SECRET)
+            yield
+    finally:
+        server.shutdown()
+        server.server_close()
+        gateway.configure()
+
+
+def login(user):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    return client
+
+
+def send(scenario, client, data):
+    # EVERY REQUEST IS ROLLED BACK SO ALL ITERATIONS SEE THE SAME ROWS
+    cookies = copy.deepcopy(client.cookies)
+    with transaction.atomic():
+        started = time.perf_counter()
+        response = scenario.send(client, data)
+        elapsed = time.perf_counter() - started
+        transaction.set_rollback(True)
+    client.cookies = cookies
+    return response, elapsed
+
+
+def measure(scenario, client, data, iterations, warmup, timed=True):
+    """
+    Measures one scenario as one user.
+
+    Queries and allocations are counted on their own requests, so neither
+    the query log, the N+1 detector nor tracemalloc slows down the timed
+    requests.
+
+    Args:
+        scenario (Scenario): The request to make.
+        client (Client): The client, logged in as the user of the run.
+        data (BenchmarkData): The generated rows.
+        iterations (int): The number of timed requests.
+        warmup (int): The number of untimed requests made first.
+        timed (bool): Whether to measure latency and allocations.
+
+    Returns:
+        dict: The status code, query count, locations of N+1 queries and,
+        when timed, p50 and p95 latency in milliseconds and peak allocated
+        memory in KiB.
+    """
+    for _ in range(warmup):
+        send(scenario, client, data)
+    # A FULL QUERY LOG WOULD NOT GROW, SO START FROM AN EMPTY ONE
+    reset_queries()
+    with QueryDetector() as detector, CaptureQueriesContext(connection) as queries:
+        response = send(scenario, client, data)[0]
+    # SQLITE LOGS THE BEGIN AND ROLLBACK OF THE ROLLED BACK TRANSACTION
+    query_count = sum(
+        1 for query in queries if query["sql"] not in ("BEGIN", "ROLLBACK")
+    )
+    result = {
+        "status": response.status_code,
+        "queries": query_count,
+        "n_plus_ones": sorted(
+            {finding["template"] or finding["code"] for finding in detector.n_plus_ones}
+        ),
+    }
+    if not timed:
+        return result
+    timings = [send(scenario, client, data)[1] * 1000 for _ in range(iterations)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        send(scenario, client, data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        **result,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "alloc_kib": round((peak - before) / 1024, 1),
+    }
+
+
+def run(data, iterations=20, warmup=2, only=None, timed=True):
+    """
+    Runs every scenario as each of its users.
+
+    Args:
+        data (BenchmarkData): The generated rows.
+        iterations (int): The number of timed requests per scenario and user.
+        warmup (int): The number of untimed requests made first.
+        only (str): Only run scenarios whose label contains this text.
+        timed (bool): Whether to measure latency and allocations.
+
+    Yields:
+        tuple: The result key, e.g. "GET home [anonymous]", and its measurements.
+    """
+    users = {"anonymous": None, "customer": data.customer, "staff": data.staff}
+    for scenario in SCENARIOS:
+        if only and only not in scenario.label:
+            continue
+        for user in scenario.users:
+            client = login(users[user])
+            key = f"{scenario.label} [{user}]"
+            yield key, measure(scenario, client, data, iterations, warmup, timed)
+
+
+def compare(results, baseline, tolerance=0.25, min_ms=2.0, min_kib=64.0):
+    """
+    Compares results with a baseline and lists the regressions.
+
+    Query counts regress on any increase, and N+1 queries on any new
+    location. Median latency and allocations
+    regress when they grow by more than tolerance and by more than a small
+    absolute amount, so timer noise on fast views is not reported. p95 is
+    recorded but not compared, as a few samples make it too noisy to gate on.
+    Latency and allocations are only compared when both sides have them,
+    so a --queries-only run or baseline gates on queries alone.
+
+    Args:
+        results (dict): Measurements by result key.
+        baseline (dict): Baseline measurements by result key.
+        tolerance (float): Allowed relative growth of p50 and allocations.
+        min_ms (float): Latency growth in milliseconds always allowed.
+        min_kib (float): Allocation growth in KiB always allowed.
+
+    Returns:
+        list: Descriptions of the regressions.
+    """
+    regressions = []
+    for key, result in results.items():
+        if result["status"] >= 500:
+            regressions.append(f"{key}: status {result['status']}")
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if result["queries"] > before["queries"]:
+            regressions.append(
+                f"{key}: {before['queries']} -> {result['queries']} queries"
+            )
+        if "n_plus_ones" in before:
+            for location in set(result["n_plus_ones"]) - set(before["n_plus_ones"]):
+                regressions.append(f"{key}: new N+1 query at {location}")
+        for metric, floor in (("p50_ms", min_ms), ("alloc_kib", min_kib)):
+            if metric not in result or metric not in before:
+                continue
+            growth = result[metric] - before[metric]
+            if growth > floor and growth > before[metric] * tolerance:
+                regressions.append(
+                    f"{key}: {metric} {before[metric]} -> {result[metric]}"
+                )
+    return regressions
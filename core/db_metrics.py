@@ -0,0 +1,80 @@
+import logging
+import os
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """
+    Per-process counters of database connection reuse.
+
+    Each gunicorn worker is a separate process, so every worker reports
+    its own numbers.
+
+    Attributes:
+        requests (int): Requests started in this worker.
+        reused (int): Requests that started with an open, reusable connection.
+        connections (int): New database connections opened by this worker.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.reused = 0
+        self.connections = 0
+
+    @property
+    def reuse_ratio(self):
+        if not self.requests:
+            return 0.0
+        return self.reused / self.requests
+
+    def as_dict(self):
+        return {
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "reused": self.reused,
+            "connections": self.connections,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+        }
+
+
+stats = ConnectionStats()
+
+
+def record_connection(sender, connection, **kwargs):
+    """
+    Signal receiver function counting new database connections.
+
+    Args:
+        sender: The database wrapper class.
+        connection: The database wrapper that connected.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    stats.connections += 1
+
+
+def record_request(sender, **kwargs):
+    """
+    Signal receiver function counting requests that reuse an open connection.
+
+    Runs after Django's close_old_connections, so a connection still open
+    at this point will be reused by the request.
+
+    Args:
+        sender: The handler class.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    stats.requests += 1
+    if connections["default"].connection is not None:
+        stats.reused += 1
+    every = settings.DB_METRICS_LOG_EVERY
+    if every and stats.requests % every == 0:
+        logger.info("db connection stats %s", stats.as_dict())
@@ -0,0 +1,239 @@
+import time
+from contextvars import ContextVar
+import requests
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+# THE METRICS OF THE REQUEST BEING HANDLED, NONE OUTSIDE REQUESTS (E.G. WORKERS)
+current_metrics = ContextVar("current_metrics", default=None)
+
+_MISSING = object()
+
+
+class RequestMetrics:
+    """
+    Performance counters of one request.
+
+    Durations are kept in seconds. Queries are kept with their SQL up to
+    max_trace, so a slow request can be logged with its full query trace.
+
+    Attributes:
+        queries (int): Database queries run.
+        db_time (float): Time spent in the database.
+        template_time (float): Time spent rendering templates.
+        cache_hits (int): Cache reads that found a value.
+        cache_misses (int): Cache reads that found nothing.
+        http (dict): Outbound calls and their total time, by service.
+        trace (list): (sql, seconds) of the first max_trace queries.
+    """
+
+    def __init__(self, max_trace=100):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.http = {}
+        self.trace = []
+        self.max_trace = max_trace
+
+    @property
+    def http_calls(self):
+        return sum(calls for calls, _ in self.http.values())
+
+    @property
+    def http_time(self):
+        return sum(seconds for _, seconds in self.http.values())
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing every query of the request.
+
+        Args:
+            execute (callable): Runs the query.
+            sql (str): The SQL of the query.
+            params: The query parameters.
+            many (bool): Whether this is an executemany call.
+            context (dict): The connection and cursor.
+
+        Returns:
+            The result of execute.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if len(self.trace) < self.max_trace:
+                self.trace.append((sql, elapsed))
+
+    def as_dict(self):
+        return {
+            "db_queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "http_calls": self.http_calls,
+            "http_ms": round(self.http_time * 1000, 2),
+        }
+
+    def server_timing(self, total):
+        """
+        Builds a Server-Timing header value, shown in browser dev tools.
+
+        Args:
+            total (float): The duration of the whole request, in seconds.
+
+        Returns:
+            str: The header value.
+        """
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ]
+        for service, (calls, seconds) in sorted(self.http.items()):
+            metrics.append(f'{service};dur={seconds * 1000:.1f};desc="{calls} calls"')
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def record_cache(hit):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def record_http(service, seconds):
+    """
+    Adds an outbound HTTP call to the metrics of the current request.
+
+    Args:
+        service (str): The service called, e.g. "stripe".
+        seconds (float): The duration of the call.
+
+    Returns:
+        None
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    calls, total = metrics.http.get(service, (0, 0.0))
+    metrics.http[service] = (calls + 1, total + seconds)
+
+
+class CacheMetricsMixin:
+    """
+    Counts the hits and misses of cache reads, including {% cache %} tags
+    and cached sessions. Mixed into the cache backends used by settings.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        record_cache(value is not _MISSING)
+        return default if value is _MISSING else value
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    pass
+
+
+class InstrumentedFileBasedCache(CacheMetricsMixin, FileBasedCache):
+    pass
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+    pass
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        # TEMPLATE TAGS MAY RENDER TEMPLATES TOO, ONLY THE OUTERMOST IS TIMED
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering = False
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend timing every render.
+
+    Only templates rendered through the backend (render, render_to_string)
+    are timed. Includes, and templates rendered by template tags, are part
+    of the outermost render, so nothing is counted twice.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedSession(requests.Session):
+    """
+    requests session adding the time of every call to the current request.
+
+    Attributes:
+        service (str): The name calls are recorded under, e.g. "stripe".
+    """
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            record_http(self.service, time.perf_counter() - started)
+
+
+def start_s3_call(context, **kwargs):
+    context["instrumentation_started"] = time.perf_counter()
+
+
+def end_s3_call(context, **kwargs):
+    started = context.pop("instrumentation_started", None)
+    if started is not None:
+        record_http("s3", time.perf_counter() - started)
+
+
+def instrument_boto3_client(client):
+    """
+    Records the time of every call of a boto3 S3 client.
+
+    Registering again is a no-op, so this can run on every access.
+
+    Args:
+        client: The botocore client.
+
+    Returns:
+        None
+    """
+    events = client.meta.events
+    events.register("before-call.s3", start_s3_call, unique_id="metrics-start")
+    events.register("after-call.s3", end_s3_call, unique_id="metrics-end")
+    events.register("after-call-error.s3", end_s3_call, unique_id="metrics-error")
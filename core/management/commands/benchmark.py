@@ -0,0 +1,193 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from core.benchmark import (
+    BENCHMARK_CACHES,
+    compare,
+    create_users,
+    fake_stripe,
+    load_catalogue,
+    run,
+    unbenchmarked_routes,
+)
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks every route of laced/urls.py against a scaled-up catalogue.
+
+    A throwaway test database is created and filled with the product
+    fixtures, cloned up to --products products, plus a customer with a
+    cart, orders and favourites. Each route is requested through the test
+    client as an anonymous visitor and as a logged-in user, with Stripe
+    replaced by the local fake. Query counts, p50/p95 latency and peak
+    allocations are compared with the baseline file and the command
+    fails when a view regresses.
+
+    Latency depends on the machine, so no baseline is committed. CI records
+    one from the commit the change is based on and compares the change with
+    it, in the same job and on the same database:
+
+        git checkout <base commit>
+        python manage.py benchmark --queries-only --products 1000 \
+            --save-baseline --baseline /tmp/baseline.json
+        git checkout <change>
+        python manage.py benchmark --queries-only --products 1000 \
+            --baseline /tmp/baseline.json
+
+    --queries-only skips the timed requests, so only status codes, query
+    counts and N+1 queries are recorded and gated on. Developers drop it to
+    also compare latency and allocations against a baseline saved on their
+    own machine.
+    """
+
+    help = "Benchmark every route and compare with the baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=10000,
+            help="Products in the catalogue, cloned from the fixtures (default 10000).",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20,
+            help="Timed requests per view and user (default 20).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=2,
+            help="Untimed requests made first, to fill caches (default 2).",
+        )
+        parser.add_argument(
+            "--only",
+            help="Only benchmark views whose label contains this text.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+            help="The baseline file (default benchmarks/baseline.json).",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Write the results to the baseline file instead of comparing.",
+        )
+        parser.add_argument(
+            "--queries-only",
+            action="store_true",
+            help="Only record and compare status codes, query counts and N+1 queries.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed relative growth of p50 latency and allocations (default 0.25).",
+        )
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0,
+            help="Seconds added to every fake Stripe response (default 0).",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the test database, so the next run skips loading it.",
+        )
+
+    def handle(self, *args, **options):
+        # RESULTS ARE ONLY COMPARABLE FOR THE SAME CATALOGUE AND DATABASE
+        setup = {"products": options["products"], "database": connection.vendor}
+        baseline = {**setup, "results": {}}
+        if os.path.exists(options["baseline"]):
+            with open(options["baseline"]) as f:
+                recorded = json.load(f)
+            recorded_setup = {key: recorded.get(key) for key in setup}
+            if recorded_setup == setup:
+                baseline = recorded
+            elif not options["save_baseline"]:
+                raise CommandError(
+                    f"The baseline was recorded with {recorded_setup}, not {setup}."
+                )
+        # DEBUG OFF, AS IN PRODUCTION
+        setup_test_environment(debug=False)
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options["keepdb"]
+        )
+        try:
+            # THE REQUEST METRICS MIDDLEWARE WOULD LOG EVERY BENCHMARK REQUEST
+            with override_settings(
+                CACHES=BENCHMARK_CACHES,
+                PERF_LOG_REQUESTS=False,
+                PERF_SLOW_REQUEST_MS=float("inf"),
+            ):
+                results = self.benchmark(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        if options["save_baseline"]:
+            # A PARTIAL RUN (--only) UPDATES ITS VIEWS AND KEEPS THE OTHERS
+            baseline["results"].update(results)
+            os.makedirs(os.path.dirname(options["baseline"]), exist_ok=True)
+            with open(options["baseline"], "w") as f:
+                json.dump(baseline, f, indent=2, sort_keys=True)
+                f.write("\n")
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved the baseline to {options['baseline']}.")
+            )
+            baseline = {"results": {}}
+        regressions = [
+            f"{route}: no benchmark scenario" for route in unbenchmarked_routes()
+        ]
+        regressions += compare(
+            results,
+            baseline["results"],
+            tolerance=options["tolerance"],
+        )
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions.")
+        if baseline["results"]:
+            self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def benchmark(self, options):
+        products = load_catalogue(options["products"])
+        data = create_users()
+        self.stdout.write(f"Benchmarking against {products} products...")
+        self.stdout.write(
+            f"{'view':<56} {'status':>6} {'queries':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'alloc KiB':>10}"
+        )
+        results = {}
+        with fake_stripe(data, options["stripe_latency"]):
+            for key, result in run(
+                data,
+                options["iterations"],
+                options["warmup"],
+                options["only"],
+                timed=not options["queries_only"],
+            ):
+                results[key] = result
+                self.stdout.write(
+                    f"{key:<56} {result['status']:>6} {result['queries']:>7} "
+                    f"{result.get('p50_ms', '-'):>8} {result.get('p95_ms', '-'):>8} "
+                    f"{result.get('alloc_kib', '-'):>10}"
+                )
+                for location in result["n_plus_ones"]:
+                    self.stdout.write(f"    N+1 query at {location}")
+        return results
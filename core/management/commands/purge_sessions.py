@@ -0,0 +1,51 @@
+import time
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    """
+    Deletes expired sessions from the database in batches.
+
+    Unlike clearsessions, which deletes every expired row in one statement,
+    each batch is a short transaction so the table is never locked for long.
+    Cached copies expire from the session cache on their own.
+    """
+
+    help = "Delete expired sessions from the database in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of sessions deleted per batch (default 1000).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to pause between batches (default 0).",
+        )
+
+    def handle(self, *args, **options):
+        engine = import_module(settings.SESSION_ENGINE)
+        Session = engine.SessionStore.get_model_class()
+        batch_size = options["batch_size"]
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list(
+                    "session_key", flat=True
+                )[:batch_size]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            self.stdout.write(f"Deleted {deleted} expired sessions...")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired sessions."))
@@ -0,0 +1,104 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from core.instrumentation import RequestMetrics, current_metrics
+from core.query_detector import QueryDetector
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the cost of every request: query count and time, template
+    render time, cache hits and misses, and outbound HTTP time to Stripe,
+    Mailchimp and S3.
+
+    The totals are logged as one JSON line per request and sent back in a
+    Server-Timing header. Requests slower than PERF_SLOW_REQUEST_MS are
+    logged as warnings with their query trace, for a PERF_SLOW_TRACE_RATE
+    fraction of them.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics(max_trace=settings.PERF_TRACE_MAX_QUERIES)
+        token = current_metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = time.perf_counter() - started
+        if settings.PERF_SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing(total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def log(self, request, response, metrics, total):
+        """
+        Logs the metrics of a request, with its query trace if it was slow.
+
+        Args:
+            request (HttpRequest): The request.
+            response (HttpResponse): The response.
+            metrics (RequestMetrics): The metrics of the request.
+            total (float): The duration of the request, in seconds.
+
+        Returns:
+            None
+        """
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 2),
+            **metrics.as_dict(),
+        }
+        slow = total * 1000 >= settings.PERF_SLOW_REQUEST_MS
+        if slow and random.random() < settings.PERF_SLOW_TRACE_RATE:
+            record["trace"] = [
+                {"sql": sql, "ms": round(seconds * 1000, 2)}
+                for sql, seconds in metrics.trace
+            ]
+            logger.warning("slow request %s", json.dumps(record))
+        elif slow or settings.PERF_LOG_REQUESTS:
+            logger.log(
+                logging.WARNING if slow else logging.INFO,
+                "request %s",
+                json.dumps(record),
+            )
+
+
+class QueryDetectorMiddleware:
+    """
+    Flags N+1 and slow queries of every request, see core.query_detector.
+
+    Only added to MIDDLEWARE when QUERY_DETECTOR is "log" or "strict". In
+    log mode findings are logged as warnings, in strict mode an N+1 raises
+    NPlusOneError from the line that triggered it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.QUERY_DETECTOR == "off":
+            return self.get_response(request)
+        strict = settings.QUERY_DETECTOR == "strict"
+        with QueryDetector(strict=strict) as detector:
+            response = self.get_response(request)
+        detector.log(f"{request.method} {request.path}")
+        return response
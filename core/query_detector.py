@@ -0,0 +1,213 @@
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+# STATEMENTS OF atomic() BLOCKS, NOT QUERIES OF THE CODE BEING CHECKED
+_TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK", "BEGIN")
+
+# PROJECT FILES THAT WRAP EVERY REQUEST OR QUERY, NEVER THE CODE TO BLAME
+_WRAPPER_FILES = {
+    os.path.join("core", name)
+    for name in ("query_detector.py", "instrumentation.py", "middleware.py")
+}
+
+
+class NPlusOneError(Exception):
+    """
+    Raised in strict mode when the same query runs too often in one block.
+    """
+
+
+def fingerprint(sql):
+    """
+    Returns the shape of a query, with its literals and parameters replaced.
+
+    Queries that only differ in their values, including the length of an
+    IN list, have the same fingerprint.
+
+    Args:
+        sql (str): The SQL of the query.
+
+    Returns:
+        str: The fingerprint.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql).replace("%s", "?")
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def query_location():
+    """
+    Finds what triggered the query being run.
+
+    Returns:
+        tuple: The template and line being rendered, e.g.
+        "account/favourites.html:12", and the innermost project code
+        frame, e.g. "users/views.py:290 in account_favourites_view".
+        Either is None when not found.
+    """
+    template = code = None
+    base_dir = os.path.join(str(settings.BASE_DIR), "")
+    frame = sys._getframe(1)
+    while frame and not (template and code):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            origin = getattr(node, "origin", None)
+            token = getattr(node, "token", None)
+            if origin is not None and token is not None:
+                template = f"{origin.template_name}:{token.lineno}"
+        if (
+            code is None
+            and filename.startswith(base_dir)
+            and "site-packages" not in filename
+            and os.path.relpath(filename, base_dir) not in _WRAPPER_FILES
+        ):
+            code = (
+                f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} "
+                f"in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return template, code
+
+
+class QueryDetector:
+    """
+    Context manager flagging N+1 and slow queries on every database
+    connection while it is active.
+
+    A query is an N+1 when its fingerprint runs repeat times or more.
+    Locations are only looked up for flagged queries, so unflagged
+    queries cost a regex and a dict update.
+
+    Attributes:
+        repeat (int): Runs of one query shape that flag it.
+        slow_ms (float): Duration in milliseconds that flags a query.
+        strict (bool): Raise NPlusOneError when an N+1 is flagged.
+        ignore (list): Locations never flagged, a template or code file, or
+            a file and line, e.g. "users/views.py:290".
+        counts (dict): Runs by fingerprint.
+        findings (list): The flagged queries, as dicts.
+    """
+
+    def __init__(self, repeat=None, slow_ms=None, strict=False, ignore=None):
+        self.repeat = repeat or settings.QUERY_DETECTOR_REPEAT
+        self.slow_ms = slow_ms or settings.QUERY_DETECTOR_SLOW_MS
+        self.strict = strict
+        self.ignore = settings.QUERY_DETECTOR_IGNORE if ignore is None else ignore
+        self.counts = {}
+        self.findings = []
+        self._repeated = {}
+        self._stack = None
+        self.error = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        self.reset()
+        # {% if %} TAGS SWALLOW EXCEPTIONS, SO RAISE AGAIN IF IT WAS LOST
+        if self.error is not None and exc_type is None:
+            raise self.error
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        key = fingerprint(sql)
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count == self.repeat:
+            self.flag_repeated(key, count)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= self.slow_ms:
+            self.flag("slow", key, ms=round(elapsed_ms, 2))
+        return result
+
+    def reset(self):
+        """
+        Starts counting again, e.g. for the next request of a test. Findings
+        so far are kept, with their final counts.
+
+        Returns:
+            None
+        """
+        for key, finding in self._repeated.items():
+            finding["count"] = self.counts[key]
+        self.counts = {}
+        self._repeated = {}
+
+    def ignored(self, template, code):
+        locations = set()
+        for location in (template, code and code.split(" ")[0]):
+            if location:
+                # A FILE:LINE ENTRY IGNORES THAT LINE, A FILE ENTRY THE WHOLE FILE
+                locations.update((location, location.rsplit(":", 1)[0]))
+        return not locations.isdisjoint(self.ignore)
+
+    def flag(self, kind, key, **extra):
+        template, code = query_location()
+        if self.ignored(template, code):
+            return None
+        finding = {
+            "kind": kind,
+            "fingerprint": key,
+            "template": template,
+            "code": code,
+            **extra,
+        }
+        self.findings.append(finding)
+        return finding
+
+    def flag_repeated(self, key, count):
+        finding = self.flag("n+1", key, count=count)
+        if finding is None:
+            return
+        self._repeated[key] = finding
+        if self.strict and self.error is None:
+            self.error = NPlusOneError(
+                f"Query ran {count} times, triggered from "
+                f"{finding['template'] or finding['code']}: {key}"
+            )
+            raise self.error
+
+    @property
+    def n_plus_ones(self):
+        return [finding for finding in self.findings if finding["kind"] == "n+1"]
+
+    def log(self, label):
+        """
+        Logs the findings as warnings.
+
+        Args:
+            label (str): What was checked, e.g. the request path.
+
+        Returns:
+            None
+        """
+        for finding in self.findings:
+            logger.warning(
+                "%s %s in %s (%s): %s",
+                finding["kind"],
+                f"x{finding['count']}" if "count" in finding else f"{finding['ms']}ms",
+                label,
+                finding["template"] or finding["code"],
+                finding["fingerprint"],
+            )
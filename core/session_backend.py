@@ -1,11 +1,15 @@
-from django.contrib.sessions.backends.db import SessionStore as DbSessionStore
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDbSessionStore,
+)
 
 """ 
 Custom session backend to preserve same session_key on login.
 Ensures AnonymousUser cart is added to User cart on login.
+Sessions are read from the SESSION_CACHE_ALIAS cache and written through
+to the database, so most requests never touch the django_session table.
 """
 
 
-class SessionStore(DbSessionStore):
+class SessionStore(CachedDbSessionStore):
     def cycle_key(self):
         pass
@@ -0,0 +1,101 @@
+from decimal import Decimal
+from django.core.signals import request_started
+from django.test import TestCase as DjangoTestCase
+from core.query_detector import QueryDetector
+from products.models import Product, ProductCategory, ProductVariant
+
+
+class StrictQueriesMixin:
+    """
+    Runs every test method under a strict QueryDetector, so a test that
+    triggers an N+1 query fails with NPlusOneError from the offending line.
+
+    Queries are counted per test client request, as the session and user
+    lookups of consecutive requests are not N+1s. setUp and setUpTestData
+    are not checked, so fixtures can be created in loops.
+
+    Attributes:
+        strict_queries (bool): Set to False on a test class to turn the
+            detector off.
+    """
+
+    strict_queries = True
+
+    def _callTestMethod(self, method):
+        if not self.strict_queries:
+            return super()._callTestMethod(method)
+        with QueryDetector(strict=True) as detector:
+
+            def reset(**kwargs):
+                detector.reset()
+
+            request_started.connect(reset, weak=False)
+            try:
+                return super()._callTestMethod(method)
+            finally:
+                request_started.disconnect(reset)
+
+
+class TestCase(StrictQueriesMixin, DjangoTestCase):
+    """
+    Base test case of the project, see StrictQueriesMixin.
+    """
+
+
+def create_product(sku, price=Decimal("100.00"), sizes=("8",), quantity=10, **fields):
+    """
+    Creates a product with a variant of each size in stock.
+
+    Args:
+        sku (str): The SKU of the product.
+        price (Decimal): The price of the product.
+        sizes (list): The sizes of its variants.
+        quantity (int): The units in stock of each variant.
+        **fields: Other fields of the product, e.g. category.
+
+    Returns:
+        Product: The created product.
+    """
+    fields.setdefault("name", f"Product {sku}")
+    product = Product.objects.create(
+        sku=sku, description="Description", price=price, **fields
+    )
+    ProductVariant.objects.bulk_create(
+        [
+            ProductVariant(product=product, size=size, quantity=quantity)
+            for size in sizes
+        ]
+    )
+    return product
+
+
+def create_products(count, with_categories=False):
+    """
+    Creates products in bulk, without variants. Like any bulk_create, this
+    sends no save signals.
+
+    Args:
+        count (int): The number of products.
+        with_categories (bool): Give every product a category of its own.
+
+    Returns:
+        list: The created products.
+    """
+    categories = [None] * count
+    if with_categories:
+        categories = ProductCategory.objects.bulk_create(
+            [ProductCategory(name=f"Category {n}") for n in range(count)]
+        )
+    return Product.objects.bulk_create(
+        [
+            Product(
+                name=f"Product {n}",
+                sku=f"{900000 + n}",
+                description="Description",
+                category=category,
+                price=100,
+                current_price=100,
+            )
+            for n, category in enumerate(categories)
+        ]
+    )
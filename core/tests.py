@@ -0,0 +1,387 @@
+import json
+import unittest
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.template import engines
+from django.test import modify_settings, override_settings
+from django.urls import path
+from django.utils import timezone
+from core.benchmark import compare
+from core.db_metrics import ConnectionStats, record_connection, record_request
+from core.instrumentation import (
+    InstrumentedDjangoTemplates,
+    InstrumentedLocMemCache,
+    RequestMetrics,
+    TimedSession,
+    current_metrics,
+    end_s3_call,
+    record_http,
+    start_s3_call,
+)
+from core.query_detector import NPlusOneError, QueryDetector, fingerprint
+from core.session_backend import SessionStore
+from core.testing import TestCase, create_products
+from products.models import Product
+from users.models import User
+
+
+def category_names_view(request):
+    # ONE CATEGORY QUERY PER PRODUCT, THE N+1 THE DETECTOR MUST CATCH
+    names = [product.category.name for product in Product.objects.order_by("id")]
+    return HttpResponse(", ".join(names))
+
+
+def product_count_view(request):
+    return HttpResponse(str(Product.objects.count()))
+
+
+urlpatterns = [
+    path("category-names/", category_names_view),
+    path("product-count/", product_count_view),
+]
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_values_are_replaced(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+            fingerprint("SELECT  *  FROM t WHERE id = 22 AND name = 'c'"),
+        )
+
+    def test_in_lists_of_any_length_match(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s)"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s)"),
+        )
+
+
+class BenchmarkCompareTests(unittest.TestCase):
+    baseline = {
+        "GET home [anonymous]": {
+            "status": 200,
+            "queries": 4,
+            "n_plus_ones": [],
+            "p50_ms": 10.0,
+            "p95_ms": 12.0,
+            "alloc_kib": 500.0,
+        }
+    }
+
+    def result(self, **changes):
+        return {
+            "GET home [anonymous]": {**self.baseline["GET home [anonymous]"], **changes}
+        }
+
+    def test_an_unchanged_run_passes(self):
+        self.assertEqual(compare(self.result(queries=3), self.baseline), [])
+
+    def test_more_queries_and_new_n_plus_ones_regress(self):
+        self.assertEqual(
+            compare(
+                self.result(queries=5, n_plus_ones=["products/views.py:10"]),
+                self.baseline,
+            ),
+            [
+                "GET home [anonymous]: 4 -> 5 queries",
+                "GET home [anonymous]: new N+1 query at products/views.py:10",
+            ],
+        )
+
+    def test_latency_regresses_past_the_tolerance_and_the_floor(self):
+        self.assertEqual(compare(self.result(p50_ms=11.9), self.baseline), [])
+        self.assertEqual(
+            compare(self.result(p50_ms=13.0), self.baseline),
+            ["GET home [anonymous]: p50_ms 10.0 -> 13.0"],
+        )
+
+    def test_server_errors_regress_without_a_baseline(self):
+        self.assertEqual(
+            compare(self.result(status=500), {}),
+            ["GET home [anonymous]: status 500"],
+        )
+
+    def test_queries_only_runs_are_not_compared_on_latency(self):
+        result = {
+            key: {"status": 200, "queries": 4, "n_plus_ones": []}
+            for key in self.baseline
+        }
+        self.assertEqual(compare(result, self.baseline), [])
+        self.assertEqual(
+            compare(self.result(p50_ms=100.0, alloc_kib=5000.0), result), []
+        )
+
+
+@override_settings(ROOT_URLCONF="core.tests", QUERY_DETECTOR_IGNORE=[])
+class QueryDetectorTests(TestCase):
+    # THESE TESTS EXPECT N+1S, THE STRICT DETECTOR OF THE BASE CLASS WOULD FAIL THEM
+    strict_queries = False
+
+    @classmethod
+    def setUpTestData(cls):
+        create_products(6, with_categories=True)
+
+    def test_repeated_query_is_flagged_with_its_location(self):
+        with QueryDetector(repeat=5) as detector:
+            self.client.get("/category-names/")
+        (finding,) = detector.n_plus_ones
+        self.assertEqual(finding["count"], 6)
+        self.assertTrue(finding["code"].startswith("core/tests.py:"))
+
+    def test_strict_mode_raises_from_the_view(self):
+        with self.assertRaises(NPlusOneError):
+            with QueryDetector(repeat=5, strict=True):
+                self.client.get("/category-names/")
+
+    def test_ignored_locations_are_not_flagged(self):
+        with QueryDetector(repeat=5, ignore=["core/tests.py"]) as detector:
+            self.client.get("/category-names/")
+        self.assertEqual(detector.n_plus_ones, [])
+
+    @override_settings(QUERY_DETECTOR="strict")
+    @modify_settings(MIDDLEWARE={"append": "core.middleware.QueryDetectorMiddleware"})
+    def test_strict_middleware_fails_the_request(self):
+        with self.assertRaises(NPlusOneError):
+            self.client.get("/category-names/")
+
+
+@override_settings(ROOT_URLCONF="core.tests", QUERY_DETECTOR_IGNORE=[])
+class StrictQueriesMixinTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_products(6, with_categories=True)
+        cls.user = User.objects.create_user("test@example.com", "Test", "User")
+
+    @unittest.expectedFailure
+    def test_n_plus_one_view_fails_the_test(self):
+        self.client.get("/category-names/")
+
+    def test_consecutive_requests_are_counted_separately(self):
+        # EVERY REQUEST RUNS THE SAME QUERIES, NONE OF THEM AN N+1
+        self.client.force_login(self.user)
+        for _ in range(6):
+            self.assertEqual(self.client.get("/product-count/").content, b"6")
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class ConnectionStatsTests(TestCase):
+    def setUp(self):
+        self.stats = ConnectionStats()
+        patcher = mock.patch("core.db_metrics.stats", self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_on_an_open_connection_count_as_reused(self):
+        # THE TEST CASE HOLDS THE CONNECTION OPEN, AS A PERSISTENT CONNECTION WOULD
+        self.client.get("/product-count/")
+        self.client.get("/product-count/")
+        self.assertEqual((self.stats.requests, self.stats.reused), (2, 2))
+        self.assertEqual(self.stats.reuse_ratio, 1.0)
+
+    def test_requests_opening_a_connection_are_not_reused(self):
+        with mock.patch.object(connections["default"], "connection", None):
+            record_request(sender=None)
+        record_request(sender=None)
+        record_connection(sender=None, connection=connections["default"])
+        self.assertEqual(self.stats.as_dict()["reuse_ratio"], 0.5)
+        self.assertEqual(self.stats.connections, 1)
+
+    @override_settings(DB_METRICS_LOG_EVERY=2)
+    def test_stats_are_logged_every_n_requests(self):
+        with self.assertLogs("core.db_metrics", "INFO") as logs:
+            for _ in range(4):
+                record_request(sender=None)
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("'requests': 4", logs.output[1])
+
+    @override_settings(DB_METRICS_LOG_EVERY=0)
+    def test_logging_can_be_disabled(self):
+        with self.assertNoLogs("core.db_metrics"):
+            record_request(sender=None)
+
+    def test_an_idle_worker_has_no_ratio(self):
+        self.assertEqual(ConnectionStats().reuse_ratio, 0.0)
+
+
+class CachedSessionTests(TestCase):
+    def setUp(self):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        self.session = SessionStore()
+        self.session["cart"] = "session cart"
+        self.session.create()
+
+    def load(self):
+        return SessionStore(self.session.session_key).load()
+
+    def test_sessions_are_read_from_the_cache(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.load(), {"cart": "session cart"})
+
+    def test_sessions_missing_from_the_cache_are_read_from_the_database(self):
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.load(), {"cart": "session cart"})
+        # AND ARE CACHED AGAIN
+        with self.assertNumQueries(0):
+            self.load()
+
+    def test_logging_in_keeps_the_session_key(self):
+        # SO THE ANONYMOUS CART, KEYED BY THE SESSION, IS STILL FOUND AFTER LOGIN
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = self.session.session_key
+        self.client.force_login(
+            User.objects.create_user("test@example.com", "Test", "User")
+        )
+        self.assertEqual(self.client.session.session_key, self.session.session_key)
+        self.assertEqual(self.client.session["cart"], "session cart")
+
+
+class PurgeSessionsTests(TestCase):
+    def test_only_expired_sessions_are_deleted_in_batches(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [
+                Session(
+                    session_key=f"expired{n}",
+                    session_data="",
+                    expire_date=now - timedelta(days=1),
+                )
+                for n in range(5)
+            ]
+            + [
+                Session(
+                    session_key="live",
+                    session_data="",
+                    expire_date=now + timedelta(days=1),
+                )
+            ]
+        )
+        stdout = StringIO()
+        call_command("purge_sessions", "--batch-size", "2", stdout=stdout)
+        self.assertEqual(
+            list(Session.objects.values_list("session_key", flat=True)), ["live"]
+        )
+        output = stdout.getvalue()
+        # THREE BATCHES OF AT MOST TWO
+        self.assertEqual(output.count("expired sessions..."), 3)
+        self.assertIn("Purged 5 expired sessions.", output)
+
+
+@override_settings(ROOT_URLCONF="core.tests")
+class RequestMetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_products(2)
+
+    def logged_record(self, logs):
+        (record,) = logs.records
+        message = record.getMessage()
+        return json.loads(message[message.index("{") :])
+
+    def test_the_server_timing_header_counts_the_queries(self):
+        response = self.client.get("/product-count/")
+        timing = response["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn("total;dur=", timing)
+
+    @override_settings(PERF_SERVER_TIMING=False)
+    def test_the_server_timing_header_can_be_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/product-count/"))
+
+    def test_fast_requests_are_not_logged_by_default(self):
+        with self.assertNoLogs("core.middleware"):
+            self.client.get("/product-count/")
+
+    @override_settings(PERF_LOG_REQUESTS=True)
+    def test_every_request_is_logged_when_enabled(self):
+        with self.assertLogs("core.middleware", "INFO") as logs:
+            self.client.get("/product-count/")
+        record = self.logged_record(logs)
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertEqual(
+            (record["path"], record["status"], record["db_queries"]),
+            ("/product-count/", 200, 1),
+        )
+        self.assertNotIn("trace", record)
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0, PERF_SLOW_TRACE_RATE=1.0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            self.client.get("/product-count/")
+        (query,) = self.logged_record(logs)["trace"]
+        self.assertIn("COUNT(*)", query["sql"])
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0, PERF_SLOW_TRACE_RATE=0.0)
+    def test_untraced_slow_requests_are_still_logged(self):
+        with self.assertLogs("core.middleware", "WARNING") as logs:
+            self.client.get("/product-count/")
+        self.assertNotIn("trace", self.logged_record(logs))
+
+
+class RequestMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RequestMetrics(max_trace=2)
+        token = current_metrics.set(self.metrics)
+        self.addCleanup(current_metrics.reset, token)
+
+    def test_queries_are_traced_up_to_the_limit(self):
+        execute = mock.Mock(return_value="rows")
+        for n in range(3):
+            self.assertEqual(
+                self.metrics.record_query(execute, f"SELECT {n}", (), False, {}),
+                "rows",
+            )
+        self.assertEqual(self.metrics.queries, 3)
+        self.assertEqual(
+            [sql for sql, _ in self.metrics.trace], ["SELECT 0", "SELECT 1"]
+        )
+
+    def test_cache_reads_count_hits_and_misses(self):
+        cache = InstrumentedLocMemCache("metrics-test", {})
+        cache.set("cached", None)
+        self.assertIsNone(cache.get("cached", "default"))
+        self.assertEqual(cache.get("missing", "default"), "default")
+        self.assertEqual((self.metrics.cache_hits, self.metrics.cache_misses), (1, 1))
+
+    def test_outbound_calls_are_timed_by_service(self):
+        with mock.patch("requests.Session.send") as send:
+            TimedSession("stripe").send(mock.Mock())
+            TimedSession("stripe").send(mock.Mock())
+            send.side_effect = ConnectionError
+            with self.assertRaises(ConnectionError):
+                TimedSession("mailchimp").send(mock.Mock())
+        self.assertEqual(self.metrics.http_calls, 3)
+        self.assertEqual(self.metrics.http["stripe"][0], 2)
+        self.assertIn("mailchimp;dur=", self.metrics.server_timing(0.1))
+
+    def test_s3_calls_are_timed(self):
+        context = {}
+        start_s3_call(context)
+        end_s3_call(context)
+        # AN ERROR AFTER THE CALL WAS RECORDED IS NOT COUNTED AGAIN
+        end_s3_call(context)
+        self.assertEqual(self.metrics.http["s3"][0], 1)
+
+    def test_nested_templates_are_timed_once(self):
+        (engine,) = engines.all()
+        self.assertIsInstance(engine, InstrumentedDjangoTemplates)
+        inner = engine.from_string("inner")
+        outer = engine.from_string("{{ render }}")
+        # ONLY THE OUTER RENDER READS THE CLOCK
+        with mock.patch("time.perf_counter", side_effect=[0.0, 1.5]):
+            output = outer.render({"render": lambda: inner.render()})
+        self.assertEqual(output, "inner")
+        self.assertEqual(self.metrics.template_time, 1.5)
+
+    def test_nothing_is_recorded_outside_requests(self):
+        current_metrics.set(None)
+        record_http("stripe", 1.0)
+        InstrumentedLocMemCache("metrics-test", {}).get("missing")
+        self.assertEqual(self.metrics.as_dict()["http_calls"], 0)
+        self.assertEqual(self.metrics.cache_misses, 0)
@@ -1,7 +1,9 @@
 from django.shortcuts import render
+from django.conf import settings
 from users.models import *
 from products.models import *
-import random
+from products.sampling import sample_products
+from functools import partial
 from django.contrib.auth.decorators import login_required
 import stripe
 import os
@@ -21,24 +23,10 @@ def home_view(request):
     Returns:
         HttpResponse: The rendered home page template.
     """
-    # SELECT ALL FEATURED PRODUCTS
-    featured_products = Product.objects.filter(is_featured=True).prefetch_related(
-        "productimage_set"
-    )
-    # CONTROL MAX FEATURED PRODUCTS TO SHOW
-    num_featured_to_show = min(len(featured_products), 6)
-    featured_products = random.sample(list(featured_products), num_featured_to_show)
-
-    # SELECT ALL SALE PRODUCTS
-    sale_products = Product.objects.filter(sale_price__gt=0).prefetch_related(
-        "productimage_set"
-    )
-    # CONTROL MAX SALE PRODUCTS TO SHOW
-    num_sale_to_show = min(len(sale_products), 6)
-    sale_products = random.sample(list(sale_products), num_sale_to_show)
-
+    # RAILS ARE SAMPLED LAZILY, ONLY WHEN THE CACHED RAILS HAVE EXPIRED
     context = {
-        "featured_products": featured_products,
-        "sale_products": sale_products,
+        "featured_products": partial(sample_products, "featured", 6),
+        "sale_products": partial(sample_products, "sale", 6),
+        "rails_cache_timeout": settings.HOME_RAILS_CACHE_TIMEOUT,
     }
     return render(request, "home/home.html", context)
@@ -13,24 +13,103 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
 import dj_database_url
 
-DATABASES = {"default": dj_database_url.config(default=os.environ.get("DATABASE_URL"))}
+# PERSISTENT CONNECTIONS: EACH GUNICORN WORKER KEEPS ITS CONNECTION FOR
+# DB_CONN_MAX_AGE SECONDS (0 CLOSES IT AFTER EVERY REQUEST), CHECKED BEFORE REUSE
+DATABASES = {
+    "default": dj_database_url.config(
+        default=os.environ.get("DATABASE_URL"),
+        conn_max_age=int(os.environ.get("DB_CONN_MAX_AGE", 600)),
+        conn_health_checks=os.environ.get("DB_CONN_HEALTH_CHECKS", "TRUE") == "TRUE",
+    )
+}
+
+# POOLING THROUGH PGBOUNCER (E.G. A LOCAL SIDECAR IN TRANSACTION POOLING MODE,
+# WITH DATABASE_URL POINTING AT IT). SERVER-SIDE CURSORS DO NOT SURVIVE
+# TRANSACTION POOLING, SO QUERYSET.iterator() FALLS BACK TO CLIENT-SIDE CURSORS
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER") == "TRUE"
+if DB_PGBOUNCER:
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# LOG PER-WORKER CONNECTION REUSE EVERY N REQUESTS (0 TO DISABLE)
+DB_METRICS_LOG_EVERY = int(os.environ.get("DB_METRICS_LOG_EVERY", 1000))
+
+# PER-REQUEST METRICS, SEE core.middleware.RequestMetricsMiddleware. EVERY
+# REQUEST IS LOGGED WHEN PERF_LOG_REQUESTS IS "TRUE" (OFF BY DEFAULT), SLOW
+# REQUESTS ALWAYS ARE, A PERF_SLOW_TRACE_RATE FRACTION OF THEM WITH THEIR
+# FIRST QUERIES
+PERF_LOG_REQUESTS = os.environ.get("PERF_LOG_REQUESTS") == "TRUE"
+PERF_SERVER_TIMING = os.environ.get("PERF_SERVER_TIMING", "TRUE") == "TRUE"
+PERF_SLOW_REQUEST_MS = float(os.environ.get("PERF_SLOW_REQUEST_MS", 1000))
+PERF_SLOW_TRACE_RATE = float(os.environ.get("PERF_SLOW_TRACE_RATE", 1.0))
+PERF_TRACE_MAX_QUERIES = int(os.environ.get("PERF_TRACE_MAX_QUERIES", 100))
 
 MAILCHIMP_API_KEY = os.environ.get("MAILCHIMP_API_KEY")
 MAILCHIMP_DATA_CENTER = os.environ.get("MAILCHIMP_DATA_CENTER")
 MAILCHIMP_LIST_ID = os.environ.get("MAILCHIMP_LIST_ID")
+MAILCHIMP_TIMEOUT = float(os.environ.get("MAILCHIMP_TIMEOUT", 10))
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SESSION_ENGINE = "core.session_backend"
+SESSION_CACHE_ALIAS = "sessions"
+
+# SHARED REDIS CACHE WHEN REDIS_URL IS SET (NEEDS THE redis PACKAGE). OTHERWISE
+# A PER-PROCESS MEMORY CACHE, AND A FILE CACHE FOR SESSIONS SO ALL GUNICORN
+# WORKERS ON THE MACHINE SEE THE SAME SESSION DATA. THE BACKENDS ARE DJANGO'S,
+# COUNTING HITS AND MISSES FOR THE REQUEST METRICS
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "core.instrumentation.InstrumentedRedisCache",
+            "LOCATION": REDIS_URL,
+        },
+        "sessions": {
+            "BACKEND": "core.instrumentation.InstrumentedRedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "sessions",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "core.instrumentation.InstrumentedLocMemCache",
+        },
+        "sessions": {
+            "BACKEND": "core.instrumentation.InstrumentedFileBasedCache",
+            "LOCATION": os.environ.get(
+                "SESSION_CACHE_DIR",
+                os.path.join(tempfile.gettempdir(), "laced_sessions"),
+            ),
+        },
+    }
 
 LOGIN_URL = "/login/"
 
+# SECONDS A RENDERED PRODUCT CARD STAYS CACHED, CHANGES INVALIDATE IT SOONER
+PRODUCT_CARD_CACHE_TIMEOUT = int(os.environ.get("PRODUCT_CARD_CACHE_TIMEOUT", 86400))
+
+# SECONDS A CHECKOUT HOLDS ITS STOCK WHILE THE CUSTOMER PAYS
+STOCK_RESERVATION_TTL = int(os.environ.get("STOCK_RESERVATION_TTL", 900))
+
+# SECONDS A CHECKOUT SESSION IS KEPT FOR THE WEBHOOK OF A LATE PAYMENT, E.G.
+# FROM A FORGOTTEN TAB, BEFORE purge_checkout_sessions DELETES IT
+CHECKOUT_SESSION_RETENTION = int(os.environ.get("CHECKOUT_SESSION_RETENTION", 604800))
+
+# SECONDS THE HOME PAGE KEEPS ITS PRODUCT ID POOLS AND RENDERED RAILS
+HOME_RAIL_POOL_TIMEOUT = int(os.environ.get("HOME_RAIL_POOL_TIMEOUT", 600))
+HOME_RAILS_CACHE_TIMEOUT = int(os.environ.get("HOME_RAILS_CACHE_TIMEOUT", 60))
+
+# SECONDS A USER'S FAVOURITE PRODUCT IDS STAY CACHED, TOGGLES INVALIDATE THEM
+FAVOURITE_IDS_CACHE_TIMEOUT = int(os.environ.get("FAVOURITE_IDS_CACHE_TIMEOUT", 86400))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
@@ -52,19 +131,20 @@ INSTALLED_APPS = [
     "checkout",
     "products",
     "cart",
-    "debug_toolbar",
+    "marketing",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "core.middleware.RequestMetricsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -73,11 +153,33 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# N+1 AND SLOW QUERY DETECTOR, SEE core.query_detector: "off", "log" OR "strict"
+# (RAISES ON N+1S). A QUERY SHAPE RUN QUERY_DETECTOR_REPEAT TIMES IN ONE REQUEST
+# IS AN N+1. QUERY_DETECTOR_IGNORE LISTS KNOWN ONES, AS "FILE" OR "FILE:LINE"
+QUERY_DETECTOR = os.environ.get("QUERY_DETECTOR", "log" if DEBUG else "off")
+QUERY_DETECTOR_REPEAT = int(os.environ.get("QUERY_DETECTOR_REPEAT", 5))
+QUERY_DETECTOR_SLOW_MS = float(os.environ.get("QUERY_DETECTOR_SLOW_MS", 100))
+QUERY_DETECTOR_IGNORE = []
+if QUERY_DETECTOR != "off":
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("core.middleware.RequestMetricsMiddleware") + 1,
+        "core.middleware.QueryDetectorMiddleware",
+    )
+
+# THE DEBUG TOOLBAR ADDS OVERHEAD TO EVERY REQUEST, SO ONLY LOAD IT IN DEVELOPMENT
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("core.middleware.RequestMetricsMiddleware") + 1,
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
+    )
+
 ROOT_URLCONF = "laced.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DJANGO TEMPLATES, WITH RENDER TIME RECORDED FOR THE REQUEST METRICS
+        "BACKEND": "core.instrumentation.InstrumentedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -87,6 +189,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "cart.context_processors.cart_quantity_badge",
+                "users.context_processors.favourite_ids",
             ],
         },
     },
@@ -138,6 +241,22 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+STRIPE_PRIVATE_KEY = os.getenv("STRIPE_PRIVATE_KEY")
+
+# SIGNING SECRET OF THE WEBHOOK ENDPOINT, USED TO VERIFY STRIPE EVENTS. THE
+# whsec_... VALUE FROM THE STRIPE DASHBOARD (OR `stripe listen` LOCALLY).
+# REQUIRED UNLESS DEBUG, STARTUP FAILS WITHOUT IT (SEE checkout.checks)
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+
+# SET TO THE fake_stripe SERVER, E.G. http://localhost:12111, TO WORK OFFLINE
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+
+# STRIPE HTTP CLIENT: TIMEOUTS IN SECONDS, RETRIES ON NETWORK ERRORS
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", 3.05))
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", 20))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", 2))
+STRIPE_POOL_SIZE = int(os.getenv("STRIPE_POOL_SIZE", 10))
+
 USE_S3 = os.getenv("USE_S3") == "TRUE"
 
 if USE_S3:
@@ -165,3 +284,19 @@ else:
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    # THE APP LOGGERS HAVE THEIR OWN HANDLER, SO THEY DO NOT PROPAGATE TO THE
+    # ROOT LOGGER AND LOG EVERY LINE TWICE
+    "loggers": {
+        "core": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "checkout": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "products": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "marketing": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
@@ -1,13 +1,29 @@
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
+from core.instrumentation import instrument_boto3_client
 
 
-class StaticStorage(S3Boto3Storage):
+class InstrumentedS3Storage(S3Boto3Storage):
+    """
+    S3 storage recording the time of its S3 calls in the request metrics.
+    """
+
+    @property
+    def connection(self):
+        # THE CONNECTION IS CREATED ONCE PER THREAD, INSTRUMENT IT THEN
+        created = getattr(self._connections, "connection", None) is None
+        connection = super().connection
+        if created:
+            instrument_boto3_client(connection.meta.client)
+        return connection
+
+
+class StaticStorage(InstrumentedS3Storage):
     location = "static"
     default_acl = "public-read"
 
 
-class MediaStorage(S3Boto3Storage):
+class MediaStorage(InstrumentedS3Storage):
     location = "media"
     default_acl = "public-read"
     file_overwrite = False
@@ -29,6 +29,12 @@ urlpatterns = [
     ),
     path("products/", product_views.products_view, name="products"),
     path("products/add", product_views.add_product, name="add_product"),
+    path("search/", product_views.search_view, name="search"),
+    path(
+        "search/typeahead/",
+        product_views.search_typeahead,
+        name="search_typeahead",
+    ),
     path(
         "products/edit/<int:product_id>",
         product_views.edit_product,
@@ -84,10 +90,10 @@ urlpatterns = [
     ),
     path("stripe_webhook/", checkout_views.stripe_webhook, name="stripe_webhook"),
     path("subscribe/", marketing_views.subscribe, name="subscribe"),
-    path("__debug__/", include("debug_toolbar.urls")),
 ]
 
-# USED TO SERVE MEDIA FILES IN DEVELOPMENT
+# USED TO SERVE MEDIA FILES AND THE DEBUG TOOLBAR IN DEVELOPMENT
 if settings.DEBUG:
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,3 +1,11 @@
 from django.contrib import admin
+from marketing.models import NewsletterSubscription
 
-# Register your models here.
+
+class NewsletterSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ["email", "status", "attempts", "date_created", "date_sent"]
+    search_fields = ["email"]
+    list_filter = ["status"]
+
+
+admin.site.register(NewsletterSubscription, NewsletterSubscriptionAdmin)
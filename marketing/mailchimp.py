@@ -0,0 +1,87 @@
+import json
+import threading
+from django.conf import settings
+from core.instrumentation import TimedSession
+from mailchimp_marketing.api.lists_api import ListsApi
+from mailchimp_marketing.api_client import ApiClient
+
+# MAILCHIMP ACCEPTS UP TO 500 MEMBERS PER BATCH SUBSCRIBE CALL
+MAX_BATCH_SIZE = 500
+
+
+class SessionApiClient(ApiClient):
+    """
+    Mailchimp API client that sends every call through one requests session.
+
+    The stock client calls requests.get/post directly, which opens a new
+    connection (and TLS handshake) for every call.
+    """
+
+    def __init__(self, config):
+        self.session = TimedSession("mailchimp")
+        super().__init__(config)
+
+    def request(self, method, url, query_params=None, headers=None, body=None):
+        auth = ("user", self.api_key) if self.is_basic_auth else None
+        data = json.dumps(body) if method in ("POST", "PUT", "PATCH") else None
+        return self.session.request(
+            method,
+            url,
+            params=query_params,
+            data=data,
+            headers=headers,
+            auth=auth,
+            timeout=self.timeout,
+        )
+
+
+_lock = threading.Lock()
+_lists_api = None
+
+
+def get_lists_api():
+    """
+    Returns the process-wide Mailchimp lists API, creating it on first use.
+
+    Returns:
+        ListsApi: The lists API, sharing one keep-alive HTTP session.
+    """
+    global _lists_api
+    if _lists_api is None:
+        with _lock:
+            if _lists_api is None:
+                _lists_api = ListsApi(
+                    SessionApiClient(
+                        {
+                            "api_key": settings.MAILCHIMP_API_KEY,
+                            "server": settings.MAILCHIMP_DATA_CENTER,
+                            "timeout": settings.MAILCHIMP_TIMEOUT,
+                        }
+                    )
+                )
+    return _lists_api
+
+
+def batch_subscribe(emails):
+    """
+    Subscribes a batch of email addresses to the newsletter list in one call.
+
+    Args:
+        emails (list): Up to MAX_BATCH_SIZE email addresses.
+
+    Returns:
+        dict: Errors by email address, for the addresses Mailchimp rejected.
+
+    Raises:
+        ApiClientError: If the call itself failed.
+    """
+    response = get_lists_api().batch_list_members(
+        settings.MAILCHIMP_LIST_ID,
+        {
+            "members": [
+                {"email_address": email, "status": "subscribed"} for email in emails
+            ],
+            "update_existing": False,
+        },
+    )
+    return {error["email_address"]: error for error in response.get("errors", [])}
@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from marketing.outbox import send_pending_subscriptions
+
+
+class Command(BaseCommand):
+    """
+    Sends pending newsletter signups to Mailchimp in batches.
+
+    Runs as a long-lived worker by default, polling for due signups, so
+    bursts of signups become a few batch calls instead of one call each.
+    """
+
+    help = "Send pending newsletter signups to Mailchimp."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send the signups that are due, then exit.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when no signup is due (default 5).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = 0
+            while True:
+                close_old_connections()
+                batch = send_pending_subscriptions()
+                if not batch:
+                    break
+                sent += batch
+                self.stdout.write(f"Sent a batch of {batch} signups.")
+            if options["once"]:
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} signups."))
+                return
+            time.sleep(options["poll_interval"])
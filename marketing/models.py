@@ -1,3 +1,49 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class NewsletterSubscription(models.Model):
+    """
+    A newsletter signup waiting to be sent to Mailchimp.
+
+    The subscribe view only stores the signup, and the send_subscriptions
+    command sends pending signups to Mailchimp in batches.
+
+    Attributes:
+        email (str): The email address to subscribe.
+        status (str): Where the signup is in the outbox.
+        attempts (int): The number of failed attempts to send it.
+        next_attempt_at (datetime): When the worker may next send it.
+        last_error (str): The error of the last failed attempt.
+        date_created (datetime): When the visitor signed up.
+        date_sent (datetime): When Mailchimp accepted the signup.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUSES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    email = models.EmailField(unique=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_sent = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=models.Q(status="pending"),
+                name="newsletter_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.email
@@ -0,0 +1,79 @@
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from mailchimp_marketing.api_client import ApiClientError
+from marketing.mailchimp import MAX_BATCH_SIZE, batch_subscribe
+from marketing.models import NewsletterSubscription
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+BASE_BACKOFF = 60
+MAX_BACKOFF = 60 * 60
+
+# MAILCHIMP ERROR CODES THAT MEAN THE ADDRESS IS ALREADY ON THE LIST
+ALREADY_SUBSCRIBED = {"ERROR_CONTACT_EXISTS"}
+
+
+def send_pending_subscriptions(batch_size=MAX_BATCH_SIZE):
+    """
+    Sends the oldest due signups to Mailchimp in one batch call.
+
+    The signups stay locked until their new status is saved, so several
+    workers never send the same signup. If the call fails the whole batch
+    is retried with exponential backoff; addresses Mailchimp rejects, e.g.
+    as invalid, are marked failed.
+
+    Args:
+        batch_size (int): The maximum number of signups to send.
+
+    Returns:
+        int: The number of signups in the batch, 0 if none were due.
+    """
+    with transaction.atomic():
+        subscriptions = list(
+            NewsletterSubscription.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=NewsletterSubscription.PENDING,
+                next_attempt_at__lte=timezone.now(),
+            )
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if not subscriptions:
+            return 0
+        try:
+            errors = batch_subscribe(
+                [subscription.email for subscription in subscriptions]
+            )
+        except ApiClientError as e:
+            logger.warning(
+                "Mailchimp batch of %s failed: %s", len(subscriptions), e.text
+            )
+            for subscription in subscriptions:
+                subscription.attempts += 1
+                subscription.last_error = str(e.text)
+                if subscription.attempts >= MAX_ATTEMPTS:
+                    subscription.status = NewsletterSubscription.FAILED
+                else:
+                    delay = min(
+                        BASE_BACKOFF * 2 ** (subscription.attempts - 1), MAX_BACKOFF
+                    )
+                    subscription.next_attempt_at = timezone.now() + timedelta(
+                        seconds=delay
+                    )
+        else:
+            errors = {email.lower(): error for email, error in errors.items()}
+            for subscription in subscriptions:
+                error = errors.get(subscription.email.lower())
+                if error is None or error.get("error_code") in ALREADY_SUBSCRIBED:
+                    subscription.status = NewsletterSubscription.SENT
+                    subscription.date_sent = timezone.now()
+                else:
+                    subscription.status = NewsletterSubscription.FAILED
+                    subscription.last_error = error.get("error", "")
+        NewsletterSubscription.objects.bulk_update(
+            subscriptions,
+            ["status", "attempts", "next_attempt_at", "last_error", "date_sent"],
+        )
+    return len(subscriptions)
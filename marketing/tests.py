@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest import mock
+from django.utils import timezone
+from mailchimp_marketing.api_client import ApiClientError
+from core.testing import TestCase
+from marketing.models import NewsletterSubscription
+from marketing.outbox import MAX_ATTEMPTS, send_pending_subscriptions
+
+
+@mock.patch("marketing.outbox.batch_subscribe", return_value={})
+class SubscribeViewTests(TestCase):
+    def subscribe(self, email):
+        return self.client.post("/subscribe/", {"email": email}).content.decode()
+
+    def test_a_signup_is_queued_without_calling_mailchimp(self, batch_subscribe):
+        self.assertIn("Success", self.subscribe(" Fan@Example.com "))
+        subscription = NewsletterSubscription.objects.get()
+        self.assertEqual(subscription.email, "fan@example.com")
+        self.assertEqual(subscription.status, NewsletterSubscription.PENDING)
+        batch_subscribe.assert_not_called()
+
+    def test_a_second_signup_is_already_subscribed(self, batch_subscribe):
+        self.subscribe("fan@example.com")
+        self.assertIn("already subscribed", self.subscribe("fan@example.com"))
+        self.assertEqual(NewsletterSubscription.objects.count(), 1)
+
+    def test_a_failed_signup_is_queued_again(self, batch_subscribe):
+        NewsletterSubscription.objects.create(
+            email="fan@example.com",
+            status=NewsletterSubscription.FAILED,
+            attempts=MAX_ATTEMPTS,
+            last_error="down",
+        )
+        self.assertIn("Success", self.subscribe("fan@example.com"))
+        subscription = NewsletterSubscription.objects.get()
+        self.assertEqual(subscription.status, NewsletterSubscription.PENDING)
+        self.assertEqual((subscription.attempts, subscription.last_error), (0, ""))
+
+
+@mock.patch("marketing.outbox.batch_subscribe", return_value={})
+class SendPendingSubscriptionsTests(TestCase):
+    def setUp(self):
+        NewsletterSubscription.objects.bulk_create(
+            [
+                NewsletterSubscription(email="one@example.com"),
+                NewsletterSubscription(email="two@example.com"),
+                NewsletterSubscription(
+                    email="later@example.com",
+                    next_attempt_at=timezone.now() + timedelta(minutes=5),
+                ),
+            ]
+        )
+
+    def statuses(self):
+        return dict(NewsletterSubscription.objects.values_list("email", "status"))
+
+    def test_due_signups_are_sent_in_one_batch(self, batch_subscribe):
+        self.assertEqual(send_pending_subscriptions(), 2)
+        batch_subscribe.assert_called_once_with(["one@example.com", "two@example.com"])
+        self.assertEqual(
+            self.statuses(),
+            {
+                "one@example.com": NewsletterSubscription.SENT,
+                "two@example.com": NewsletterSubscription.SENT,
+                "later@example.com": NewsletterSubscription.PENDING,
+            },
+        )
+        self.assertEqual(send_pending_subscriptions(), 0)
+
+    def test_rejected_addresses_fail_and_existing_members_are_sent(
+        self, batch_subscribe
+    ):
+        batch_subscribe.return_value = {
+            "ONE@example.com": {"error": "invalid", "error_code": "ERROR_GENERIC"},
+            "two@example.com": {
+                "error": "exists",
+                "error_code": "ERROR_CONTACT_EXISTS",
+            },
+        }
+        send_pending_subscriptions()
+        statuses = self.statuses()
+        self.assertEqual(statuses["one@example.com"], NewsletterSubscription.FAILED)
+        self.assertEqual(statuses["two@example.com"], NewsletterSubscription.SENT)
+
+    def test_a_failed_call_is_retried_with_backoff(self, batch_subscribe):
+        batch_subscribe.side_effect = ApiClientError("down", 503)
+        send_pending_subscriptions()
+        subscription = NewsletterSubscription.objects.get(email="one@example.com")
+        self.assertEqual(subscription.status, NewsletterSubscription.PENDING)
+        self.assertEqual((subscription.attempts, subscription.last_error), (1, "down"))
+        self.assertGreater(subscription.next_attempt_at, timezone.now())
+        # NOT DUE UNTIL THE BACKOFF HAS PASSED
+        self.assertEqual(send_pending_subscriptions(), 0)
+
+    def test_the_last_attempt_marks_the_signup_failed(self, batch_subscribe):
+        batch_subscribe.side_effect = ApiClientError("down", 503)
+        NewsletterSubscription.objects.filter(email="one@example.com").update(
+            attempts=MAX_ATTEMPTS - 1
+        )
+        send_pending_subscriptions()
+        statuses = self.statuses()
+        self.assertEqual(statuses["one@example.com"], NewsletterSubscription.FAILED)
+        self.assertEqual(statuses["two@example.com"], NewsletterSubscription.PENDING)
@@ -1,33 +1,36 @@
-from django.shortcuts import render
-from django.conf import settings as DJANGO_SETTINGS
-from mailchimp_marketing.api_client import ApiClientError
-import mailchimp_marketing as MailchimpMarketing
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.http import HttpResponse
-import json
+from django.utils import timezone
+from marketing.models import NewsletterSubscription
 
 
 def subscribe(request):
     """
     View function for subscribing to the newsletter.
 
+    The signup is stored in the outbox and sent to Mailchimp by the
+    send_subscriptions worker, so no call to Mailchimp is made here.
+
     Response:
     HttpResponse with a message indicating the result of the subscription attempt.
     """
-    mailchimp = MailchimpMarketing.Client()
-    mailchimp.set_config(
-        {
-            "api_key": DJANGO_SETTINGS.MAILCHIMP_API_KEY,
-            "server": DJANGO_SETTINGS.MAILCHIMP_DATA_CENTER,
-        }
-    )
-    list_id = DJANGO_SETTINGS.MAILCHIMP_LIST_ID
-    member_info = {"email_address": request.POST.get("email"), "status": "subscribed"}
-    response = mailchimp.lists.get_list(list_id)
+    email = (request.POST.get("email") or "").strip().lower()
     try:
-        response = mailchimp.lists.add_list_member(list_id, member_info)
-        return HttpResponse("Success! Keep an eye on your inbox for updates.")
-    except ApiClientError as error:
-        error_json = json.loads(error.text)
-        if error_json.get("title") == "Member Exists":
-            return HttpResponse("You are already subscribed.")
-        return HttpResponse("An error occurred. Please try again later.")
+        validate_email(email)
+    except ValidationError:
+        return HttpResponse("Please enter a valid email address.")
+    subscription, created = NewsletterSubscription.objects.get_or_create(email=email)
+    if subscription.status == NewsletterSubscription.FAILED:
+        # MAILCHIMP GAVE UP ON THE EARLIER SIGNUP, SO IT IS QUEUED AGAIN
+        NewsletterSubscription.objects.filter(
+            pk=subscription.pk, status=NewsletterSubscription.FAILED
+        ).update(
+            status=NewsletterSubscription.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+            last_error="",
+        )
+    elif not created:
+        return HttpResponse("You are already subscribed.")
+    return HttpResponse("Success! Keep an eye on your inbox for updates.")
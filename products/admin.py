@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Product, ProductCategory, ProductImage, ProductVariant
+from .models import (
+    Product,
+    ProductCategory,
+    ProductImage,
+    ProductVariant,
+    StockReservation,
+)
 
 
 class ProductImageInline(admin.StackedInline):
@@ -21,3 +27,11 @@ admin.site.register(Product, ProductAdmin)
 admin.site.register(ProductCategory)
 admin.site.register(ProductImage)
 admin.site.register(ProductVariant)
+
+
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ["reference", "variant", "quantity", "expires_at"]
+    search_fields = ["reference"]
+
+
+admin.site.register(StockReservation, StockReservationAdmin)
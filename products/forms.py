@@ -1,6 +1,6 @@
 from django.forms import ModelForm
 from django import forms
-from .models import Product, ProductImage, ProductVariant
+from .models import Product, ProductCategory, ProductImage, ProductVariant
 
 
 class ProductForm(ModelForm):
@@ -30,3 +30,83 @@ class ProductVariantForm(forms.ModelForm):
     class Meta:
         model = ProductVariant
         fields = []
+
+
+class ProductFilterForm(forms.Form):
+    """
+    Form for filtering and sorting the product listing.
+
+    Maps each sort choice to the keyset ordering used to paginate it;
+    the last field of each ordering is unique so pages never overlap.
+    """
+
+    SORTS = {
+        "newest": ("-id",),
+        "price_asc": ("current_price", "id"),
+        "price_desc": ("-current_price", "-id"),
+        "name": ("name", "id"),
+    }
+    SORT_CHOICES = [
+        ("newest", "Newest"),
+        ("price_asc", "Price: low to high"),
+        ("price_desc", "Price: high to low"),
+        ("name", "Name"),
+    ]
+
+    category = forms.ModelChoiceField(
+        queryset=ProductCategory.objects.order_by("name"),
+        required=False,
+        empty_label="All categories",
+    )
+    size = forms.ChoiceField(
+        choices=[("", "All sizes")] + ProductVariant.SIZES, required=False
+    )
+    on_sale = forms.BooleanField(required=False)
+    min_price = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name, field in self.fields.items():
+            field.widget.attrs.update({"class": "border-primary border-2 h-12 p-2"})
+        self.fields["on_sale"].widget.attrs.update({"class": "border-primary border-2"})
+        self.fields["min_price"].widget.attrs.update({"placeholder": "Min €"})
+        self.fields["max_price"].widget.attrs.update({"placeholder": "Max €"})
+
+    def filter_queryset(self, queryset):
+        """
+        Applies the valid filters to a product queryset.
+
+        Args:
+            queryset (QuerySet): The products to filter.
+
+        Returns:
+            QuerySet: The filtered products.
+        """
+        if not self.is_valid():
+            return queryset
+        data = self.cleaned_data
+        if data["category"]:
+            queryset = queryset.filter(category=data["category"])
+        if data["size"]:
+            # SIZE MUST BE IN STOCK, USES variant_size_in_stock_idx
+            in_stock = ProductVariant.objects.filter(size=data["size"], quantity__gt=0)
+            queryset = queryset.filter(id__in=in_stock.values("product_id"))
+        if data["on_sale"]:
+            queryset = queryset.filter(sale_price__gt=0)
+        if data["min_price"] is not None:
+            queryset = queryset.filter(current_price__gte=data["min_price"])
+        if data["max_price"] is not None:
+            queryset = queryset.filter(current_price__lte=data["max_price"])
+        return queryset
+
+    def get_ordering(self):
+        """
+        Returns the keyset ordering for the selected sort, newest first by default.
+
+        Returns:
+            tuple: Field names to order by.
+        """
+        sort = self.cleaned_data.get("sort") if self.is_valid() else None
+        return self.SORTS.get(sort or "newest")
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+try:
+    # REGISTERS AN AVIF ENCODER WITH PILLOW WHEN INSTALLED
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# WIDTHS IN PIXELS OF EACH RENDITION, AT 1X AND 2X
+RENDITIONS = {
+    "thumb": (160, 320),
+    "card": (480, 960),
+    "detail": (800, 1600),
+}
+
+# ENCODER OPTIONS, PREFERRED FORMAT FIRST
+FORMATS = {
+    "avif": {"quality": 60},
+    "webp": {"quality": 80},
+}
+
+RENDITIONS_DIR = "product_imgs/renditions"
+
+
+def supported_formats():
+    """
+    Returns the rendition formats the installed Pillow can encode.
+
+    WebP is built into Pillow; AVIF needs an encoder plugin such as
+    pillow-avif-plugin and is skipped without one.
+
+    Returns:
+        list: Format names, preferred format first.
+    """
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt.upper() in Image.SAVE]
+
+
+def rendition_widths(source_width):
+    """
+    Returns every width to generate for a source image, never upscaling.
+
+    Args:
+        source_width (int): The width of the original image.
+
+    Returns:
+        list: The distinct widths, smallest first.
+    """
+    return sorted(
+        {min(width, source_width) for widths in RENDITIONS.values() for width in widths}
+    )
+
+
+def content_hash(data):
+    """
+    Returns the hash used to recognise an image file that was uploaded before.
+
+    Args:
+        data (bytes): The contents of the file.
+
+    Returns:
+        str: The SHA-256 hex digest of the contents.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_image(product_image):
+    """
+    Reads the original file of a product image from its storage.
+
+    Args:
+        product_image (ProductImage): The image to read.
+
+    Returns:
+        bytes: The contents of the file.
+    """
+    with product_image.image.open("rb") as f:
+        return f.read()
+
+
+def generate_renditions(product_image, data):
+    """
+    Generates the resized WebP/AVIF renditions of a product image.
+
+    Files are written through the storage of the image field, so they go
+    to S3 (MediaStorage) or local media like the original. Renditions of
+    a previous upload are deleted.
+
+    Args:
+        product_image (ProductImage): The image to generate renditions of.
+        data (bytes): The contents of the original file.
+
+    Returns:
+        dict: The renditions, to store in ProductImage.renditions.
+    """
+    storage = product_image.image.storage
+    source = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+    for names in product_image.renditions.get("files", {}).values():
+        for name in names.values():
+            storage.delete(name)
+    stem = os.path.splitext(os.path.basename(product_image.image.name))[0]
+    files = {fmt: {} for fmt in supported_formats()}
+    for width in rendition_widths(source.width):
+        height = max(1, round(source.height * width / source.width))
+        resized = source.resize((width, height), Image.LANCZOS)
+        for fmt in files:
+            buffer = BytesIO()
+            resized.save(buffer, fmt.upper(), **FORMATS[fmt])
+            files[fmt][str(width)] = storage.save(
+                f"{RENDITIONS_DIR}/{stem}-{width}w.{fmt}",
+                ContentFile(buffer.getvalue()),
+            )
+    return {
+        "source": product_image.image.name,
+        "width": source.width,
+        "height": source.height,
+        "files": files,
+    }
+
+
+def refresh_renditions(product_image, force=False):
+    """
+    Generates and stores the renditions and content hash of an image
+    whose file changed.
+
+    Args:
+        product_image (ProductImage): The image to refresh.
+        force (bool): Regenerate even if the renditions are up to date.
+
+    Returns:
+        bool: Whether renditions were generated.
+    """
+    if not product_image.image:
+        return False
+    up_to_date = (
+        product_image.renditions.get("source") == product_image.image.name
+        and product_image.content_hash
+    )
+    if up_to_date and not force:
+        return False
+    try:
+        data = read_image(product_image)
+        renditions = generate_renditions(product_image, data)
+    except (OSError, Image.DecompressionBombError):
+        logger.exception(
+            "Could not generate renditions of %s", product_image.image.name
+        )
+        return False
+    product_image.renditions = renditions
+    product_image.content_hash = content_hash(data)
+    # UPDATE RATHER THAN SAVE, SO SAVE SIGNALS DO NOT RUN AGAIN
+    type(product_image).objects.filter(pk=product_image.pk).update(
+        renditions=renditions, content_hash=product_image.content_hash
+    )
+    return True
+
+
+def srcset(product_image, rendition, fmt):
+    """
+    Builds the srcset of one rendition of an image in one format.
+
+    Args:
+        product_image (ProductImage): The image.
+        rendition (str): A key of RENDITIONS, e.g. "card".
+        fmt (str): A key of FORMATS, e.g. "webp".
+
+    Returns:
+        str: The srcset, empty if the image has no such renditions.
+    """
+    renditions = product_image.renditions
+    files = renditions.get("files", {}).get(fmt)
+    if not files:
+        return ""
+    storage = product_image.image.storage
+    widths = sorted(
+        {min(width, renditions["width"]) for width in RENDITIONS[rendition]}
+    )
+    return ", ".join(
+        f"{storage.url(files[str(width)])} {width}w"
+        for width in widths
+        if str(width) in files
+    )
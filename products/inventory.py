@@ -0,0 +1,231 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from products.models import ProductVariant, StockReservation
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when a reservation asks for more units than are available.
+
+    Attributes:
+        variant_ids (list): The variants that do not have enough stock.
+    """
+
+    def __init__(self, variant_ids):
+        super().__init__(f"Insufficient stock for variants {variant_ids}")
+        self.variant_ids = variant_ids
+
+
+def active_reservations():
+    return StockReservation.objects.filter(expires_at__gt=timezone.now())
+
+
+def _quantities(items):
+    """
+    Sums (variant_id, quantity) pairs per variant.
+    """
+    quantities = Counter()
+    for variant_id, quantity in items:
+        quantities[int(variant_id)] += int(quantity)
+    return quantities
+
+
+def with_available(queryset):
+    """
+    Annotates variants with the number of units available to sell.
+
+    The count is the stock less the units held by active reservations,
+    computed in the same query as the variants.
+
+    Args:
+        queryset (QuerySet): ProductVariant queryset to annotate.
+
+    Returns:
+        QuerySet: The queryset with an "available" annotation.
+    """
+    reserved = (
+        active_reservations()
+        .filter(variant=OuterRef("pk"))
+        .values("variant")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return queryset.annotate(
+        available=Greatest(
+            Coalesce("quantity", 0) - Coalesce(Subquery(reserved), 0),
+            Value(0),
+        )
+    )
+
+
+def available_to_sell(variant_id):
+    """
+    Returns the number of units of a variant available to sell.
+
+    Args:
+        variant_id (int): The ID of the product variant.
+
+    Returns:
+        int: The available units, 0 if the variant does not exist.
+    """
+    variant = with_available(ProductVariant.objects.filter(id=variant_id)).first()
+    return variant.available if variant else 0
+
+
+def reserve_stock(reference, items, ttl=None, replaces=()):
+    """
+    Reserves stock for a checkout, replacing any earlier reservation.
+
+    The customer's earlier checkouts (a reload, a second tab, a retry) are
+    passed in replaces, so their holds are released instead of counting
+    against the new reservation.
+
+    The variants are locked (in ID order, so concurrent checkouts cannot
+    deadlock) before their reservations are counted, so two checkouts can
+    never both reserve the last unit.
+
+    Args:
+        reference (str): The order ID of the checkout.
+        items (list): (variant_id, quantity) pairs to reserve.
+        ttl (int): Seconds to hold the stock, STOCK_RESERVATION_TTL by default.
+        replaces (list): Order IDs of earlier checkouts of the same customer.
+
+    Returns:
+        None
+
+    Raises:
+        InsufficientStock: If any variant does not have enough stock.
+    """
+    quantities = _quantities(items)
+    references = [reference, *replaces]
+    if ttl is None:
+        ttl = settings.STOCK_RESERVATION_TTL
+    with transaction.atomic():
+        stock = dict(
+            ProductVariant.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by("id")
+            .values_list("id", "quantity")
+        )
+        reserved = dict(
+            active_reservations()
+            .filter(variant__in=quantities)
+            .exclude(reference__in=references)
+            .values("variant")
+            .annotate(total=Sum("quantity"))
+            .values_list("variant", "total")
+        )
+        short = [
+            variant_id
+            for variant_id, quantity in quantities.items()
+            if (stock.get(variant_id) or 0) - reserved.get(variant_id, 0) < quantity
+        ]
+        if short:
+            raise InsufficientStock(short)
+        StockReservation.objects.filter(reference__in=references).delete()
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(
+                    variant_id=variant_id,
+                    reference=reference,
+                    quantity=quantity,
+                    expires_at=expires_at,
+                )
+                for variant_id, quantity in quantities.items()
+            ]
+        )
+
+
+def release_stock(reference):
+    """
+    Releases the stock reserved by a checkout.
+
+    Args:
+        reference (str): The order ID of the checkout.
+
+    Returns:
+        None
+    """
+    StockReservation.objects.filter(reference=reference).delete()
+
+
+def commit_stock(reference, items):
+    """
+    Takes sold units out of stock and drops the checkout's reservation.
+
+    Stock is decremented with a single conditional UPDATE
+    (WHERE quantity >= n), so it can never go negative. Variants short
+    of stock, e.g. because the reservation expired and the units were
+    sold elsewhere, are left untouched and returned for follow-up.
+
+    Args:
+        reference (str): The order ID of the checkout.
+        items (list): (variant_id, quantity) pairs that were sold.
+
+    Returns:
+        list: The IDs of the variants that did not have enough stock.
+    """
+    quantities = _quantities(items)
+    with transaction.atomic():
+        stock = dict(
+            ProductVariant.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by("id")
+            .values_list("id", "quantity")
+        )
+        short = [
+            variant_id
+            for variant_id, quantity in quantities.items()
+            if (stock.get(variant_id) or 0) < quantity
+        ]
+        sold = {
+            variant_id: quantity
+            for variant_id, quantity in quantities.items()
+            if variant_id not in short
+        }
+        if sold:
+            amount = Case(
+                *[
+                    When(id=variant_id, then=Value(quantity))
+                    for variant_id, quantity in sold.items()
+                ],
+                output_field=IntegerField(),
+            )
+            ProductVariant.objects.filter(id__in=sold, quantity__gte=amount).update(
+                quantity=F("quantity") - amount
+            )
+        release_stock(reference)
+    if short:
+        logger.error("Order %s oversold variants %s", reference, short)
+    return short
+
+
+def purge_expired_reservations():
+    """
+    Deletes reservations that no longer hold stock.
+
+    Expired reservations are already ignored by availability counts, so
+    this only keeps the table small.
+
+    Returns:
+        int: The number of deleted reservations.
+    """
+    return StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,51 @@
+import csv
+import json
+import sys
+from django.core.management.base import BaseCommand
+from products.stock import FIELDS, export_rows
+
+
+class Command(BaseCommand):
+    """
+    Writes the stock of every variant as CSV or JSONL.
+
+    Rows are streamed from the database in chunks and written as they
+    arrive, so memory use does not grow with the number of variants. The
+    output can be fed back to import_stock.
+    """
+
+    help = "Export variant stock levels as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            default="csv",
+            help="Output format (default csv).",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="File to write, stdout by default.",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        file = (
+            sys.stdout
+            if output == "-"
+            else open(output, "w", newline="", encoding="utf-8")
+        )
+        try:
+            if options["format"] == "csv":
+                writer = csv.writer(file)
+                writer.writerow(FIELDS)
+                for sku, size, quantity in export_rows():
+                    writer.writerow([sku, size, quantity or 0])
+            else:
+                for sku, size, quantity in export_rows():
+                    record = {"sku": sku, "size": size, "quantity": quantity or 0}
+                    file.write(json.dumps(record) + "\n")
+        finally:
+            if file is not sys.stdout:
+                file.close()
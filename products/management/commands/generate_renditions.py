@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from products.images import refresh_renditions
+from products.models import ProductImage
+from products.signals import bump_card_version
+
+
+class Command(BaseCommand):
+    """
+    Generates the resized WebP/AVIF renditions and content hashes of
+    product images.
+
+    New uploads get their renditions on save; this backfills images
+    uploaded before the pipeline existed, or regenerates all with --force.
+    """
+
+    help = "Generate resized renditions of product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions that are already up to date.",
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        for image in ProductImage.objects.order_by("id").iterator():
+            if refresh_renditions(image, force=options["force"]):
+                generated += 1
+                if image.product_id is not None:
+                    bump_card_version(image.product_id)
+                self.stdout.write(f"Generated renditions of {image.image.name}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated renditions of {generated} images.")
+        )
@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from tqdm import tqdm
+from products.images import content_hash, generate_renditions
+from products.models import Product, ProductImage
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# A SKU IS EXACTLY 6 DIGITS, NOT PART OF A LONGER NUMBER
+SKU_PATTERN = re.compile(r"(?<!\d)\d{6}(?!\d)")
+
+
+def match_product(filename, products_by_sku):
+    """
+    Finds the product an image belongs to from a SKU in its file name,
+    e.g. "123456-side.jpg".
+
+    Args:
+        filename (str): The name of the image file.
+        products_by_sku (dict): Product IDs by SKU.
+
+    Returns:
+        int: The ID of the product, or None if no known SKU is in the name.
+    """
+    for sku in SKU_PATTERN.findall(filename):
+        if sku in products_by_sku:
+            return products_by_sku[sku]
+    return None
+
+
+class Command(BaseCommand):
+    """
+    Imports product images from a local directory.
+
+    Files are uploaded and their renditions generated by a pool of worker
+    threads, so S3 uploads overlap instead of running one after another.
+    Images are matched to products by the SKU in their file name, and
+    files whose contents are already stored are skipped.
+    """
+
+    help = "Import product images from a directory, matched to products by SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Directory containing the images.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of images processed in parallel (default 8).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Match and hash the files without uploading anything.",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+        paths = sorted(
+            os.path.join(directory, filename)
+            for filename in os.listdir(directory)
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+        )
+        products_by_sku = dict(Product.objects.values_list("sku", "id"))
+        known_hashes = set(
+            ProductImage.objects.exclude(content_hash="").values_list(
+                "content_hash", flat=True
+            )
+        )
+        lock = threading.Lock()
+
+        def import_file(path):
+            try:
+                filename = os.path.basename(path)
+                product_id = match_product(filename, products_by_sku)
+                if product_id is None:
+                    return "unmatched", 0
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = content_hash(data)
+                # ALSO CATCHES DUPLICATE FILES WITHIN THIS IMPORT
+                with lock:
+                    if digest in known_hashes:
+                        return "skipped", 0
+                    known_hashes.add(digest)
+                if options["dry_run"]:
+                    return "imported", len(data)
+                try:
+                    image = ProductImage(product_id=product_id, content_hash=digest)
+                    image.image.save(filename, ContentFile(data), save=False)
+                    # RENDITIONS ARE MADE FROM THE BYTES IN MEMORY, SO THE
+                    # SAVE SIGNAL FINDS THEM UP TO DATE AND SKIPS DOWNLOADING
+                    image.renditions = generate_renditions(image, data)
+                    image.save()
+                except Exception:
+                    with lock:
+                        known_hashes.discard(digest)
+                    raise
+                return "imported", len(data)
+            finally:
+                # EACH WORKER THREAD HAS ITS OWN DATABASE CONNECTION
+                connections.close_all()
+
+        stats = Counter()
+        total_bytes = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool, tqdm(
+            total=len(paths), unit="img"
+        ) as progress:
+            futures = {pool.submit(import_file, path): path for path in paths}
+            for future in as_completed(futures):
+                try:
+                    outcome, size = future.result()
+                except Exception as e:
+                    outcome, size = "failed", 0
+                    progress.write(f"Failed to import {futures[future]}: {e!r}")
+                stats[outcome] += 1
+                total_bytes += size
+                progress.update()
+                progress.set_postfix(stats)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats['imported']}, skipped {stats['skipped']} "
+                f"already stored, {stats['unmatched']} without a known SKU, "
+                f"{stats['failed']} failed in {elapsed:.1f}s "
+                f"({len(paths) / elapsed if elapsed else 0:.1f} files/s, "
+                f"{total_bytes / 1e6 / elapsed if elapsed else 0:.1f} MB/s)."
+            )
+        )
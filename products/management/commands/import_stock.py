@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products.stock import StockRowError, apply_stock_chunk, chunked, read_rows
+
+# ONLY THE FIRST PROBLEMS ARE PRINTED, ALL ARE COUNTED
+MAX_REPORTED = 20
+
+
+class Command(BaseCommand):
+    """
+    Sets variant stock from a CSV or JSONL file of sku, size and quantity.
+
+    The file is streamed and applied in chunks, each chunk with one read
+    and one bulk UPDATE in its own transaction, so a full stock sync uses
+    bounded memory and a handful of queries per thousand variants.
+    """
+
+    help = "Import variant stock levels from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The stock file, or - to read stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format, guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Rows applied per transaction (default 1000).",
+        )
+
+    def report(self, problem):
+        self.problems += 1
+        if self.problems <= MAX_REPORTED:
+            self.stderr.write(problem)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            fmt = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        if path != "-" and not os.path.isfile(path):
+            raise CommandError(f"{path} does not exist.")
+        self.problems = 0
+        rows_read = updated = 0
+        started = time.perf_counter()
+
+        def valid_rows(file):
+            for row in read_rows(file, fmt):
+                if isinstance(row, StockRowError):
+                    self.report(str(row))
+                else:
+                    yield row
+
+        file = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            for chunk in chunked(valid_rows(file), options["chunk_size"]):
+                chunk_updated, unknown = apply_stock_chunk(chunk)
+                rows_read += len(chunk)
+                updated += chunk_updated
+                for line, sku, size, quantity in unknown:
+                    self.report(
+                        f"line {line}: no variant with SKU {sku} and size {size}"
+                    )
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Applied {rows_read} rows, {updated} variants changed, "
+                f"{self.problems} problems in {elapsed:.1f}s."
+            )
+        )
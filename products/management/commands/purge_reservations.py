@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.inventory import purge_expired_reservations
+
+
+class Command(BaseCommand):
+    """
+    Deletes expired stock reservations.
+
+    Expired reservations no longer count against available stock, so
+    this can run as an infrequent cron job.
+    """
+
+    help = "Delete expired stock reservations."
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} reservations."))
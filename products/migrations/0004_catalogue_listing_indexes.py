@@ -0,0 +1,60 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:20
+
+from django.db import migrations, models
+from django.db.models import Case, F, When
+
+
+def populate_current_price(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Product.objects.update(
+        current_price=Case(
+            When(sale_price__gt=0, then=F("sale_price")), default=F("price")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0003_alter_productvariant_product"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="current_price",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=10
+            ),
+        ),
+        migrations.RunPython(populate_current_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["category", "id"], name="product_category_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["current_price", "id"], name="product_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["name", "id"], name="product_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("sale_price__gt", 0)),
+                fields=["id"],
+                name="product_on_sale_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productvariant",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", 0)),
+                fields=["size", "product"],
+                name="variant_size_in_stock_idx",
+            ),
+        ),
+    ]
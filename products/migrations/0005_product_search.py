@@ -0,0 +1,69 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:22
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+SEARCH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS product_search_vector_idx "
+    "ON products_product USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS product_name_trgm_idx "
+    "ON products_product USING gin (name gin_trgm_ops)",
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN INDEXES ONLY EXIST ON POSTGRES, OTHER DATABASES USE products.search FALLBACK
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in SEARCH_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_search_vector_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS product_name_trgm_idx")
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Product = apps.get_model("products", "Product")
+    ProductCategory = apps.get_model("products", "ProductCategory")
+
+    def build_search_vector(category_name):
+        return (
+            SearchVector("name", weight="A", config="english")
+            + SearchVector("sku", weight="A", config="english")
+            + SearchVector(Value(category_name), weight="B", config="english")
+            + SearchVector("description", weight="C", config="english")
+        )
+
+    Product.objects.filter(category=None).update(search_vector=build_search_vector(""))
+    for category in ProductCategory.objects.all():
+        Product.objects.filter(category=category).update(
+            search_vector=build_search_vector(category.name)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0004_catalogue_listing_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0005_product_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="card_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0007_stock_reservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
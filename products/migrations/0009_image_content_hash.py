@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0008_image_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext as _
 import os
@@ -14,6 +15,12 @@ class Product(models.Model):
         description (str): Product description
         category (str): Product category
         price (float): Product price, 2 decimal places
+        current_price (float): Price the product sells for, kept in sync
+        with price/sale_price by products.signals so listings can filter
+        and sort on it
+        search_vector: Weighted full-text vector used by search on Postgres
+        card_version (int): Bumped whenever the cached product card must be
+        re-rendered, see products.templatetags.product_tags
 
     """
 
@@ -42,16 +49,86 @@ class Product(models.Model):
         decimal_places=2, max_digits=10, default=None, blank=True, null=True
     )
     is_featured = models.BooleanField(_("Featured Product?"), default=False)
+    current_price = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "id"], name="product_category_idx"),
+            models.Index(fields=["current_price", "id"], name="product_price_idx"),
+            models.Index(fields=["name", "id"], name="product_name_idx"),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(sale_price__gt=0),
+                name="product_on_sale_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # REMEMBER LOADED PRICES SO CHANGES CAN BE DETECTED ON SAVE
+        instance._loaded_prices = instance._current_prices()
+        return instance
+
+    def _current_prices(self):
+        return (self.__dict__.get("price"), self.__dict__.get("sale_price"))
+
+    def price_changed(self):
+        """
+        Checks whether price or sale_price differ from the values loaded
+        from the database.
+
+        Returns:
+            bool: True if either price has changed or was never loaded.
+        """
+        return getattr(self, "_loaded_prices", None) != self._current_prices()
+
+    @property
+    def primary_image(self):
+        """
+        Returns the first image of the product. Uses prefetched images when
+        available, unlike productimage_set.first which always queries.
+        A "first_images" attribute, set by prefetching only the first image
+        of each product, is used before the full image set.
+
+        Returns:
+            ProductImage: The first image, or None if the product has none.
+        """
+        if hasattr(self, "first_images"):
+            return self.first_images[0] if self.first_images else None
+        if "productimage_set" not in getattr(self, "_prefetched_objects_cache", {}):
+            return self.productimage_set.order_by("id").first()
+        images = self.productimage_set.all()
+        return min(images, key=lambda image: image.id, default=None)
+
     def get_price(self):
         if self.sale_price:
             return self.sale_price
         return self.price
 
 
+def deleted_with_product(origin):
+    """
+    Checks whether a delete signal is part of deleting products, e.g. for
+    the images and variants deleted with them.
+
+    Args:
+        origin: The origin of the delete signal, the model instance or
+            queryset whose delete() was called.
+
+    Returns:
+        bool: True if products are being deleted.
+    """
+    return isinstance(origin, Product) or getattr(origin, "model", None) is Product
+
+
 class ProductCategory(models.Model):
     """
     Product category model for storing product categories.
@@ -75,9 +152,16 @@ def upload_to_product_img(instance, filename):
 class ProductImage(models.Model):
     """
     Product image model for storing product images.
+    Resized WebP/AVIF renditions are generated on upload and listed in
+    renditions, see products.images. content_hash identifies the uploaded
+    file so bulk imports can skip images that are already stored.
     """
 
     image = models.ImageField(_("Image"), upload_to=upload_to_product_img)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    content_hash = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False
+    )
     product = models.ForeignKey(
         "products.Product",
         on_delete=models.SET_NULL,
@@ -117,5 +201,49 @@ class ProductVariant(models.Model):
         _("Qty in stock"), blank=True, default=0, null=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["size", "product"],
+                condition=models.Q(quantity__gt=0),
+                name="variant_size_in_stock_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.product.name}; {self.size}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a checkout while the customer pays.
+
+    Reserved units are not available to other customers until the
+    reservation expires, is released, or is turned into a sale.
+
+    Attributes:
+        variant (ProductVariant): The reserved product variant.
+        reference (str): The order ID of the checkout holding the stock.
+        quantity (int): The number of reserved units.
+        expires_at (datetime): When the reservation stops holding stock.
+    """
+
+    variant = models.ForeignKey(
+        "products.ProductVariant",
+        related_name="reservations",
+        on_delete=models.CASCADE,
+    )
+    reference = models.CharField(max_length=64, db_index=True)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["variant", "expires_at"],
+                name="reservation_variant_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.reference}: {self.quantity} x {self.variant_id}"
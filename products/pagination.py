@@ -0,0 +1,121 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort key of the last row on a page as an opaque URL-safe cursor.
+
+    Args:
+        values (list): The sort key values, e.g. [price, id].
+
+    Returns:
+        str: The encoded cursor.
+    """
+    raw = json.dumps([str(value) for value in values]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor created by encode_cursor.
+
+    Args:
+        cursor (str): The encoded cursor.
+
+    Returns:
+        list: The sort key values, or None if the cursor is invalid.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    return values
+
+
+def _cursor_values(model, ordering, cursor):
+    """
+    Decodes a cursor into sort key values converted to the types of their
+    fields, e.g. Decimal for current_price and int for id.
+
+    Args:
+        model: The model of the paginated queryset.
+        ordering (tuple): Field names to order by, "-" prefix for descending.
+        cursor (str): The encoded cursor.
+
+    Returns:
+        list: The sort key values, or None if the cursor was tampered with
+        or was made for another ordering.
+    """
+    values = decode_cursor(cursor)
+    if values is None or len(values) != len(ordering):
+        return None
+    converted = []
+    for field, value in zip(ordering, values):
+        # encode_cursor ONLY WRITES STRINGS
+        if not isinstance(value, str):
+            return None
+        try:
+            # RUNS THE FIELD VALIDATORS TOO, SO OUT OF RANGE NUMBERS ARE REJECTED
+            value = model._meta.get_field(field.lstrip("-")).clean(value, None)
+        except ValidationError:
+            return None
+        if value is None:
+            return None
+        converted.append(value)
+    return converted
+
+
+def _seek_filter(ordering, values):
+    """
+    Builds the WHERE clause that selects the rows after a sort key,
+    e.g. (price > p) OR (price = p AND id > i) for ordering ["price", "id"].
+    """
+    seek = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        seek |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return seek
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=12):
+    """
+    Returns one page of a queryset using keyset (seek) pagination.
+
+    Each page is a single bounded query that seeks past the last row of the
+    previous page, so its cost does not grow with how deep the visitor has
+    scrolled. The last field of ordering must be unique (e.g. "id").
+
+    Args:
+        queryset (QuerySet): The filtered queryset to paginate.
+        ordering (tuple): Field names to order by, "-" prefix for descending.
+        cursor (str): The cursor of the previous page, None for the first page.
+            Invalid cursors also give the first page.
+        page_size (int): The number of rows per page.
+
+    Returns:
+        tuple: The rows on the page and the cursor of the next page,
+        None if this is the last page.
+    """
+    queryset = queryset.order_by(*ordering)
+    # AN INVALID CURSOR IS IGNORED, SO THE FIRST PAGE IS RETURNED
+    values = _cursor_values(queryset.model, ordering, cursor) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(_seek_filter(ordering, values))
+    rows = list(queryset[: page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            [getattr(last, field.lstrip("-")) for field in ordering]
+        )
+    return rows, next_cursor
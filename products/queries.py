@@ -0,0 +1,31 @@
+from django.db.models import Prefetch
+from products.models import ProductImage
+
+
+def with_primary_image(queryset, path=""):
+    """
+    Loads products with their category and only their first image, for
+    pages listing products or rows that point to products (favourites,
+    cart and order lines).
+
+    The category is joined into the same query and the first images of all
+    products are fetched with one more query, so Product.primary_image,
+    get_price and the category never query per row.
+
+    Args:
+        queryset (QuerySet): Product queryset, or a queryset of a model that
+            reaches products through path.
+        path (str): The lookup from the queryset's model to the product,
+            e.g. "item__product" for cart items. Empty for products.
+
+    Returns:
+        QuerySet: The queryset with the related rows selected and prefetched.
+    """
+    prefix = f"{path}__" if path else ""
+    return queryset.select_related(f"{prefix}category").prefetch_related(
+        Prefetch(
+            f"{prefix}productimage_set",
+            queryset=ProductImage.objects.order_by("id")[:1],
+            to_attr="first_images",
+        )
+    )
@@ -0,0 +1,64 @@
+import random
+from django.conf import settings
+from django.core.cache import cache
+from products.models import Product
+from products.queries import with_primary_image
+
+# NAMED POOLS OF PRODUCT IDS THE HOME PAGE RAILS SAMPLE FROM
+POOLS = {
+    "featured": lambda: Product.objects.filter(is_featured=True),
+    "sale": lambda: Product.objects.filter(sale_price__gt=0),
+}
+
+
+def pool_cache_key(name):
+    return f"products:pool:{name}"
+
+
+def get_id_pool(name):
+    """
+    Returns the IDs of the products in a named pool.
+
+    Only IDs are loaded, once per HOME_RAIL_POOL_TIMEOUT, and are shared by
+    all requests through the cache.
+
+    Args:
+        name (str): The pool name, a key of POOLS.
+
+    Returns:
+        list: The product IDs in the pool.
+    """
+    key = pool_cache_key(name)
+    pool = cache.get(key)
+    if pool is None:
+        pool = list(POOLS[name]().values_list("id", flat=True))
+        cache.set(key, pool, settings.HOME_RAIL_POOL_TIMEOUT)
+    return pool
+
+
+def sample_products(name, k=6):
+    """
+    Picks up to k random products from a named pool without loading the
+    whole pool: the IDs are sampled first and only those rows are fetched.
+
+    Args:
+        name (str): The pool name, a key of POOLS.
+        k (int): The maximum number of products to return.
+
+    Returns:
+        list: The sampled products in random order.
+    """
+    pool = get_id_pool(name)
+    ids = random.sample(pool, min(k, len(pool)))
+    products = with_primary_image(Product.objects.all()).in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def invalidate_pools():
+    """
+    Drops the cached ID pools so they are rebuilt on next use.
+
+    Returns:
+        None
+    """
+    cache.delete_many([pool_cache_key(name) for name in POOLS])
@@ -0,0 +1,411 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from products.models import Product
+from products.queries import with_primary_image
+
+SEARCH_INDEX_VERSION_KEY = "products:search-index-version"
+# THE PRODUCT IDS CHANGED BY EACH VERSION, SO WORKERS UPDATE ONLY THOSE
+SEARCH_INDEX_CHANGES_KEY = "products:search-index-changes:{}"
+SEARCH_INDEX_CHANGES_TIMEOUT = 60 * 60
+# A WORKER FURTHER BEHIND THAN THIS REBUILDS ITS INDEX INSTEAD
+MAX_PENDING_CHANGES = 500
+
+# FIELD WEIGHTS, SHARED BY THE POSTGRES VECTOR AND THE IN-PROCESS INDEX
+FIELD_WEIGHTS = {"name": "A", "sku": "A", "category": "B", "description": "C"}
+WEIGHT_SCORES = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The tokens in the text.
+    """
+    return re.findall(r"\w+", (text or "").lower())
+
+
+def uses_postgres():
+    return connection.vendor == "postgresql"
+
+
+def search_products(query, limit=20):
+    """
+    Searches products by name, description, SKU and category name.
+
+    On Postgres this uses the weighted search_vector column (GIN index) with
+    prefix matching, plus pg_trgm word similarity on the name for typos.
+    Other databases, e.g. SQLite in test runs, use an in-process inverted index.
+
+    Args:
+        query (str): The search text.
+        limit (int): The maximum number of products to return.
+
+    Returns:
+        list: Matching products, best match first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if uses_postgres():
+        return _search_postgres(query, tokens, limit)
+    with _index_lock:
+        ranked_ids = get_search_index().search(tokens, limit)
+    products = with_primary_image(Product.objects.all()).in_bulk(ranked_ids)
+    return [products[product_id] for product_id in ranked_ids if product_id in products]
+
+
+def _search_postgres(query, tokens, limit):
+    # TOKENS ARE \w+ ONLY, SO THEY ARE SAFE TO USE IN A RAW TSQUERY
+    prefix_query = SearchQuery(
+        " & ".join(f"{token}:*" for token in tokens),
+        search_type="raw",
+        config="english",
+    )
+    return list(
+        with_primary_image(Product.objects.all())
+        .annotate(
+            score=Greatest(
+                SearchRank(F("search_vector"), prefix_query),
+                TrigramWordSimilarity(query, "name"),
+            )
+        )
+        .filter(Q(search_vector=prefix_query) | Q(name__trigram_word_similar=query))
+        .order_by("-score", "id")[:limit]
+    )
+
+
+def build_search_vector(category_name):
+    """
+    Returns the weighted search vector expression for a product.
+
+    The category name is passed in as a value because UPDATE statements
+    cannot reference joined fields.
+
+    Args:
+        category_name (str): The name of the product's category.
+
+    Returns:
+        SearchVector: The expression to store in Product.search_vector.
+    """
+    return (
+        SearchVector("name", weight=FIELD_WEIGHTS["name"], config="english")
+        + SearchVector("sku", weight=FIELD_WEIGHTS["sku"], config="english")
+        + SearchVector(
+            Value(category_name or ""),
+            weight=FIELD_WEIGHTS["category"],
+            config="english",
+        )
+        + SearchVector(
+            "description", weight=FIELD_WEIGHTS["description"], config="english"
+        )
+    )
+
+
+def update_search_vectors(products):
+    """
+    Refreshes the stored search vector of products. No-op outside Postgres.
+
+    Args:
+        products (QuerySet): The products to refresh.
+
+    Returns:
+        None
+    """
+    if not uses_postgres():
+        return
+    rows = products.values_list("id", "category__name")
+    by_category = defaultdict(list)
+    for product_id, category_name in rows:
+        by_category[category_name].append(product_id)
+    for category_name, product_ids in by_category.items():
+        Product.objects.filter(id__in=product_ids).update(
+            search_vector=build_search_vector(category_name)
+        )
+
+
+def edit_distance(a, b, limit):
+    """
+    Returns the edit distance between two words, counting an adjacent
+    transposition as one edit. Stops early once the distance exceeds limit.
+
+    Args:
+        a (str): The first word.
+        b (str): The second word.
+        limit (int): The largest distance of interest.
+
+    Returns:
+        int: The distance, or limit + 1 if it is larger than limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    row = list(range(len(b) + 1))
+    previous_row = before_previous_row = row
+    for i in range(1, len(a) + 1):
+        previous_row, row = row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(
+                row[j - 1] + 1, previous_row[j] + 1, previous_row[j - 1] + cost
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        before_previous_row = previous_row
+    return row[-1]
+
+
+class ProductSearchIndex:
+    """
+    In-process inverted index used when the database has no full-text search.
+
+    Maps each token to the products containing it with a field-weighted
+    score, keeps a sorted vocabulary for prefix (typeahead) matches and a
+    trigram index over the vocabulary for typo tolerance. Changed products
+    are reindexed in place with update.
+
+    Attributes:
+        postings (dict): token -> {product_id: score}
+        documents (dict): product_id -> {token: score}, to remove a product.
+        vocabulary (list): Sorted list of all tokens.
+        trigrams (dict): trigram -> set of tokens containing it.
+    """
+
+    MAX_EXPANSIONS = 10
+    MAX_CANDIDATES = 50
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        for row in rows:
+            self._add_document(row)
+        self.vocabulary = sorted(self.postings)
+        self.trigrams = defaultdict(set)
+        for token in self.vocabulary:
+            for trigram in self._trigrams(token):
+                self.trigrams[trigram].add(token)
+
+    @staticmethod
+    def rows(products):
+        return products.values_list(
+            "id", "name", "sku", "category__name", "description"
+        ).iterator()
+
+    @classmethod
+    def from_database(cls):
+        return cls(cls.rows(Product.objects.all()))
+
+    def _add_document(self, row):
+        product_id, name, sku, category_name, description = row
+        fields = {
+            "name": name,
+            "sku": sku,
+            "category": category_name,
+            "description": description,
+        }
+        scores = defaultdict(float)
+        for field, text in fields.items():
+            for token in tokenize(text):
+                scores[token] += WEIGHT_SCORES[FIELD_WEIGHTS[field]]
+        new_tokens = [token for token in scores if token not in self.postings]
+        self.documents[product_id] = scores
+        for token, score in scores.items():
+            self.postings[token][product_id] = score
+        return new_tokens
+
+    def update(self, product_ids, rows):
+        """
+        Reindexes changed products without rebuilding the index.
+
+        Args:
+            product_ids (iterable): The IDs of the changed products.
+            rows (iterable): The current rows of those products, as read by
+                rows. Products without a row were deleted and are removed.
+
+        Returns:
+            None
+        """
+        for product_id in product_ids:
+            for token in self.documents.pop(product_id, ()):
+                postings = self.postings[token]
+                del postings[product_id]
+                if not postings:
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    for trigram in self._trigrams(token):
+                        self.trigrams[trigram].discard(token)
+        for row in rows:
+            for token in self._add_document(row):
+                bisect.insort(self.vocabulary, token)
+                for trigram in self._trigrams(token):
+                    self.trigrams[trigram].add(token)
+
+    @staticmethod
+    def _trigrams(token):
+        padded = f"  {token} "
+        return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+    def _prefix_matches(self, token):
+        start = bisect.bisect_left(self.vocabulary, token)
+        matches = []
+        for word in self.vocabulary[start : start + self.MAX_EXPANSIONS]:
+            if not word.startswith(token):
+                break
+            matches.append(word)
+        return matches
+
+    def _similar_tokens(self, token):
+        # CANDIDATES SHARE THE MOST TRIGRAMS, THEN EDIT DISTANCE DECIDES
+        shared = defaultdict(int)
+        for trigram in self._trigrams(token):
+            for word in self.trigrams.get(trigram, ()):
+                shared[word] += 1
+        candidates = sorted(shared, key=lambda word: (-shared[word], word))
+        max_distance = 1 if len(token) <= 5 else 2
+        similar = []
+        for word in candidates[: self.MAX_CANDIDATES]:
+            distance = edit_distance(token, word, max_distance)
+            if distance <= max_distance:
+                similar.append((1.0 - distance / (len(token) + 1), word))
+        similar.sort(key=lambda match: (-match[0], match[1]))
+        return similar[: self.MAX_EXPANSIONS]
+
+    def expand(self, token):
+        """
+        Returns the indexed tokens a query token should match, with a weight:
+        exact and prefix matches score fully, typo matches by similarity.
+
+        Args:
+            token (str): A query token.
+
+        Returns:
+            list: (weight, indexed token) pairs.
+        """
+        matches = [(1.0, word) for word in self._prefix_matches(token)]
+        if not matches:
+            matches = self._similar_tokens(token)
+        return matches
+
+    def search(self, tokens, limit=20):
+        """
+        Ranks products against the query tokens. Every token must match.
+
+        Args:
+            tokens (list): Tokens of the search query.
+            limit (int): The maximum number of product ids to return.
+
+        Returns:
+            list: Product ids, best match first.
+        """
+        scores = None
+        for token in tokens:
+            token_scores = defaultdict(float)
+            for weight, word in self.expand(token):
+                for product_id, score in self.postings.get(word, {}).items():
+                    token_scores[product_id] = max(
+                        token_scores[product_id], weight * score
+                    )
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    product_id: score + token_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in token_scores
+                }
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, score in ranked[:limit]]
+
+
+_index_lock = threading.RLock()
+_index = None
+_index_version = None
+
+
+def get_search_index():
+    """
+    Returns the process-wide search index, brought up to date with the
+    products changed since it was loaded.
+
+    Changed products are reindexed from one query. The index is only
+    rebuilt when it is first used, when the changes are too many or no
+    longer all in the cache, or when a change did not list its products.
+
+    Returns:
+        ProductSearchIndex: The current index.
+    """
+    global _index, _index_version
+    version = cache.get(SEARCH_INDEX_VERSION_KEY, 0)
+    with _index_lock:
+        if _index is not None and _index_version == version:
+            return _index
+        changed = None
+        if _index is not None and 0 < version - _index_version <= MAX_PENDING_CHANGES:
+            keys = [
+                SEARCH_INDEX_CHANGES_KEY.format(change)
+                for change in range(_index_version + 1, version + 1)
+            ]
+            changes = cache.get_many(keys)
+            if len(changes) == len(keys):
+                changed = set().union(*changes.values())
+        if changed is None:
+            _index = ProductSearchIndex.from_database()
+        else:
+            _index.update(
+                changed,
+                ProductSearchIndex.rows(Product.objects.filter(id__in=changed)),
+            )
+        _index_version = version
+    return _index
+
+
+def invalidate_search_index(product_ids=None):
+    """
+    Tells the in-process search index of every worker which products
+    changed, once the current transaction commits so workers never index
+    uncommitted rows. No-op on Postgres, which searches the database.
+
+    Args:
+        product_ids (iterable): The IDs of the saved or deleted products,
+            None when any product may have changed, e.g. after a bulk load.
+
+    Returns:
+        None
+    """
+    if uses_postgres():
+        return
+    if product_ids is not None:
+        product_ids = list(product_ids)
+    transaction.on_commit(lambda: _publish_search_index_change(product_ids))
+
+
+def _publish_search_index_change(product_ids):
+    try:
+        version = cache.incr(SEARCH_INDEX_VERSION_KEY)
+    except ValueError:
+        version = 1
+        cache.set(SEARCH_INDEX_VERSION_KEY, version, timeout=None)
+    if product_ids is not None:
+        cache.set(
+            SEARCH_INDEX_CHANGES_KEY.format(version),
+            product_ids,
+            SEARCH_INDEX_CHANGES_TIMEOUT,
+        )
@@ -0,0 +1,242 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from products.images import refresh_renditions
+from products.models import (
+    Product,
+    ProductCategory,
+    ProductImage,
+    ProductVariant,
+    deleted_with_product,
+)
+from products.sampling import invalidate_pools
+from products.search import (
+    invalidate_search_index,
+    update_search_vectors,
+    uses_postgres,
+)
+
+
+@receiver(pre_save, sender=Product)
+def set_current_price(sender, instance, **kwargs):
+    """
+    Signal receiver function that keeps current_price in sync with
+    price and sale_price. Also runs for fixtures loaded with loaddata.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model being saved.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    instance.current_price = instance.get_price()
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search(sender, instance, **kwargs):
+    """
+    Signal receiver function that refreshes the search vector of a saved
+    product and reindexes it in the in-process search index.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model that was saved.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+    invalidate_search_index([instance.pk])
+
+
+@receiver(post_save, sender=ProductCategory)
+def refresh_category_search(sender, instance, **kwargs):
+    """
+    Signal receiver function that refreshes the search vectors of the
+    products in a saved category, as they include the category name.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the ProductCategory model that was saved.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    products = Product.objects.filter(category=instance)
+    update_search_vectors(products)
+    if not uses_postgres():
+        invalidate_search_index(products.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    """
+    Signal receiver function that removes a deleted product from the
+    in-process search index.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model that was deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    invalidate_search_index([instance.pk])
+
+
+def bump_card_version(product_id):
+    """
+    Invalidates the cached card of a product by moving it to a new version key.
+
+    Args:
+        product_id (int): The ID of the product.
+
+    Returns:
+        None
+    """
+    Product.objects.filter(pk=product_id).update(card_version=F("card_version") + 1)
+
+
+@receiver(pre_save, sender=Product)
+def invalidate_product_card(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Signal receiver function that invalidates the cached card of a saved
+    product, by incrementing card_version in the UPDATE of the save itself.
+
+    The increment is done by the database, like bump_card_version, so a
+    stale instance never writes back a version whose card is already cached.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model being saved.
+        raw: Whether the instance is being loaded from a fixture.
+        update_fields: The fields saved, None for all of them.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and "card_version" not in update_fields:
+        return
+    instance.card_version = F("card_version") + 1
+
+
+@receiver(post_save, sender=Product)
+def invalidate_partially_saved_product_card(
+    sender, instance, created=False, raw=False, update_fields=None, **kwargs
+):
+    """
+    Signal receiver function that invalidates the cached card of a product
+    saved with update_fields that leave out card_version, which the
+    pre_save bump then does not reach.
+
+    Afterwards card_version is dropped from the instance, as its value is
+    only known to the database, and loaded again when it is next read.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model that was saved.
+        created: Whether the product was inserted.
+        raw: Whether the instance is being loaded from a fixture.
+        update_fields: The fields saved, None for all of them.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if raw or created:
+        return
+    if update_fields is not None and "card_version" not in update_fields:
+        bump_card_version(instance.pk)
+    instance.__dict__.pop("card_version", None)
+
+
+@receiver(post_save, sender=ProductImage)
+def generate_image_renditions(sender, instance, raw=False, **kwargs):
+    """
+    Signal receiver function that generates the resized renditions of a
+    newly uploaded image. Runs before the product card is invalidated, so
+    the next render of the card can use them.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the ProductImage model being saved.
+        raw: Whether the instance is being loaded from a fixture.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if raw:
+        return
+    refresh_renditions(instance)
+
+
+@receiver(post_delete, sender=ProductImage)
+def delete_image_renditions(sender, instance, **kwargs):
+    """
+    Signal receiver function that deletes the rendition files of a deleted
+    image. The original file is left in place, as before.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the ProductImage model being deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    for names in instance.renditions.get("files", {}).values():
+        for name in names.values():
+            instance.image.storage.delete(name)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def invalidate_related_product_card(sender, instance, raw=False, **kwargs):
+    """
+    Signal receiver function that invalidates the cached card of the product
+    an image or variant belongs to.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The ProductImage or ProductVariant instance.
+        raw: Whether the instance is being loaded from a fixture.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if raw or instance.product_id is None:
+        return
+    # THE PRODUCT IS GOING TOO, NO NEED TO BUMP IT FOR EVERY VARIANT
+    if deleted_with_product(kwargs.get("origin")):
+        return
+    bump_card_version(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pools(sender, instance, **kwargs):
+    """
+    Signal receiver function that drops the home page ID pools when a
+    product is saved or deleted, as it may have joined or left a pool.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The instance of the Product model.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    invalidate_pools()
@@ -0,0 +1,125 @@
+import csv
+import json
+from itertools import islice
+from django.db import transaction
+from products.models import ProductVariant
+
+FIELDS = ["sku", "size", "quantity"]
+
+
+class StockRowError(ValueError):
+    """
+    Raised for a row of a stock file that cannot be applied.
+
+    Attributes:
+        line (int): The line of the file the row was read from.
+    """
+
+    def __init__(self, line, message):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def _records(file, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            yield line, text.strip()
+
+
+def read_rows(file, fmt):
+    """
+    Streams (line, sku, size, quantity) rows from a CSV or JSONL stock file.
+
+    Rows are parsed one at a time, so memory use does not depend on the
+    size of the file. Rows that cannot be parsed are yielded as
+    StockRowError instances so the caller can report them and carry on.
+
+    Args:
+        file (file): The open text file.
+        fmt (str): "csv" (with a sku,size,quantity header) or "jsonl".
+
+    Returns:
+        generator: (line, sku, size, quantity) tuples or StockRowError.
+    """
+    for line, record in _records(file, fmt):
+        try:
+            sku = str(record["sku"]).strip()
+            size = str(record["size"]).strip()
+            quantity = int(record["quantity"])
+            if quantity < 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            yield StockRowError(line, f"invalid row {record!r}")
+            continue
+        yield line, sku, size, quantity
+
+
+def apply_stock_chunk(rows):
+    """
+    Sets the stock of a chunk of variants in one transaction.
+
+    The variants of the chunk are read with one query and only those
+    whose quantity changes are written, with one bulk UPDATE.
+
+    Args:
+        rows (list): (line, sku, size, quantity) tuples.
+
+    Returns:
+        tuple: The number of updated variants and the rows that matched
+        no variant.
+    """
+    with transaction.atomic():
+        variants = {
+            (sku, size): (variant_id, quantity)
+            for variant_id, sku, size, quantity in ProductVariant.objects.filter(
+                product__sku__in={row[1] for row in rows}
+            ).values_list("id", "product__sku", "size", "quantity")
+        }
+        latest = {}
+        unknown = []
+        for row in rows:
+            line, sku, size, quantity = row
+            if (sku, size) not in variants:
+                unknown.append(row)
+                continue
+            # THE LAST ROW FOR A VARIANT WINS
+            latest[(sku, size)] = quantity
+        changed = [
+            ProductVariant(id=variants[key][0], quantity=quantity)
+            for key, quantity in latest.items()
+            if variants[key][1] != quantity
+        ]
+        ProductVariant.objects.bulk_update(changed, ["quantity"])
+    return len(changed), unknown
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_rows(chunk_size=2000):
+    """
+    Streams the stock of every variant, ordered by SKU and size.
+
+    Args:
+        chunk_size (int): The number of rows fetched from the database at a time.
+
+    Returns:
+        iterator: (sku, size, quantity) tuples.
+    """
+    return (
+        ProductVariant.objects.order_by("product__sku", "size")
+        .values_list("product__sku", "size", "quantity")
+        .iterator(chunk_size=chunk_size)
+    )
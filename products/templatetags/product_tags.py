@@ -0,0 +1,125 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from products.images import RENDITIONS, srcset, supported_formats
+
+register = template.Library()
+
+
+def product_card_cache_key(product):
+    """
+    Returns the cache key of a rendered product card.
+
+    The key includes Product.card_version, which signals bump whenever the
+    product, its images or its variants change, so stale cards are never read.
+
+    Args:
+        product (Product): The product of the card.
+
+    Returns:
+        str: The cache key.
+    """
+    return f"product-card:{product.pk}:{product.card_version}"
+
+
+@register.simple_tag
+def product_card(product):
+    """
+    Renders partials/product-card.html for a product, served from the cache
+    when the product has not changed since it was last rendered.
+
+    Args:
+        product (Product): The product to render.
+
+    Returns:
+        str: The rendered card HTML.
+    """
+    key = product_card_cache_key(product)
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(
+            "partials/product-card.html",
+            {
+                "product": product,
+                "product_id": product.id,
+                "image": product.primary_image,
+            },
+        )
+        cache.set(key, html, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+    return mark_safe(html)
+
+
+@register.inclusion_tag("products/partials/_favourite_badge.html", takes_context=True)
+def favourite_badge(context, product):
+    """
+    Renders the favourite heart of a product card. Kept out of the cached
+    card HTML, which is shared by all users, and read from the favourite_ids
+    set of the request, so a page of cards makes no extra queries.
+
+    Args:
+        context (Context): The template context.
+        product (Product): The product of the card.
+
+    Returns:
+        dict: The context of the badge template.
+    """
+    request = context.get("request")
+    return {
+        "request": request,
+        "product": product,
+        "is_favourite": product.id in context.get("favourite_ids", ()),
+    }
+
+
+@register.simple_tag
+def responsive_image(image, rendition, sizes, alt="", css_class="", lazy=True):
+    """
+    Renders a <picture> of a product image that lets the browser pick the
+    smallest AVIF/WebP rendition for the layout, falling back to the
+    original upload.
+
+    Args:
+        image (ProductImage): The image to render, may be None.
+        rendition (str): A key of products.images.RENDITIONS, e.g. "card".
+        sizes (str): The sizes attribute, the rendered width of the image.
+        alt (str): The alternative text.
+        css_class (str): Classes of the <img> element.
+        lazy (bool): Defer loading until the image nears the viewport. Pass
+            False for the main image of a page.
+
+    Returns:
+        str: The <picture> HTML, empty if there is no image.
+    """
+    if image is None or not image.image:
+        return ""
+    if rendition not in RENDITIONS:
+        raise template.TemplateSyntaxError(f"Unknown image rendition {rendition!r}")
+    sources = mark_safe("")
+    for fmt in supported_formats():
+        fmt_srcset = srcset(image, rendition, fmt)
+        if fmt_srcset:
+            sources += format_html(
+                '<source type="image/{}" srcset="{}" sizes="{}">',
+                fmt,
+                fmt_srcset,
+                sizes,
+            )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" loading="{}" '
+        'decoding="async"{}></picture>',
+        sources,
+        image.image.url,
+        alt,
+        css_class,
+        "lazy" if lazy else "eager",
+        format_html(
+            ' width="{}" height="{}"',
+            image.renditions["width"],
+            image.renditions["height"],
+        )
+        if image.renditions.get("width")
+        else "",
+    )
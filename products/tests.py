@@ -0,0 +1,562 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from cart.models import Cart, CartItem
+from core.testing import TestCase, create_product
+from products.models import Product, ProductCategory, ProductImage, ProductVariant
+from products import images, search
+from products.pagination import paginate_keyset
+from products.search import ProductSearchIndex, edit_distance, search_products
+from products.templatetags.product_tags import responsive_image
+from users.models import User, UserFavourite
+
+
+class CardVersionTests(TestCase):
+    def setUp(self):
+        sizes = [size for size, _ in ProductVariant.SIZES[:6]]
+        self.product = create_product("200001", sizes=sizes)
+        self.version = Product.objects.get(pk=self.product.pk).card_version
+
+    def stored_version(self):
+        return Product.objects.get(pk=self.product.pk).card_version
+
+    def test_saving_a_product_writes_the_next_version(self):
+        self.product.name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            self.product.save()
+        card_version_queries = [
+            query
+            for query in queries.captured_queries
+            if "card_version" in query["sql"]
+        ]
+        # ONLY THE UPDATE OF THE SAVE ITSELF, NO SECOND UPDATE AND REFRESH
+        self.assertEqual(len(card_version_queries), 1)
+        self.assertEqual(self.product.card_version, self.version + 1)
+        self.assertEqual(self.stored_version(), self.version + 1)
+        self.product.save()
+        self.assertEqual(self.stored_version(), self.version + 2)
+
+    def test_saving_with_update_fields_still_bumps(self):
+        self.product.name = "Renamed"
+        self.product.save(update_fields=["name"])
+        self.assertEqual(self.stored_version(), self.version + 1)
+
+    def test_saving_a_stale_product_does_not_write_back_an_old_version(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        variant = self.product.variants.first()
+        variant.quantity = 0
+        variant.save()
+        stale.save()
+        self.assertEqual(self.stored_version(), self.version + 2)
+        self.assertEqual(stale.card_version, self.version + 2)
+
+    def test_changing_a_variant_bumps_its_product(self):
+        variant = self.product.variants.first()
+        variant.quantity = 0
+        variant.save()
+        self.assertEqual(self.stored_version(), self.version + 1)
+
+    def test_deleting_a_product_does_not_bump_it_per_variant(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.product.delete()
+        self.assertFalse(
+            [q for q in queries.captured_queries if "card_version" in q["sql"]]
+        )
+        self.assertFalse(ProductVariant.objects.filter(product=self.product.pk))
+
+
+class KeysetPaginationTests(TestCase):
+    # THE SAME FIRST PAGE IS LOADED FOR EVERY INVALID CURSOR
+    strict_queries = False
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name=f"Product {n}",
+                    sku=f"{300000 + n}",
+                    description="Description",
+                    price=Decimal(n),
+                    current_price=Decimal(n),
+                )
+                for n in range(1, 6)
+            ]
+        )
+
+    def paginate(self, cursor=None):
+        rows, next_cursor = paginate_keyset(
+            Product.objects.all(), ("current_price", "id"), cursor, page_size=2
+        )
+        return [product.current_price for product in rows], next_cursor
+
+    def test_pages_follow_each_other(self):
+        first, cursor = self.paginate()
+        second, cursor = self.paginate(cursor)
+        self.assertEqual(first + second, [1, 2, 3, 4])
+
+    def test_invalid_cursors_give_the_first_page(self):
+        first, _ = self.paginate()
+        for values in (
+            ["abc", "1"],
+            ["1"],
+            ["1", "2", "3"],
+            [1, 2],
+            ["1", None],
+            ["1e400", "1"],
+            {"price": "1"},
+        ):
+            with self.subTest(values=values):
+                cursor = base64.urlsafe_b64encode(json.dumps(values).encode())
+                self.assertEqual(self.paginate(cursor.decode())[0], first)
+        for cursor in ("not base64!", "bm90IGpzb24", "%%%"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.paginate(cursor)[0], first)
+
+    def test_listing_ignores_an_invalid_cursor(self):
+        response = self.client.get("/products/", {"cursor": "WyJ4Il0"})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductDetailQueryTests(TestCase):
+    """
+    The detail page loads the product, its images and its variants with
+    their available stock in three queries, whatever their number.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        sizes = [size for size, _ in ProductVariant.SIZES[:8]]
+        cls.product = create_product("400001", sizes=sizes)
+        cls.other = create_product("400002")
+        cls.user = User.objects.create_user("shopper@example.com", "Shop", "Per")
+        UserFavourite.objects.bulk_create(
+            [
+                UserFavourite(user=cls.user, product=cls.product),
+                UserFavourite(user=cls.user, product=cls.other),
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self):
+        return self.client.get(f"/products/{self.product.id}/")
+
+    def test_anonymous(self):
+        with self.assertNumQueries(3):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ADD FAVOURITE")
+
+    def test_logged_in_with_favourites(self):
+        self.client.force_login(self.user)
+        # PLUS THE USER, THE CART BADGE AND THE FAVOURITE IDS UNTIL THEY ARE CACHED
+        with self.assertNumQueries(6):
+            response = self.get()
+        self.assertContains(response, "REMOVE FAVOURITE")
+        with self.assertNumQueries(5):
+            self.get()
+
+    def test_missing_product(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/products/999999/")
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportStockTests(TestCase):
+    def setUp(self):
+        create_product("300001", sizes=("8", "9"))
+        create_product("300002", sizes=("8",))
+
+    def import_stock(self, text, **options):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False, encoding="utf-8"
+        ) as file:
+            file.write(text)
+        self.addCleanup(os.remove, file.name)
+        stderr = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "import_stock", file.name, stdout=StringIO(), stderr=stderr, **options
+            )
+        return queries, stderr.getvalue()
+
+    def stock(self, sku, size):
+        return ProductVariant.objects.get(product__sku=sku, size=size).quantity
+
+    def test_rows_are_applied_in_chunks(self):
+        queries, _ = self.import_stock(
+            "sku,size,quantity\n" "300001,8,1\n300001,9,2\n300002,8,3\n300002,8,10\n",
+            chunk_size=2,
+        )
+        self.assertEqual((self.stock("300001", "8"), self.stock("300001", "9")), (1, 2))
+        # THE LAST ROW WINS OVER THE EARLIER ROW FOR THE SAME VARIANT
+        self.assertEqual(self.stock("300002", "8"), 10)
+        reads = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and "products_productvariant" in query["sql"]
+        ]
+        # ONE READ PER CHUNK OF TWO ROWS
+        self.assertEqual(len(reads), 2)
+
+    def test_unknown_variants_and_invalid_rows_are_reported(self):
+        _, stderr = self.import_stock(
+            "sku,size,quantity\n" "999999,8,1\n300001,12,1\n300001,8,-1\n300001,9,4\n"
+        )
+        self.assertIn("line 2: no variant with SKU 999999 and size 8", stderr)
+        self.assertIn("line 3: no variant with SKU 300001 and size 12", stderr)
+        self.assertIn("line 4: invalid row", stderr)
+        # THE VALID ROWS ARE STILL APPLIED
+        self.assertEqual(self.stock("300001", "9"), 4)
+        self.assertEqual(self.stock("300001", "8"), 10)
+
+
+def image_bytes(width=1000, height=500, color="red"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def fake_avif_save(image, fp, filename):
+    fp.write(b"AVIF")
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class RenditionTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product("300003")
+        # RUN AS IF NO AVIF ENCODER WAS INSTALLED, WHATEVER IS INSTALLED HERE
+        Image.init()
+        formats = mock.patch.dict(Image.SAVE)
+        formats.start()
+        self.addCleanup(formats.stop)
+        Image.SAVE.pop("AVIF", None)
+
+    def upload(self, data, name="300003.png"):
+        image = ProductImage.objects.create(
+            product=self.product, image=SimpleUploadedFile(name, data)
+        )
+        return ProductImage.objects.get(pk=image.pk)
+
+    def rendition_sizes(self, image, fmt):
+        sizes = {}
+        for width, name in image.renditions["files"][fmt].items():
+            with image.image.storage.open(name) as file:
+                rendition = Image.open(file)
+                self.assertEqual(rendition.format, fmt.upper())
+                sizes[int(width)] = rendition.size
+        return sizes
+
+    def test_uploading_generates_webp_renditions(self):
+        image = self.upload(image_bytes())
+        self.assertEqual(list(image.renditions["files"]), ["webp"])
+        self.assertEqual(
+            self.rendition_sizes(image, "webp"),
+            {
+                160: (160, 80),
+                320: (320, 160),
+                480: (480, 240),
+                800: (800, 400),
+                960: (960, 480),
+                1000: (1000, 500),
+            },
+        )
+        self.assertEqual(image.content_hash, images.content_hash(image_bytes()))
+        self.assertIn("-480w.webp 480w", images.srcset(image, "card", "webp"))
+
+    def test_small_images_are_not_upscaled(self):
+        image = self.upload(image_bytes(300, 300))
+        self.assertEqual(
+            self.rendition_sizes(image, "webp"), {160: (160, 160), 300: (300, 300)}
+        )
+        self.assertTrue(
+            images.srcset(image, "detail", "webp").endswith("-300w.webp 300w")
+        )
+
+    def test_avif_is_skipped_without_an_encoder(self):
+        self.assertEqual(images.supported_formats(), ["webp"])
+        image = self.upload(image_bytes())
+        self.assertEqual(images.srcset(image, "card", "avif"), "")
+        picture = responsive_image(image, "card", "100vw")
+        self.assertIn('<source type="image/webp"', picture)
+        self.assertNotIn("image/avif", picture)
+
+    def test_avif_is_preferred_with_an_encoder(self):
+        Image.register_save("AVIF", fake_avif_save)
+        self.assertEqual(images.supported_formats(), ["avif", "webp"])
+        image = self.upload(image_bytes())
+        self.assertEqual(list(image.renditions["files"]), ["avif", "webp"])
+        self.assertEqual(
+            set(image.renditions["files"]["avif"]),
+            set(image.renditions["files"]["webp"]),
+        )
+        self.assertIn("-480w.avif 480w", images.srcset(image, "card", "avif"))
+        picture = responsive_image(image, "card", "100vw")
+        # BROWSERS USE THE FIRST SOURCE THEY SUPPORT
+        self.assertLess(picture.index("image/avif"), picture.index("image/webp"))
+
+    def test_replacing_the_file_regenerates_the_renditions(self):
+        image = self.upload(image_bytes())
+        old_files = list(image.renditions["files"]["webp"].values())
+        image.image = SimpleUploadedFile("300003-new.png", image_bytes(color="blue"))
+        image.save()
+        image = ProductImage.objects.get(pk=image.pk)
+        self.assertEqual(
+            image.content_hash, images.content_hash(image_bytes(color="blue"))
+        )
+        storage = image.image.storage
+        self.assertFalse(any(storage.exists(name) for name in old_files))
+        self.assertTrue(
+            all(
+                "300003-new" in name
+                for name in image.renditions["files"]["webp"].values()
+            )
+        )
+
+
+class ImportImagesTests(MediaRootMixin, TransactionTestCase):
+    """
+    Plain TransactionTestCase, the command uploads from worker threads
+    with their own database connections.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.product = create_product("300004")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, filename, data):
+        with open(os.path.join(self.directory, filename), "wb") as file:
+            file.write(data)
+
+    def import_images(self, *args):
+        stdout = StringIO()
+        with mock.patch("sys.stderr", StringIO()):
+            call_command("import_images", self.directory, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_files_already_stored_are_skipped(self):
+        stored = ProductImage.objects.create(
+            product=self.product,
+            image=SimpleUploadedFile("300004-stored.png", image_bytes(color="green")),
+        )
+        self.write("300004-side.png", image_bytes(color="green"))
+        self.write("300004-front.png", image_bytes(color="blue"))
+        self.write("300004-copy.png", image_bytes(color="blue"))
+        self.write("999999-other.png", image_bytes())
+        output = self.import_images("--workers", "1")
+        self.assertIn("Imported 1, skipped 2 already stored, 1 without", output)
+        imported = ProductImage.objects.exclude(pk=stored.pk).get()
+        self.assertEqual(imported.product, self.product)
+        self.assertEqual(
+            imported.content_hash, images.content_hash(image_bytes(color="blue"))
+        )
+        self.assertEqual(list(imported.renditions["files"]), images.supported_formats())
+        # A SECOND RUN FINDS EVERY FILE STORED
+        output = self.import_images()
+        self.assertIn("Imported 0, skipped 3 already stored", output)
+        self.assertEqual(ProductImage.objects.count(), 2)
+
+    def test_a_dry_run_stores_nothing(self):
+        self.write("300004-side.png", image_bytes())
+        output = self.import_images("--dry-run")
+        self.assertIn("Imported 1, skipped 0", output)
+        self.assertFalse(ProductImage.objects.exists())
+
+
+class PrimaryImagePageQueryTests(TestCase):
+    """
+    Pages listing favourites or cart lines load each product's category
+    and first image with a fixed number of queries, whatever the number
+    of rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = ProductCategory.objects.bulk_create(
+            [ProductCategory(name=f"Category {n}") for n in range(6)]
+        )
+        cls.products = [
+            create_product(f"600{n:03}", category=category)
+            for n, category in enumerate(categories)
+        ]
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=product, image=f"products/{product.sku}-{n}.jpg")
+                for product in cls.products
+                for n in range(2)
+            ]
+        )
+        cls.user = User.objects.create_user("shopper@example.com", "Shop", "Per")
+
+    def setUp(self):
+        cache.clear()
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def add_rows(self, products):
+        UserFavourite.objects.bulk_create(
+            [UserFavourite(user=self.user, product=product) for product in products]
+        )
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=self.cart, item=variant, quantity=1)
+                for variant in ProductVariant.objects.filter(product__in=products)
+            ]
+        )
+        self.cart.refresh_totals()
+        # BULK_CREATE SENDS NO SIGNALS, SO CACHED FAVOURITES AND CARTS ARE DROPPED
+        cache.clear()
+
+    def assertConstantQueries(self, url):
+        self.add_rows(self.products[:1])
+        with CaptureQueriesContext(connection) as one_row:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_rows(self.products[1:])
+        with CaptureQueriesContext(connection) as six_rows:
+            response = self.client.get(url)
+        self.assertEqual(len(six_rows), len(one_row))
+        for product in self.products:
+            self.assertContains(response, f"products/{product.sku}-0.jpg")
+            self.assertNotContains(response, f"products/{product.sku}-1.jpg")
+
+    def test_favourites(self):
+        self.assertConstantQueries("/account/favourites/")
+
+    def test_cart(self):
+        self.assertConstantQueries("/cart/")
+
+    def test_checkout(self):
+        self.assertConstantQueries("/checkout/")
+
+    def test_listing_loads_only_the_first_images(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products/", HTTP_HX_REQUEST="true")
+        image_queries = [
+            query
+            for query in queries.captured_queries
+            if 'FROM "products_productimage"' in query["sql"]
+        ]
+        self.assertEqual(len(image_queries), 1)
+        # THE PREFETCH IS SLICED PER PRODUCT, NOT EVERY IMAGE OF EVERY CARD
+        self.assertIn("ROW_NUMBER", image_queries[0]["sql"])
+        for product in self.products:
+            self.assertContains(response, f"products/{product.sku}-0.jpg")
+            self.assertNotContains(response, f"products/{product.sku}-1.jpg")
+
+
+class EditDistanceTests(unittest.TestCase):
+    def test_distances(self):
+        self.assertEqual(edit_distance("jordan", "jordan", 2), 0)
+        self.assertEqual(edit_distance("jordan", "jordon", 2), 1)
+        self.assertEqual(edit_distance("jordan", "jodran", 2), 1)
+        self.assertEqual(edit_distance("jordan", "jrdn", 2), 2)
+
+    def test_stops_past_the_limit(self):
+        self.assertEqual(edit_distance("jordan", "yeezy", 1), 2)
+        self.assertEqual(edit_distance("air", "airmaxplus", 2), 3)
+
+
+class ProductSearchIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = ProductSearchIndex(
+            [
+                (1, "Air Jordan 1", "100001", "Basketball", "A classic"),
+                (2, "Runner", "100002", "Running", "Jordan inspired runner"),
+                (3, "Air Max", "100003", "Running", "Cushioned"),
+            ]
+        )
+
+    def test_name_matches_outrank_description_matches(self):
+        self.assertEqual(self.index.search(["jordan"]), [1, 2])
+
+    def test_prefixes_match(self):
+        self.assertEqual(self.index.search(["jor"]), [1, 2])
+        self.assertEqual(self.index.search(["cushion"]), [3])
+
+    def test_typos_match(self):
+        self.assertEqual(self.index.search(["jordon"]), [1, 2])
+        self.assertEqual(self.index.search(["basketbal"]), [1])
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.index.search(["air", "running"]), [3])
+        self.assertEqual(self.index.search(["air", "yeezy"]), [])
+
+    def test_update_reindexes_changed_and_deleted_products(self):
+        self.index.update(
+            [1, 3], [(1, "Yeezy Boost", "100001", "Lifestyle", "Knit upper")]
+        )
+        self.assertEqual(self.index.search(["yeezy"]), [1])
+        self.assertEqual(self.index.search(["jordan"]), [2])
+        self.assertEqual(self.index.search(["air"]), [])
+        rebuilt = ProductSearchIndex(
+            [
+                (1, "Yeezy Boost", "100001", "Lifestyle", "Knit upper"),
+                (2, "Runner", "100002", "Running", "Jordan inspired runner"),
+            ]
+        )
+        self.assertEqual(self.index.vocabulary, rebuilt.vocabulary)
+        self.assertEqual(self.index.postings, rebuilt.postings)
+        self.assertEqual(
+            {
+                trigram: tokens
+                for trigram, tokens in self.index.trigrams.items()
+                if tokens
+            },
+            dict(rebuilt.trigrams),
+        )
+
+
+class SearchIndexRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product("900001", name="Air Jordan 1")
+        self.addCleanup(setattr, search, "_index", None)
+        search_products("jordan")
+
+    def search(self, query):
+        with mock.patch.object(
+            ProductSearchIndex, "from_database", wraps=ProductSearchIndex.from_database
+        ) as from_database:
+            results = search_products(query)
+        self.assertFalse(from_database.called, "the index was rebuilt")
+        return results
+
+    def test_a_saved_product_is_reindexed_without_a_rebuild(self):
+        self.product.name = "Yeezy Boost"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.search("yeezy"), [self.product])
+        self.assertEqual(self.search("jordan"), [])
+
+    def test_a_deleted_product_is_removed_without_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(self.search("jordan"), [])
@@ -1,15 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Product, ProductVariant
-from users.models import UserFavourite
-from .forms import ProductForm, ProductImageForm, ProductVariantForm
+from users.favourites import get_favourite_ids
+from .forms import ProductForm, ProductImageForm, ProductVariantForm, ProductFilterForm
+from .inventory import with_available
+from .pagination import paginate_keyset
+from .queries import with_primary_image
+from .search import search_products
 from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db.models import Prefetch
 
 
 def products_view(request):
     """
-    View function for displaying all products.
+    View function for displaying products, filtered and sorted by the query string.
+
+    Pages are fetched with keyset pagination. HTMX requests (filter changes
+    and infinite scroll) receive only the next page of product cards.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -17,13 +25,65 @@ def products_view(request):
     Returns:
         HttpResponse: The HTTP response object containing the rendered template.
     """
-    products = Product.objects.all().prefetch_related("productimage_set")
+    filter_form = ProductFilterForm(request.GET)
+    # THE CARDS ONLY SHOW THE FIRST IMAGE, SO ONLY THAT ONE IS LOADED
+    products = filter_form.filter_queryset(with_primary_image(Product.objects.all()))
+    products, next_cursor = paginate_keyset(
+        products, filter_form.get_ordering(), request.GET.get("cursor")
+    )
+    next_page_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_page_url = f"{request.path}?{params.urlencode()}"
+
     context = {
         "products": products,
+        "filter_form": filter_form,
+        "next_page_url": next_page_url,
+        "is_first_page": not request.GET.get("cursor"),
     }
+    if request.headers.get("HX-Request"):
+        return render(request, "products/partials/_product_page.html", context)
     return render(request, "products/products_view.html", context)
 
 
+def search_view(request):
+    """
+    View function for displaying products matching a search query.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The HTTP response object containing the rendered template.
+    """
+    query = request.GET.get("q", "").strip()
+    context = {
+        "query": query,
+        "products": search_products(query, limit=48),
+    }
+    return render(request, "products/search.html", context)
+
+
+def search_typeahead(request):
+    """
+    HTMX view function returning the top matches for the header search box.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The HTTP response object containing the rendered partial.
+    """
+    query = request.GET.get("q", "").strip()
+    context = {
+        "query": query,
+        "products": search_products(query, limit=8),
+    }
+    return render(request, "products/partials/_search_typeahead.html", context)
+
+
 def product_detail_view(request, product_id):
     """
     View function to display the details of a product.
@@ -34,19 +94,16 @@ def product_detail_view(request, product_id):
 
     Returns:
         HttpResponse: The HTTP response object containing the rendered template.
-    """
-    product = Product.objects.get(id=product_id)
-    if request.user.is_anonymous:
-        is_favourite = False
-    else:
-        user_favourites = UserFavourite.objects.filter(
-            user=request.user, product_id=product_id
-        )
 
-        if len(user_favourites) > 0:
-            is_favourite = True
-        else:
-            is_favourite = False
+    Raises:
+        Http404: If no product exists with the given ID.
+    """
+    products = Product.objects.select_related("category").prefetch_related(
+        "productimage_set",
+        Prefetch("variants", queryset=with_available(ProductVariant.objects.all())),
+    )
+    product = get_object_or_404(products, id=product_id)
+    is_favourite = product.id in get_favourite_ids(request)
 
     context = {
         "product": product,
@@ -42,6 +42,12 @@ async function createPaymentIntent() {
     },
   });
   const paymentIntent = await response.json();
+  // If stock could not be reserved, send the customer back to their bag
+  if (!response.ok) {
+    alert(paymentIntent.error);
+    window.location.href = "/cart/";
+    return;
+  }
   intentID = paymentIntent.intent.id;
   // Capture client secret from PaymentIntent to use in Stripe Elements
   clientSecret = paymentIntent.intent.client_secret;
@@ -44,8 +44,11 @@ function handleRequest(e) {
       cartCtaText.innerText = "👎";
       cartCtaText.classList.remove("hidden");
       cartCtaText.classList.remove("opacity-0");
+      // 409 means the requested quantity is not in stock
       errorMsg.innerText =
-        "Something went wrong. Please refresh the page and try again.";
+        e.detail.xhr.status === 409
+          ? e.detail.xhr.responseText
+          : "Something went wrong. Please refresh the page and try again.";
       errorMsg.classList.remove("invisible");
       errorMsgVisible = !errorMsgVisible;
     }
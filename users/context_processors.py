@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+from users.favourites import get_favourite_ids
+
+
+def favourite_ids(request):
+    """
+    This context processor adds the IDs of the user's favourite products,
+    so templates can show favourite hearts with {% if product.id in
+    favourite_ids %}. Lazy, so pages without hearts make no queries.
+    """
+    return {"favourite_ids": SimpleLazyObject(lambda: get_favourite_ids(request))}
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from users.models import UserFavourite
+
+
+def favourite_ids_cache_key(user_id):
+    return f"users:favourite-ids:{user_id}"
+
+
+def get_favourite_ids(request):
+    """
+    Returns the IDs of the products the user of a request has favourited,
+    so any number of product cards can show their favourite state without
+    a query each.
+
+    The set is loaded once per request, from the cache, or with a single
+    query of IDs only when the cache has no copy.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        frozenset: The favourited product IDs, empty for anonymous users.
+    """
+    if not hasattr(request, "_favourite_ids"):
+        request._favourite_ids = load_favourite_ids(request.user)
+    return request._favourite_ids
+
+
+def load_favourite_ids(user):
+    if not user.is_authenticated:
+        return frozenset()
+    key = favourite_ids_cache_key(user.pk)
+    favourite_ids = cache.get(key)
+    if favourite_ids is None:
+        favourite_ids = frozenset(
+            UserFavourite.objects.filter(user=user).values_list("product_id", flat=True)
+        )
+        cache.set(key, favourite_ids, settings.FAVOURITE_IDS_CACHE_TIMEOUT)
+    return favourite_ids
+
+
+def invalidate_favourite_ids(user_id, request=None):
+    """
+    Drops the cached favourite IDs of a user so they are reloaded on next use.
+
+    Args:
+        user_id (int): The ID of the user.
+        request (HttpRequest): The current request, whose copy is dropped too.
+
+    Returns:
+        None
+    """
+    cache.delete(favourite_ids_cache_key(user_id))
+    if request is not None and hasattr(request, "_favourite_ids"):
+        del request._favourite_ids
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.4 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_favourites(apps, schema_editor):
+    # KEEP THE OLDEST ROW OF EACH (USER, PRODUCT) PAIR SO THE CONSTRAINT CAN BE ADDED
+    UserFavourite = apps.get_model("users", "UserFavourite")
+    kept = (
+        UserFavourite.objects.values("user", "product")
+        .annotate(kept_id=Min("id"))
+        .values("kept_id")
+    )
+    UserFavourite.objects.exclude(id__in=kept).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_favourites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="userfavourite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "product"), name="unique_user_favourite"
+            ),
+        ),
+    ]
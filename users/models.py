@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -105,9 +105,72 @@ class UserFavourite(models.Model):
         "products.Product", on_delete=models.CASCADE, blank=True, null=True
     )
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=["user", "product"], name="unique_user_favourite")
+        ]
+
     def __str__(self):
         return f"{self.product.name}"
 
+    @classmethod
+    def toggle(cls, user, product_id):
+        """
+        Adds a product to the user's favourites, or removes it if it is
+        already there. On PostgreSQL this is a single statement, a DELETE
+        and an INSERT ... ON CONFLICT in one query. Relies on
+        unique_user_favourite.
+
+        Bypasses model signals, callers must invalidate the user's cached
+        favourite IDs (see users.favourites).
+
+        Args:
+            user (User): The user whose favourites change.
+            product_id (int): The ID of the product.
+
+        Returns:
+            bool: Whether the product is now a favourite, None if no product
+            exists with the given ID.
+        """
+        if connection.vendor != "postgresql":
+            return cls._toggle_orm(user, product_id)
+        table = connection.ops.quote_name(cls._meta.db_table)
+        products = connection.ops.quote_name(
+            cls._meta.get_field("product").related_model._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "WITH deleted AS ("
+                f"DELETE FROM {table} WHERE user_id = %s AND product_id = %s "
+                "RETURNING id"
+                "), inserted AS ("
+                f"INSERT INTO {table} (user_id, product_id) "
+                f"SELECT %s, id FROM {products} "
+                "WHERE id = %s AND NOT EXISTS (SELECT 1 FROM deleted) "
+                "ON CONFLICT (user_id, product_id) DO NOTHING "
+                "RETURNING id"
+                ") "
+                "SELECT EXISTS (SELECT 1 FROM deleted), "
+                "EXISTS (SELECT 1 FROM inserted)",
+                [user.pk, product_id, user.pk, product_id],
+            )
+            deleted, inserted = cursor.fetchone()
+        if deleted:
+            return False
+        return True if inserted else None
+
+    @classmethod
+    def _toggle_orm(cls, user, product_id):
+        # DATABASES WITHOUT DATA-MODIFYING CTES (E.G. SQLITE) TAKE UP TO THREE QUERIES
+        with transaction.atomic():
+            if cls.objects.filter(user=user, product_id=product_id).delete()[0]:
+                return False
+            products = cls._meta.get_field("product").related_model.objects
+            if not products.filter(id=product_id).exists():
+                return None
+            cls.objects.create(user=user, product_id=product_id)
+        return True
+
 
 class Address(models.Model):
     """
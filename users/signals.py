@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from users.favourites import invalidate_favourite_ids
+from users.models import UserFavourite
+
+
+@receiver(post_save, sender=UserFavourite)
+@receiver(post_delete, sender=UserFavourite)
+def invalidate_user_favourite_ids(sender, instance, **kwargs):
+    """
+    Signal receiver function that drops the cached favourite IDs of a user
+    when one of their favourites is saved or deleted outside
+    UserFavourite.toggle, e.g. in the admin or when a product is deleted.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The UserFavourite instance saved or deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if instance.user_id is not None:
+        invalidate_favourite_ids(instance.user_id)
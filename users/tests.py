@@ -0,0 +1,89 @@
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from core.testing import TestCase, create_products
+from users.favourites import load_favourite_ids
+from users.models import User, UserFavourite
+
+
+class ToggleFavouriteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("fan@example.com", "Fa", "N")
+        self.product = create_products(1)[0]
+
+    def test_toggling_twice_restores_the_original_state(self):
+        self.assertIs(UserFavourite.toggle(self.user, self.product.id), True)
+        self.assertIs(UserFavourite.toggle(self.user, self.product.id), False)
+        self.assertFalse(UserFavourite.objects.filter(user=self.user).exists())
+
+    def test_a_missing_product_is_not_favourited(self):
+        self.assertIsNone(UserFavourite.toggle(self.user, self.product.id + 1))
+        self.assertFalse(UserFavourite.objects.filter(user=self.user).exists())
+
+    def test_a_product_is_favourited_once(self):
+        UserFavourite.objects.create(user=self.user, product=self.product)
+        with self.assertRaises(IntegrityError):
+            UserFavourite.objects.create(user=self.user, product=self.product)
+
+
+class FavouriteIdsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("fan@example.com", "Fa", "N")
+        self.products = create_products(2)
+
+    def test_ids_are_loaded_once_and_cached(self):
+        UserFavourite.objects.create(user=self.user, product=self.products[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(load_favourite_ids(self.user), {self.products[0].id})
+        with self.assertNumQueries(0):
+            load_favourite_ids(self.user)
+
+    def test_saving_and_deleting_a_favourite_invalidates_the_ids(self):
+        load_favourite_ids(self.user)
+        favourite = UserFavourite.objects.create(
+            user=self.user, product=self.products[1]
+        )
+        self.assertEqual(load_favourite_ids(self.user), {self.products[1].id})
+        favourite.delete()
+        self.assertEqual(load_favourite_ids(self.user), frozenset())
+
+    def test_the_favourite_view_toggles_and_invalidates(self):
+        self.client.force_login(self.user)
+        load_favourite_ids(self.user)
+        url = f"/products/{self.products[0].id}/favourite/"
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(load_favourite_ids(self.user), {self.products[0].id})
+        self.client.post(url)
+        self.assertEqual(load_favourite_ids(self.user), frozenset())
+
+    def test_the_favourite_view_404s_for_a_missing_product(self):
+        self.client.force_login(self.user)
+        response = self.client.post(f"/products/{self.products[1].id + 1}/favourite/")
+        self.assertEqual(response.status_code, 404)
+
+
+class FavouriteBadgeQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("fan@example.com", "Fa", "N")
+        self.client.force_login(self.user)
+
+    def listing_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/products/", HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_hearts_do_not_add_a_query_per_card(self):
+        products = create_products(8)
+        UserFavourite.objects.create(user=self.user, product=products[0])
+        _, one_favourite = self.listing_queries()
+        # BULK_CREATE SENDS NO SIGNALS, SO THE CACHED IDS ARE DROPPED BY HAND
+        UserFavourite.objects.bulk_create(
+            [UserFavourite(user=self.user, product=product) for product in products[1:]]
+        )
+        cache.clear()
+        response, eight_favourites = self.listing_queries()
+        self.assertEqual(eight_favourites, one_favourite)
+        self.assertContains(response, "Remove favourite", count=8)
@@ -4,12 +4,18 @@ from django.contrib.auth import authenticate, login, logout
 from .forms import CustomUserCreationForm, CreateUserAddressForm
 from django.contrib import messages
 from .models import UserAddress
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.template.loader import render_to_string
 from products.models import Product
+from products.queries import with_primary_image
 from users.models import UserFavourite
-from checkout.models import Order
+from users.favourites import invalidate_favourite_ids
+from checkout.models import Order, OrderItem
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+
+ORDERS_PER_PAGE = 10
 
 
 def signup_view(request):
@@ -204,22 +210,24 @@ def add_remove_user_favourite(request, product_id):
         product_id (int): The ID of the product to add or remove.
 
     Returns:
-        HttpResponse: The rendered HTML response containing the updated favorite button.
+        HttpResponse: The rendered HTML response containing the updated favorite button,
+        or the heart of a product card when posted with badge set.
 
+    Raises:
+        Http404: If no product exists with the given ID.
     """
-    product = Product.objects.get(id=product_id)
-    product_favourite = UserFavourite.objects.filter(user=request.user, product=product)
-    if len(product_favourite) > 0:
-        product_favourite[0].delete()
-        is_favourite = False
-    else:
-        UserFavourite.objects.create(user=request.user, product_id=product_id)
-        is_favourite = True
+    is_favourite = UserFavourite.toggle(request.user, product_id)
+    if is_favourite is None:
+        raise Http404("No product matches the given query.")
+    invalidate_favourite_ids(request.user.pk, request)
 
     context = {
+        # ONLY THE ID OF THE PRODUCT IS RENDERED, SO IT IS NOT LOADED
+        "product": Product(id=product_id),
         "is_favourite": is_favourite,
-        "product": product,
     }
+    if request.POST.get("badge"):
+        return render(request, "products/partials/_favourite_badge.html", context)
     return render(request, "products/partials/_favourite_button.html", context)
 
 
@@ -242,15 +250,31 @@ def account_orders_view(request):
     """
     View function to display the orders associated with the current user.
 
+    Orders are paginated, and the lines, variants, products and first
+    product images of a page are loaded with a fixed number of queries.
+
     Args:
         request (HttpRequest): The HTTP request object.
 
     Returns:
         HttpResponse: The HTTP response object containing the rendered template.
     """
-    orders = Order.objects.filter(user=request.user).order_by("-date_created")
+    orders = (
+        Order.objects.filter(user=request.user)
+        .order_by("-date_created", "-id")
+        .prefetch_related(
+            Prefetch(
+                "orderitem_set",
+                queryset=with_primary_image(
+                    OrderItem.objects.order_by("id"), "item__product"
+                ),
+            ),
+        )
+    )
+    page = Paginator(orders, ORDERS_PER_PAGE).get_page(request.GET.get("page"))
     context = {
-        "orders": orders,
+        "orders": page,
+        "page": page,
     }
     return render(request, "account/orders.html", context)
 
@@ -258,7 +282,8 @@ def account_orders_view(request):
 @login_required
 def account_favourites_view(request):
     """
-    View function that renders the user's favourite products.
+    View function that renders the user's favourite products, loaded with
+    their first images in a fixed number of queries.
 
     Args:
         request (HttpRequest): The HTTP request object.
@@ -266,7 +291,8 @@ def account_favourites_view(request):
     Returns:
         HttpResponse: The HTTP response object containing the rendered template.
     """
-    favourite_products = UserFavourite.objects.filter(user=request.user)
+    favourites = UserFavourite.objects.filter(user=request.user, product__isnull=False)
+    favourite_products = with_primary_image(favourites.order_by("id"), "product")
     return render(
         request, "account/favourites.html", {"favourite_products": favourite_products}
     )